@@ -0,0 +1,214 @@
+# add_cache_invalidation_index.py
+"""
+数据库迁移脚本 - 为 compatibility_cache 表添加定向失效所需的字段和索引
+
+使用方法:
+python add_cache_invalidation_index.py
+
+这个脚本会：
+1. 检查 compatibility_cache 表是否已有 categories 字段
+2. 如果没有，则添加该字段，并根据 parts 表回填已有缓存条目的类别
+3. 为 part_ids 和 categories 创建 GIN 索引，支持按零件/类别定向清理缓存
+4. 验证迁移结果
+"""
+
+import os
+import sys
+import traceback
+from sqlalchemy import create_engine, text, inspect
+from sqlalchemy.exc import SQLAlchemyError
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+# 导入配置
+try:
+    from app.core.config import settings
+    print("✓ 成功导入配置")
+except ImportError as e:
+    print(f"✗ 导入配置失败: {e}")
+    print("请确保在项目根目录下运行此脚本")
+    sys.exit(1)
+
+GIN_INDEXES = {
+    "ix_compatibility_cache_part_ids_gin": "part_ids",
+    "ix_compatibility_cache_categories_gin": "categories",
+}
+
+def check_column_exists(engine, table_name, column_name):
+    """检查表中是否存在指定列"""
+    try:
+        inspector = inspect(engine)
+        columns = inspector.get_columns(table_name)
+        column_names = [col['name'] for col in columns]
+        return column_name in column_names
+    except Exception as e:
+        print(f"检查列是否存在时出错: {e}")
+        return False
+
+def add_cache_invalidation_index():
+    """添加 categories 字段和 GIN 索引到 compatibility_cache 表"""
+
+    print("=" * 60)
+    print("开始数据库迁移：兼容性缓存定向失效索引")
+    print("=" * 60)
+
+    try:
+        # 创建数据库连接
+        print(f"连接数据库: {settings.database_url}")
+        engine = create_engine(settings.database_url)
+
+        # 测试连接
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+            print("✓ 数据库连接成功")
+
+        # 检查 compatibility_cache 表是否存在
+        inspector = inspect(engine)
+        tables = inspector.get_table_names()
+
+        if 'compatibility_cache' not in tables:
+            print("✗ compatibility_cache 表不存在，请先运行 add_compatibility_system.py")
+            return False
+
+        print("✓ compatibility_cache 表存在")
+
+        column_exists = check_column_exists(engine, 'compatibility_cache', 'categories')
+
+        # 执行迁移
+        with engine.connect() as conn:
+            # 开始事务
+            trans = conn.begin()
+
+            try:
+                # 1. 添加 categories 字段
+                if column_exists:
+                    print("1. categories 字段已存在，跳过")
+                else:
+                    print("1. 添加 categories 字段...")
+                    conn.execute(text("""
+                    ALTER TABLE compatibility_cache
+                    ADD COLUMN categories JSONB
+                    """))
+                    print("   ✓ categories 字段添加成功")
+
+                # 2. 回填已有缓存条目的类别
+                print("2. 回填已有缓存条目的类别...")
+                backfill_result = conn.execute(text("""
+                UPDATE compatibility_cache c
+                SET categories = COALESCE((
+                    SELECT jsonb_agg(DISTINCT COALESCE(p.category, ''))
+                    FROM parts p
+                    WHERE p.id IN (
+                        SELECT jsonb_array_elements_text(c.part_ids)::int
+                    )
+                ), '[]'::jsonb)
+                WHERE c.categories IS NULL
+                """))
+                print(f"   ✓ 回填了 {backfill_result.rowcount} 个缓存条目")
+
+                # 3. 创建 GIN 索引
+                print("3. 创建 GIN 索引...")
+                for index_name, column_name in GIN_INDEXES.items():
+                    conn.execute(text(f"""
+                    CREATE INDEX IF NOT EXISTS {index_name}
+                    ON compatibility_cache USING gin ({column_name})
+                    """))
+                    print(f"   ✓ {index_name} 创建成功")
+
+                # 4. 验证索引是否创建成功
+                print("4. 验证索引...")
+                index_rows = conn.execute(text("""
+                SELECT indexname
+                FROM pg_indexes
+                WHERE tablename = 'compatibility_cache'
+                AND indexname LIKE '%_gin'
+                """)).fetchall()
+                found_indexes = {row[0] for row in index_rows}
+
+                for index_name in GIN_INDEXES:
+                    if index_name in found_indexes:
+                        print(f"   ✓ 索引验证成功: {index_name}")
+                    else:
+                        raise Exception(f"验证失败：未找到索引 {index_name}")
+
+                # 提交事务
+                trans.commit()
+                print("\n✓ 迁移完成！事务已提交")
+
+                return True
+
+            except Exception as e:
+                # 回滚事务
+                trans.rollback()
+                print(f"\n✗ 迁移失败，事务已回滚: {e}")
+                traceback.print_exc()
+                return False
+
+    except SQLAlchemyError as e:
+        print(f"✗ 数据库错误: {e}")
+        return False
+    except Exception as e:
+        print(f"✗ 未预期错误: {e}")
+        traceback.print_exc()
+        return False
+
+def verify_migration():
+    """验证迁移是否成功"""
+    print("\n" + "=" * 60)
+    print("验证迁移结果")
+    print("=" * 60)
+
+    try:
+        engine = create_engine(settings.database_url)
+
+        with engine.connect() as conn:
+            missing_count = conn.execute(text("""
+            SELECT COUNT(*) FROM compatibility_cache WHERE categories IS NULL
+            """)).scalar()
+            total_count = conn.execute(text("SELECT COUNT(*) FROM compatibility_cache")).scalar()
+
+            print(f"当前缓存条目数: {total_count}")
+            print(f"缺少类别信息的条目数: {missing_count}")
+
+            if missing_count:
+                print("✗ 验证失败：仍有缓存条目缺少类别信息")
+                return False
+
+            print("✓ 迁移验证成功")
+            return True
+
+    except Exception as e:
+        print(f"✗ 验证过程出错: {e}")
+        return False
+
+def main():
+    """主函数"""
+    print("OpenPart 数据库迁移工具")
+    print("任务：为兼容性缓存添加定向失效字段和索引")
+
+    # 执行迁移
+    success = add_cache_invalidation_index()
+
+    if success:
+        # 验证迁移
+        verify_success = verify_migration()
+
+        if verify_success:
+            print("\n" + "=" * 60)
+            print("✅ 迁移完成并验证成功！")
+            print("✅ 规则、经验和零件变更后将只清理受影响的缓存")
+            print("=" * 60)
+        else:
+            print("\n" + "=" * 60)
+            print("⚠️  迁移可能完成但验证失败")
+            print("⚠️  建议手动检查数据库表结构")
+            print("=" * 60)
+    else:
+        print("\n" + "=" * 60)
+        print("❌ 迁移失败")
+        print("❌ 请检查错误信息并修复问题后重试")
+        print("=" * 60)
+
+if __name__ == "__main__":
+    main()
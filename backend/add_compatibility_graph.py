@@ -0,0 +1,138 @@
+# add_compatibility_graph.py
+"""
+数据库迁移脚本 - 创建预计算兼容性图所需的表
+
+使用方法:
+python add_compatibility_graph.py
+
+这个脚本会：
+1. 创建 compatibility_graph_nodes 表（每个零件的建议列表状态）
+2. 创建 compatibility_graph_edges 表（每个零件按目标类别的前N个兼容零件）及其索引
+3. 验证迁移结果
+
+表创建后由应用的后台任务逐步为所有零件计算建议列表，计算完成前建议接口回退到实时搜索。
+"""
+
+import os
+import sys
+import traceback
+from sqlalchemy import create_engine, text, inspect
+from sqlalchemy.exc import SQLAlchemyError
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+# 导入配置和模型
+try:
+    from app.core.config import settings
+    from app.core.database import Base
+    from app.models.part import Part
+    from app.models.compatibility import CompatibilityGraphNode, CompatibilityGraphEdge
+    print("✓ 成功导入配置和模型")
+except ImportError as e:
+    print(f"✗ 导入配置失败: {e}")
+    print("请确保在项目根目录下运行此脚本")
+    sys.exit(1)
+
+GRAPH_TABLES = [CompatibilityGraphNode.__table__, CompatibilityGraphEdge.__table__]
+
+def add_compatibility_graph():
+    """创建兼容性图表和索引"""
+
+    print("=" * 60)
+    print("开始数据库迁移：预计算兼容性图")
+    print("=" * 60)
+
+    try:
+        # 创建数据库连接
+        print(f"连接数据库: {settings.database_url}")
+        engine = create_engine(settings.database_url)
+
+        # 测试连接
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+            print("✓ 数据库连接成功")
+
+        tables = inspect(engine).get_table_names()
+        if 'parts' not in tables:
+            print("✗ parts 表不存在，请先运行 init_db.py")
+            return False
+
+        # 已存在的表会被跳过
+        for table in GRAPH_TABLES:
+            if table.name in tables:
+                print(f"   {table.name} 表已存在，跳过")
+            else:
+                table.create(bind=engine)
+                print(f"   ✓ {table.name} 表创建成功")
+
+        return True
+
+    except SQLAlchemyError as e:
+        print(f"✗ 数据库错误: {e}")
+        return False
+    except Exception as e:
+        print(f"✗ 未预期错误: {e}")
+        traceback.print_exc()
+        return False
+
+def verify_migration():
+    """验证迁移是否成功"""
+    print("\n" + "=" * 60)
+    print("验证迁移结果")
+    print("=" * 60)
+
+    try:
+        engine = create_engine(settings.database_url)
+        inspector = inspect(engine)
+        tables = inspector.get_table_names()
+
+        for table in GRAPH_TABLES:
+            if table.name not in tables:
+                print(f"✗ 验证失败：未找到表 {table.name}")
+                return False
+            print(f"✓ 表验证成功: {table.name}")
+
+        index_names = {index['name'] for index in inspector.get_indexes('compatibility_graph_edges')}
+        for index in CompatibilityGraphEdge.__table__.indexes:
+            if index.name not in index_names:
+                print(f"✗ 验证失败：未找到索引 {index.name}")
+                return False
+            print(f"✓ 索引验证成功: {index.name}")
+
+        return True
+
+    except Exception as e:
+        print(f"✗ 验证过程出错: {e}")
+        return False
+
+def main():
+    """主函数"""
+    print("OpenPart 数据库迁移工具")
+    print("任务：创建预计算兼容性图")
+
+    # 执行迁移
+    success = add_compatibility_graph()
+
+    if success:
+        # 验证迁移
+        verify_success = verify_migration()
+
+        if verify_success:
+            print("\n" + "=" * 60)
+            print("✅ 迁移完成并验证成功！")
+            print("✅ 重启应用后后台任务将开始计算兼容性建议")
+            print("=" * 60)
+        else:
+            print("\n" + "=" * 60)
+            print("⚠️  迁移可能完成但验证失败")
+            print("⚠️  建议手动检查数据库表结构")
+            print("=" * 60)
+    else:
+        print("\n" + "=" * 60)
+        print("❌ 迁移失败")
+        print("❌ 请检查错误信息并修复问题后重试")
+        print("=" * 60)
+
+if __name__ == "__main__":
+    main()
@@ -6,13 +6,16 @@
 """
 
 from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy import and_, or_, desc
 from typing import List, Optional, Dict, Any
+import json
 import logging
 from datetime import datetime, timedelta
 
-from app.core.database import get_db
+from app.core.database import get_db, iterate_with_sync_session
 from app.auth.middleware import require_admin
 from app.auth.models import User
 from app.models.compatibility import (
@@ -23,7 +26,7 @@ from app.models.compatibility import (
 from app.models.part import Part
 from app.schemas.compatibility import (
     # 规则相关
-    RuleCreate, RuleUpdate, RuleResponse, RuleTestRequest, RuleTestResponse,
+    RuleCreate, RuleUpdate, RuleResponse, RuleTestRequest, RuleTestResponse, RuleTestCaseError,
     SecurityValidationRequest, SecurityValidationResponse, RuleListResponse,
     # 经验相关
     ExperienceCreate, ExperienceUpdate, ExperienceResponse, ExperienceListResponse,
@@ -36,6 +39,8 @@ from app.schemas.compatibility import (
     PaginatedResponse
 )
 from app.services.compatibility_engine import compatibility_engine
+from app.services.compatibility_graph import compatibility_graph
+from app.services.rule_impact import rule_impact_analyzer
 from app.services.safe_expression_parser import SafeExpressionEngine
 
 router = APIRouter()
@@ -86,8 +91,12 @@ async def batch_disable_rules(
         
         db.commit()
         
-        # 清理缓存
-        await _clear_all_compatibility_cache(db)
+        # 同步规则索引
+        compatibility_engine.rule_index.refresh_rules(db, [rule.id for rule in rules])
+        
+        # 清理涉及的类别组合的缓存
+        for category_a, category_b in {(rule.category_a, rule.category_b) for rule in rules}:
+            await _clear_related_cache(db, category_a, category_b)
         
         return {
             "message": f"批量停用完成",
@@ -164,8 +173,12 @@ async def batch_enable_rules(
         
         db.commit()
         
-        # 清理缓存
-        await _clear_all_compatibility_cache(db)
+        # 同步规则索引
+        compatibility_engine.rule_index.refresh_rules(db, [rule.id for rule in rules])
+        
+        # 清理涉及的类别组合的缓存
+        for category_a, category_b in {(rule.category_a, rule.category_b) for rule in rules}:
+            await _clear_related_cache(db, category_a, category_b)
         
         return {
             "message": f"批量启用完成",
@@ -247,6 +260,12 @@ async def create_compatibility_rule(
         db.commit()
         db.refresh(new_rule)
         
+        # 同步规则索引
+        compatibility_engine.rule_index.refresh_rule(db, new_rule.id)
+        
+        # 清理相关缓存
+        await _clear_related_cache(db, new_rule.category_a, new_rule.category_b)
+        
         # 4. 记录审计日志
         await _log_rule_operation(
             db=db,
@@ -382,8 +401,9 @@ async def update_compatibility_rule(
         
         logger.info(f"管理员 {current_user.username} 更新规则 {rule_id}: {rule.name}")
         
-        # 保存旧表达式用于审计
+        # 保存旧表达式用于审计，旧类别用于清理缓存
         old_expression = rule.rule_expression
+        old_categories = (rule.category_a, rule.category_b)
         
         # 如果更新表达式，进行安全验证
         security_validation = None
@@ -428,6 +448,14 @@ async def update_compatibility_rule(
         db.commit()
         db.refresh(rule)
         
+        # 同步规则索引
+        compatibility_engine.rule_index.refresh_rule(db, rule.id)
+        
+        # 清理相关缓存（类别变更时新旧类别组合都受影响）
+        await _clear_related_cache(db, rule.category_a, rule.category_b)
+        if old_categories != (rule.category_a, rule.category_b):
+            await _clear_related_cache(db, *old_categories)
+        
         # 记录审计日志
         await _log_rule_operation(
             db=db,
@@ -482,6 +510,9 @@ async def disable_compatibility_rule(
         rule.updated_at = datetime.utcnow()
         db.commit()
         
+        # 同步规则索引
+        compatibility_engine.rule_index.remove_rule(rule.id)
+        
         # 记录审计日志
         await _log_rule_operation(
             db=db,
@@ -554,6 +585,9 @@ async def enable_compatibility_rule(
         rule.updated_at = datetime.utcnow()
         db.commit()
         
+        # 同步规则索引
+        compatibility_engine.rule_index.refresh_rule(db, rule.id)
+        
         # 记录审计日志
         await _log_rule_operation(
             db=db,
@@ -629,6 +663,9 @@ async def delete_compatibility_rule(
         db.delete(rule)
         db.commit()
         
+        # 同步规则索引
+        compatibility_engine.rule_index.remove_rule(rule_id)
+        
         # 记录审计日志（规则已删除，所以rule_id传None）
         await _log_rule_operation(
             db=db,
@@ -798,34 +835,37 @@ async def _log_rule_operation(
         db.rollback()
 
 async def _clear_related_cache(db: Session, category_a: Optional[str], category_b: Optional[str]):
-    """清理相关类别的兼容性缓存"""
+    """清理相关类别的兼容性缓存（只清理同时涉及指定类别的缓存条目）"""
     
-    try:
-        if not category_a and not category_b:
-            return
-        
-        # 清理过期缓存
-        expired_cutoff = datetime.utcnow()
-        deleted_count = db.query(CompatibilityCache).filter(
-            or_(
-                CompatibilityCache.expires_at < expired_cutoff,
-                CompatibilityCache.expires_at.is_(None)
-            )
-        ).delete()
-        
-        db.commit()
-        
-        if deleted_count > 0:
-            logger.info(f"清理了 {deleted_count} 个过期缓存条目")
-            
-    except Exception as e:
-        logger.warning(f"清理相关缓存失败: {str(e)}")
-        db.rollback()
+    categories = [category for category in (category_a, category_b) if category]
+    if not categories:
+        return
+    
+    deleted_count = compatibility_engine.invalidate_categories(db, categories)
+    
+    if deleted_count > 0:
+        logger.info(f"清理了 {deleted_count} 个涉及类别 {categories} 的缓存条目")
+    
+    # 涉及类别的零件建议列表由后台任务重新计算
+    compatibility_graph.mark_categories_stale(db, categories)
+
+async def _clear_part_cache(db: Session, part_ids: List[int], match_all: bool = False):
+    """清理涉及指定零件的兼容性缓存"""
+    
+    deleted_count = compatibility_engine.invalidate_parts(db, part_ids, match_all=match_all)
+    
+    if deleted_count > 0:
+        logger.info(f"清理了 {deleted_count} 个涉及零件 {part_ids} 的缓存条目")
+    
+    # 相关零件的建议列表由后台任务重新计算
+    compatibility_graph.mark_parts_stale(db, part_ids)
 
 async def _clear_all_compatibility_cache(db: Session):
     """清理所有兼容性缓存"""
     
     try:
+        compatibility_engine.clear_result_cache()
+        
         deleted_count = db.query(CompatibilityCache).delete()
         db.commit()
         
@@ -874,7 +914,7 @@ async def test_rule_execution(
     测试规则执行
     
     - 在沙箱环境中安全执行规则
-    - 使用提供的测试数据
+    - 使用提供的测试数据（test_cases 批量测试时表达式只编译一次，用例较多时并行执行）
     - 返回执行结果和性能指标
     """
     try:
@@ -899,6 +939,47 @@ async def test_rule_execution(
                 security_check=security_validation.dict()
             )
         
+        # 批量测试
+        if test_request.test_cases is not None:
+            executor = compatibility_engine.parallel_evaluator.executor_for(len(test_request.test_cases))
+            batch = await run_in_threadpool(
+                expression_engine.evaluate_many,
+                rule.rule_expression,
+                test_request.test_cases,
+                executor
+            )
+            
+            results = [None if result is None else bool(result) for result in batch.results]
+            errors = [
+                RuleTestCaseError(index=index, error_message=error_message)
+                for index, error_message in batch.errors
+            ]
+            passed_count = sum(1 for result in results if result)
+            
+            await _log_rule_operation(
+                db=db,
+                rule_id=rule.id,
+                action="test",
+                user_id=current_user.id,
+                additional_context={
+                    "test_success": not errors,
+                    "test_cases": len(results),
+                    "passed_count": passed_count,
+                    "error_count": len(errors),
+                    "execution_time": batch.execution_time
+                }
+            )
+            
+            return RuleTestResponse(
+                success=not errors,
+                execution_time=batch.execution_time,
+                error_message=f"{len(errors)}个测试用例执行失败" if errors else None,
+                security_check=security_validation.dict(),
+                results=results,
+                errors=errors,
+                passed_count=passed_count
+            )
+        
         # 执行测试
         import time
         start_time = time.time()
@@ -962,6 +1043,47 @@ async def test_rule_execution(
         logger.error(f"规则测试失败: {str(e)}")
         raise HTTPException(status_code=500, detail=f"规则测试失败: {str(e)}")
 
+@router.get("/rules/{rule_id}/impact")
+async def analyze_rule_impact(
+    rule_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_admin)
+):
+    """
+    规则影响分析（试运行）
+    
+    - 对规则 category_a × category_b 的全部零件对执行规则，不修改任何数据
+    - 以 NDJSON 流式返回：header、定期的 progress，最后是 summary
+    - summary 包含通过/失败/出错/不适用的零件对数，以及会改变的缓存结果数
+    - 适合在创建后启用规则前评估影响
+    """
+    try:
+        rule = db.query(CompatibilityRule).filter(CompatibilityRule.id == rule_id).first()
+        if not rule:
+            raise HTTPException(status_code=404, detail="规则未找到")
+        
+        security_validation = await expression_engine.validate_expression_security(rule.rule_expression, db)
+        if not security_validation.is_safe:
+            raise HTTPException(status_code=400, detail="规则表达式不安全，无法执行影响分析")
+        
+        logger.info(f"管理员 {current_user.username} 分析规则影响 {rule_id}: {rule.name}")
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"规则影响分析失败: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"规则影响分析失败: {str(e)}")
+    
+    async def impact_lines(sync_db):
+        impact_rule = sync_db.query(CompatibilityRule).filter(CompatibilityRule.id == rule_id).first()
+        if impact_rule is None:
+            return
+        async for event in rule_impact_analyzer.iter_impact(impact_rule, sync_db):
+            yield json.dumps(event, ensure_ascii=False) + "\n"
+    
+    # 使用独立的同步会话，StreamingResponse 在线程池中迭代，不阻塞事件循环
+    return StreamingResponse(iterate_with_sync_session(impact_lines), media_type="application/x-ndjson")
+
 # ==================== 经验管理API ====================
 
 @router.post("/experiences", response_model=ExperienceResponse)
@@ -1017,8 +1139,11 @@ async def create_compatibility_experience(
         db.commit()
         db.refresh(new_experience)
         
+        # 同步经验索引
+        compatibility_engine.experience_index.add_pair(new_experience.part_a_id, new_experience.part_b_id)
+        
         # 清理相关缓存
-        await _clear_related_cache(db, part_a.category, part_b.category)
+        await _clear_part_cache(db, [new_experience.part_a_id, new_experience.part_b_id], match_all=True)
         
         logger.info(f"兼容性经验创建成功: ID={new_experience.id}")
         return new_experience
@@ -1118,11 +1243,11 @@ async def update_compatibility_experience(
         db.commit()
         db.refresh(experience)
         
+        # 同步经验索引
+        compatibility_engine.experience_index.touch_pair(experience.part_a_id, experience.part_b_id)
+        
         # 清理相关缓存
-        part_a = db.query(Part).filter(Part.id == experience.part_a_id).first()
-        part_b = db.query(Part).filter(Part.id == experience.part_b_id).first()
-        if part_a and part_b:
-            await _clear_related_cache(db, part_a.category, part_b.category)
+        await _clear_part_cache(db, [experience.part_a_id, experience.part_b_id], match_all=True)
         
         logger.info(f"兼容性经验更新成功: ID={experience.id}")
         return experience
@@ -1152,17 +1277,16 @@ async def delete_compatibility_experience(
         
         logger.info(f"管理员 {current_user.username} 删除兼容性经验 {experience_id}")
         
-        # 获取零件信息用于清理缓存
-        part_a = db.query(Part).filter(Part.id == experience.part_a_id).first()
-        part_b = db.query(Part).filter(Part.id == experience.part_b_id).first()
-        
         # 删除经验
+        part_ids = (experience.part_a_id, experience.part_b_id)
         db.delete(experience)
         db.commit()
         
+        # 同步经验索引
+        compatibility_engine.experience_index.remove_pair(*part_ids)
+        
         # 清理相关缓存
-        if part_a and part_b:
-            await _clear_related_cache(db, part_a.category, part_b.category)
+        await _clear_part_cache(db, list(part_ids), match_all=True)
         
         logger.info(f"兼容性经验删除成功: ID={experience_id}")
         return {"message": "兼容性经验已删除", "experience_id": experience_id}
@@ -1249,6 +1373,50 @@ async def get_compatibility_stats(
         logger.error(f"获取统计信息失败: {str(e)}")
         raise HTTPException(status_code=500, detail=f"获取统计信息失败: {str(e)}")
 
+@router.get("/stats/rules")
+async def get_rule_profile(
+    sort_by: str = Query("total_time", pattern="^(total_time|mean|p95|calls|error_rate)$", description="排序字段"),
+    limit: int = Query(20, ge=1, le=500, description="返回规则数"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_admin)
+):
+    """
+    慢规则报告
+    
+    按规则统计执行次数、总耗时/平均/p95耗时、错误率和通过率，默认按总耗时降序，
+    用于找出主导搜索延迟的规则。统计为本进程自启动或上次重置以来的数据，最多滞后一个刷新间隔。
+    """
+    
+    try:
+        report = compatibility_engine.rule_profiler.report(sort_by=sort_by, limit=limit)
+        
+        rule_ids = [rule["rule_id"] for rule in report["rules"]]
+        rules = {
+            rule.id: rule
+            for rule in db.query(CompatibilityRule).filter(CompatibilityRule.id.in_(rule_ids)).all()
+        } if rule_ids else {}
+        for item in report["rules"]:
+            rule = rules.get(item["rule_id"])
+            item["rule_name"] = rule.name if rule else None
+            item["categories"] = f"{rule.category_a}+{rule.category_b}" if rule else None
+            item["is_active"] = rule.is_active if rule else None
+        
+        return report
+        
+    except Exception as e:
+        logger.error(f"获取规则性能统计失败: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"获取规则性能统计失败: {str(e)}")
+
+@router.delete("/stats/rules")
+async def reset_rule_profile(
+    current_user: User = Depends(require_admin)
+):
+    """重置规则性能统计"""
+    
+    compatibility_engine.rule_profiler.reset()
+    logger.info(f"管理员 {current_user.username} 重置了规则性能统计")
+    return {"message": "规则性能统计已重置"}
+
 # ==================== 审计日志API ====================
 
 @router.get("/audit-log", response_model=List[AuditLogResponse])
@@ -0,0 +1,46 @@
+# backend/app/api/admin/system.py (新文件 - 系统运行状态API)
+from fastapi import APIRouter, Depends
+from datetime import datetime
+
+from app.core.config import settings
+from app.core.database import async_engine, engine
+from app.core.pool_metrics import pool_status
+from app.auth.middleware import require_admin
+from app.auth.models import User
+
+router = APIRouter()
+
+@router.get("/db-pool")
+async def get_db_pool_stats(
+    current_user: User = Depends(require_admin)
+):
+    """
+    获取数据库连接池实时状态（仅管理员）
+    
+    - 同步连接池：管理接口、兼容性引擎、爬虫任务线程共用
+    - 异步连接池：公开零件和兼容性接口使用
+    - 包含占用/空闲/溢出连接数，以及获取连接的等待次数、耗时和超时次数
+    """
+    return {
+        "sync_pool": {
+            **pool_status(engine.pool),
+            "config": {
+                "pool_size": settings.db_pool_size,
+                "max_overflow": settings.db_max_overflow,
+                "pool_timeout": settings.db_pool_timeout,
+                "pool_recycle": settings.db_pool_recycle,
+                "pool_pre_ping": settings.db_pool_pre_ping
+            }
+        },
+        "async_pool": {
+            **pool_status(async_engine.pool),
+            "config": {
+                "pool_size": settings.async_db_pool_size,
+                "max_overflow": settings.async_db_max_overflow,
+                "pool_timeout": settings.db_pool_timeout,
+                "pool_recycle": settings.db_pool_recycle,
+                "pool_pre_ping": settings.db_pool_pre_ping
+            }
+        },
+        "timestamp": datetime.utcnow().isoformat()
+    }
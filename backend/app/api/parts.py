@@ -5,6 +5,8 @@ from typing import List, Optional
 from app.core.database import get_db
 from app.models.part import Part
 from app.schemas.part import PartCreate, PartUpdate, PartResponse
+from app.services.compatibility_engine import compatibility_engine
+from app.services.compatibility_graph import compatibility_graph
 
 router = APIRouter()
 
@@ -56,6 +58,10 @@ async def update_part(
     
     db.commit()
     db.refresh(part)
+    
+    # 零件属性变化后清理涉及该零件的兼容性缓存
+    compatibility_engine.invalidate_parts(db, [part_id])
+    compatibility_graph.mark_part_changed(db, part_id)
     return part
 
 @router.delete("/{part_id}")
@@ -67,4 +73,8 @@ async def delete_part(part_id: int, db: Session = Depends(get_db)):
     
     db.delete(part)
     db.commit()
+    
+    # 清理涉及该零件的兼容性缓存
+    compatibility_engine.invalidate_parts(db, [part_id])
+    compatibility_graph.mark_part_changed(db, part_id)
     return {"message": "零件已删除"}
\ No newline at end of file
@@ -6,22 +6,31 @@
 """
 
 from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional, Dict, Any
+import json
 import logging
+import time
 from datetime import datetime
 
-from app.core.database import get_db
+from app.core.database import get_async_db, iterate_with_sync_session, run_with_sync_session
 from app.auth.middleware import get_current_user_optional
 from app.auth.models import User
 from app.models.part import Part
 from app.schemas.compatibility import (
     CompatibilityCheckRequest, CompatibilityCheckResponse,
     CompatibilitySearchRequest, CompatibilitySearchResponse,
-    CompatibilityMatch
+    CompatibilityMatch, PartCompatibilityResult,
+    CompatibilityMatrixRequest, MATRIX_MAX_PARTS,
+    BuildSessionCreateRequest, BuildPartAddRequest, BuildSessionResponse
 )
 from app.schemas.part import PartResponse
 from app.services.compatibility_engine import compatibility_engine
+from app.services.compatibility_graph import compatibility_graph
+from app.services.build_session import BuildSession, build_session_manager
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
@@ -31,7 +40,7 @@ logger = logging.getLogger(__name__)
 @router.post("/check", response_model=CompatibilityCheckResponse)
 async def check_compatibility(
     request: CompatibilityCheckRequest,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: Optional[User] = Depends(get_current_user_optional)
 ):
     """
@@ -59,7 +68,7 @@ async def check_compatibility(
             )
         
         # 检查零件是否存在
-        parts = db.query(Part).filter(Part.id.in_(request.part_ids)).all()
+        parts = (await db.execute(select(Part).filter(Part.id.in_(request.part_ids)))).scalars().all()
         if len(parts) != len(request.part_ids):
             found_ids = {p.id for p in parts}
             missing_ids = [pid for pid in request.part_ids if pid not in found_ids]
@@ -68,8 +77,13 @@ async def check_compatibility(
                 detail=f"未找到零件: {missing_ids}"
             )
         
-        # 执行兼容性检查
-        result = await compatibility_engine.check_compatibility(request, db)
+        # 先归还异步会话占用的连接，请求在同步引擎执行期间不再同时占用两个连接池的连接
+        await db.close()
+        
+        # 执行兼容性检查（引擎使用同步会话，在线程池中执行，不阻塞事件循环）
+        result = await run_with_sync_session(
+            lambda sync_db: compatibility_engine.check_compatibility(request, sync_db)
+        )
         
         logger.info(f"兼容性检查完成: 整体评分={result.overall_score}, 兼容={result.is_overall_compatible}")
         return result
@@ -83,7 +97,7 @@ async def check_compatibility(
 @router.post("/search", response_model=CompatibilitySearchResponse)
 async def search_compatible_parts(
     request: CompatibilitySearchRequest,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: Optional[User] = Depends(get_current_user_optional)
 ):
     """
@@ -111,7 +125,7 @@ async def search_compatible_parts(
             )
         
         # 检查已选零件是否存在
-        selected_parts = db.query(Part).filter(Part.id.in_(request.selected_parts)).all()
+        selected_parts = (await db.execute(select(Part).filter(Part.id.in_(request.selected_parts)))).scalars().all()
         if len(selected_parts) != len(request.selected_parts):
             found_ids = {p.id for p in selected_parts}
             missing_ids = [pid for pid in request.selected_parts if pid not in found_ids]
@@ -120,8 +134,11 @@ async def search_compatible_parts(
                 detail=f"未找到已选零件: {missing_ids}"
             )
         
-        # 执行兼容性搜索
-        result = await compatibility_engine.search_compatible_parts(request, db)
+        # 归还异步会话的连接后在线程池中执行兼容性搜索
+        await db.close()
+        result = await run_with_sync_session(
+            lambda sync_db: compatibility_engine.search_compatible_parts(request, sync_db)
+        )
         
         logger.info(f"兼容性搜索完成: 找到{len(result.matches)}个匹配零件")
         return result
@@ -138,7 +155,7 @@ async def get_compatibility_suggestions(
     limit: int = Query(10, ge=1, le=50, description="建议数量"),
     min_score: int = Query(70, ge=0, le=100, description="最低兼容性评分"),
     categories: Optional[str] = Query(None, description="目标类别，逗号分隔"),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: Optional[User] = Depends(get_current_user_optional)
 ):
     """
@@ -147,12 +164,13 @@ async def get_compatibility_suggestions(
     - 基于单个零件推荐兼容的其他零件
     - 支持类别筛选和评分阈值
     - 快速返回高兼容性的推荐结果
+    - 优先读取后台预计算的兼容性图，尚未计算时回退到实时搜索
     """
     try:
         logger.info(f"获取兼容性建议: 零件ID={part_id}, 用户={current_user.username if current_user else 'anonymous'}")
         
         # 检查零件是否存在
-        base_part = db.query(Part).filter(Part.id == part_id).first()
+        base_part = await db.get(Part, part_id)
         if not base_part:
             raise HTTPException(status_code=404, detail="零件未找到")
         
@@ -161,6 +179,12 @@ async def get_compatibility_suggestions(
         if categories:
             target_categories = [cat.strip() for cat in categories.split(",") if cat.strip()]
         
+        # 预计算的兼容性图（一次索引读取）
+        graph_parts = await compatibility_graph.get_suggestions_async(db, part_id, limit, min_score, target_categories)
+        if graph_parts is not None:
+            logger.info(f"兼容性建议完成（预计算）: 返回{len(graph_parts)}个建议零件")
+            return graph_parts
+        
         # 构建搜索请求
         search_request = CompatibilitySearchRequest(
             selected_parts=[part_id],
@@ -170,12 +194,15 @@ async def get_compatibility_suggestions(
             include_theoretical=True
         )
         
-        # 执行搜索
-        search_result = await compatibility_engine.search_compatible_parts(search_request, db)
+        # 归还异步会话的连接后执行搜索
+        await db.close()
+        search_result = await run_with_sync_session(
+            lambda sync_db: compatibility_engine.search_compatible_parts(search_request, sync_db)
+        )
         
         # 获取建议零件的详细信息
         suggested_part_ids = [match.part_id for match in search_result.matches]
-        suggested_parts = db.query(Part).filter(Part.id.in_(suggested_part_ids)).all()
+        suggested_parts = (await db.execute(select(Part).filter(Part.id.in_(suggested_part_ids)))).scalars().all()
         
         # 按搜索结果的顺序排序
         parts_dict = {p.id: p for p in suggested_parts}
@@ -196,7 +223,7 @@ async def get_compatibility_suggestions(
 async def quick_compatibility_check(
     part_a_id: int = Query(..., description="零件A的ID"),
     part_b_id: int = Query(..., description="零件B的ID"),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: Optional[User] = Depends(get_current_user_optional)
 ):
     """
@@ -209,9 +236,19 @@ async def quick_compatibility_check(
     try:
         logger.info(f"快速兼容性检查: 零件A={part_a_id}, 零件B={part_b_id}")
         
+        # 热点零件对直接从进程内缓存返回，无需访问数据库
+        if part_a_id != part_b_id:
+            cached_result = compatibility_engine.get_memory_cached_result([part_a_id, part_b_id])
+            if cached_result and cached_result.part_combinations:
+                pair_result = cached_result.part_combinations[0]
+                part_a_info = _pair_result_part_info(pair_result, part_a_id)
+                part_b_info = _pair_result_part_info(pair_result, part_b_id)
+                if part_a_info and part_b_info:
+                    return _build_quick_check_response(cached_result, pair_result, part_a_info, part_b_info)
+        
         # 检查零件是否存在
-        part_a = db.query(Part).filter(Part.id == part_a_id).first()
-        part_b = db.query(Part).filter(Part.id == part_b_id).first()
+        part_a = await db.get(Part, part_a_id)
+        part_b = await db.get(Part, part_b_id)
         
         if not part_a:
             raise HTTPException(status_code=404, detail=f"零件A未找到: ID={part_a_id}")
@@ -228,31 +265,21 @@ async def quick_compatibility_check(
             detail_level="basic"
         )
         
-        # 执行检查
-        result = await compatibility_engine.check_compatibility(check_request, db)
+        # 归还异步会话的连接后执行检查（零件的已加载属性在会话关闭后仍可访问）
+        await db.close()
+        result = await run_with_sync_session(
+            lambda sync_db: compatibility_engine.check_compatibility(check_request, sync_db)
+        )
         
         # 提取第一个（也是唯一的）零件对结果
         if result.part_combinations:
             pair_result = result.part_combinations[0]
             
-            return {
-                "compatible": pair_result.is_compatible,
-                "score": pair_result.compatibility_score,
-                "grade": pair_result.compatibility_grade,
-                "part_a": {
-                    "id": part_a.id,
-                    "name": part_a.name,
-                    "category": part_a.category
-                },
-                "part_b": {
-                    "id": part_b.id,
-                    "name": part_b.name,
-                    "category": part_b.category
-                },
-                "warnings": pair_result.warnings,
-                "cached": result.cached,
-                "execution_time": result.execution_time
-            }
+            return _build_quick_check_response(
+                result, pair_result,
+                {"id": part_a.id, "name": part_a.name, "category": part_a.category},
+                {"id": part_b.id, "name": part_b.name, "category": part_b.category}
+            )
         else:
             return {
                 "compatible": False,
@@ -267,6 +294,226 @@ async def quick_compatibility_check(
         logger.error(f"快速兼容性检查失败: {str(e)}")
         raise HTTPException(status_code=500, detail=f"快速兼容性检查失败: {str(e)}")
 
+def _pair_result_part_info(pair_result: PartCompatibilityResult, part_id: int) -> Optional[Dict[str, Any]]:
+    """从零件对结果中提取零件摘要（缺少类别信息时返回None）"""
+    
+    if pair_result.part_a_id == part_id:
+        name, category = pair_result.part_a_name, pair_result.part_a_category
+    elif pair_result.part_b_id == part_id:
+        name, category = pair_result.part_b_name, pair_result.part_b_category
+    else:
+        return None
+    
+    if category is None:
+        return None
+    
+    return {"id": part_id, "name": name, "category": category}
+
+def _build_quick_check_response(
+    result: CompatibilityCheckResponse,
+    pair_result: PartCompatibilityResult,
+    part_a_info: Dict[str, Any],
+    part_b_info: Dict[str, Any]
+) -> Dict[str, Any]:
+    """构建快速检查响应"""
+    
+    return {
+        "compatible": pair_result.is_compatible,
+        "score": pair_result.compatibility_score,
+        "grade": pair_result.compatibility_grade,
+        "part_a": part_a_info,
+        "part_b": part_b_info,
+        "warnings": pair_result.warnings,
+        "cached": result.cached,
+        "execution_time": result.execution_time
+    }
+
+# ==================== 增量配置校验API ====================
+
+@router.post("/builds", response_model=BuildSessionResponse)
+async def create_build_session(
+    request: BuildSessionCreateRequest,
+    current_user: Optional[User] = Depends(get_current_user_optional)
+):
+    """
+    创建装机会话
+    
+    - 会话保存在服务端内存中，一段时间未修改后自动过期
+    - 之后每次添加/移除零件只评估新增的零件对，响应只返回变化部分
+    """
+    session = build_session_manager.create(request.detail_level)
+    logger.info(f"创建装机会话: {session.build_id}, 初始零件数量={len(request.part_ids)}")
+    
+    if not request.part_ids:
+        return build_session_manager.snapshot(session)
+    
+    try:
+        return await _add_build_parts(session, request.part_ids)
+    except HTTPException:
+        build_session_manager.delete(session.build_id)
+        raise
+
+@router.get("/builds/{build_id}", response_model=BuildSessionResponse)
+async def get_build_session(build_id: str):
+    """获取装机会话当前的完整状态（changed_pairs 包含全部零件对；规则变化或零件被编辑后先重新评估）"""
+    session = _get_build_session(build_id)
+    try:
+        return await run_with_sync_session(lambda sync_db: build_session_manager.refresh(session, sync_db))
+    except Exception as e:
+        logger.error(f"获取装机会话失败: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"获取装机会话失败: {str(e)}")
+
+@router.post("/builds/{build_id}/parts", response_model=BuildSessionResponse)
+async def add_build_parts(
+    build_id: str,
+    request: BuildPartAddRequest
+):
+    """向装机会话添加零件，只返回新增零件对的结果和整体评分变化"""
+    session = _get_build_session(build_id)
+    return await _add_build_parts(session, request.part_ids)
+
+@router.delete("/builds/{build_id}/parts/{part_id}", response_model=BuildSessionResponse)
+async def remove_build_part(build_id: str, part_id: int):
+    """从装机会话移除零件，只返回移除的零件对和整体评分变化"""
+    session = _get_build_session(build_id)
+    if part_id not in session.part_ids:
+        raise HTTPException(status_code=404, detail=f"装机会话中没有零件: {part_id}")
+    
+    # 同一会话的修改串行执行，在线程池中等待会话锁
+    return await run_in_threadpool(build_session_manager.remove_part, session, part_id)
+
+@router.delete("/builds/{build_id}")
+async def delete_build_session(build_id: str):
+    """删除装机会话"""
+    if not build_session_manager.delete(build_id):
+        raise HTTPException(status_code=404, detail="装机会话不存在或已过期")
+    return {"message": "装机会话已删除"}
+
+def _get_build_session(build_id: str) -> BuildSession:
+    session = build_session_manager.get(build_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="装机会话不存在或已过期")
+    return session
+
+async def _add_build_parts(session: BuildSession, part_ids: List[int]):
+    try:
+        return await run_with_sync_session(
+            lambda sync_db: build_session_manager.add_parts(session, part_ids, sync_db)
+        )
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"装机会话添加零件失败: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"装机会话添加零件失败: {str(e)}")
+
+# ==================== 兼容性矩阵API ====================
+
+@router.post("/matrix")
+async def get_compatibility_matrix(
+    request: CompatibilityMatrixRequest,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Optional[User] = Depends(get_current_user_optional)
+):
+    """
+    批量计算 行零件 × 列零件 的兼容性矩阵
+    
+    - 行、列分别指定零件ID列表或类别（每个维度最多500个零件）
+    - 单元格结果与 quick-check 一致，同一零件的单元格为 null
+    - 以 NDJSON 流式返回：先返回 header（行列零件），再逐行返回 row，最后返回 summary
+    """
+    try:
+        logger.info(f"兼容性矩阵请求: 用户={current_user.username if current_user else 'anonymous'}")
+        
+        row_ids = await _resolve_matrix_axis(db, request.row_part_ids, request.row_category, "行")
+        column_ids = await _resolve_matrix_axis(db, request.column_part_ids, request.column_category, "列")
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"兼容性矩阵请求失败: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"兼容性矩阵请求失败: {str(e)}")
+    
+    async def matrix_lines(sync_db):
+        start_time = time.time()
+        parts = {
+            part.id: part
+            for part in sync_db.query(Part).filter(Part.id.in_(set(row_ids) | set(column_ids))).all()
+        }
+        row_parts = [parts[part_id] for part_id in row_ids if part_id in parts]
+        column_parts = [parts[part_id] for part_id in column_ids if part_id in parts]
+        
+        yield _ndjson_line({
+            "type": "header",
+            "rows": [_matrix_part_info(part) for part in row_parts],
+            "columns": [_matrix_part_info(part) for part in column_parts]
+        })
+        
+        compatible_count = 0
+        cell_count = 0
+        async for row_part, pair_results in compatibility_engine.iter_compatibility_matrix(
+            row_parts, column_parts, sync_db
+        ):
+            scores = []
+            compatible = []
+            for pair_result in pair_results:
+                if pair_result is None:
+                    scores.append(None)
+                    compatible.append(None)
+                    continue
+                scores.append(pair_result.compatibility_score)
+                compatible.append(pair_result.is_compatible)
+                cell_count += 1
+                compatible_count += pair_result.is_compatible
+            
+            yield _ndjson_line({"type": "row", "part_id": row_part.id, "scores": scores, "compatible": compatible})
+        
+        yield _ndjson_line({
+            "type": "summary",
+            "cells": cell_count,
+            "compatible_cells": compatible_count,
+            "execution_time": time.time() - start_time
+        })
+        logger.info(f"兼容性矩阵完成: {len(row_parts)}×{len(column_parts)}, 兼容{compatible_count}/{cell_count}")
+    
+    # 矩阵计算使用同步会话，StreamingResponse 在线程池中逐行迭代，不阻塞事件循环
+    return StreamingResponse(iterate_with_sync_session(matrix_lines), media_type="application/x-ndjson")
+
+async def _resolve_matrix_axis(
+    db: AsyncSession, 
+    part_ids: Optional[List[int]], 
+    category: Optional[str], 
+    axis_name: str
+) -> List[int]:
+    """解析矩阵的一个维度，返回去重后的零件ID列表（类别按零件ID排序）"""
+    
+    if part_ids is not None:
+        part_ids = list(dict.fromkeys(part_ids))
+        found_ids = set((await db.execute(select(Part.id).filter(Part.id.in_(part_ids)))).scalars().all())
+        missing_ids = [pid for pid in part_ids if pid not in found_ids]
+        if missing_ids:
+            raise HTTPException(status_code=404, detail=f"未找到{axis_name}零件: {missing_ids}")
+        return part_ids
+    
+    part_ids = (await db.execute(
+        select(Part.id).filter(Part.category == category).order_by(Part.id).limit(MATRIX_MAX_PARTS + 1)
+    )).scalars().all()
+    if not part_ids:
+        raise HTTPException(status_code=404, detail=f"{axis_name}类别下没有零件: {category}")
+    if len(part_ids) > MATRIX_MAX_PARTS:
+        raise HTTPException(
+            status_code=400, 
+            detail=f"{axis_name}类别 {category} 的零件数超过 {MATRIX_MAX_PARTS} 个，请改用零件ID列表"
+        )
+    return list(part_ids)
+
+def _matrix_part_info(part: Part) -> Dict[str, Any]:
+    return {"id": part.id, "name": part.name, "category": part.category}
+
+def _ndjson_line(payload: Dict[str, Any]) -> str:
+    return json.dumps(payload, ensure_ascii=False) + "\n"
+
 # ==================== 外部反馈渠道API ====================
 
 @router.get("/feedback-channels")
@@ -377,7 +624,7 @@ async def get_feedback_channels(
 @router.get("/knowledge-base")
 async def get_compatibility_knowledge_base(
     category: Optional[str] = Query(None, description="筛选特定类别"),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: Optional[User] = Depends(get_current_user_optional)
 ):
     """
@@ -392,7 +639,7 @@ async def get_compatibility_knowledge_base(
         from sqlalchemy import func
         from app.models.compatibility import CompatibilityRule
         
-        query = db.query(
+        query = select(
             CompatibilityRule.category_a,
             CompatibilityRule.category_b,
             func.count(CompatibilityRule.id).label('rule_count'),
@@ -410,7 +657,7 @@ async def get_compatibility_knowledge_base(
                 (CompatibilityRule.category_b == category)
             )
         
-        category_rules = query.all()
+        category_rules = (await db.execute(query)).all()
         
         # 构建知识库内容
         knowledge_base = {
@@ -466,7 +713,7 @@ async def get_compatibility_knowledge_base(
 
 @router.get("/system-status")
 async def get_compatibility_system_status(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: Optional[User] = Depends(get_current_user_optional)
 ):
     """
@@ -478,7 +725,7 @@ async def get_compatibility_system_status(
     """
     try:
         # 获取系统基础统计
-        stats = await compatibility_engine.get_compatibility_stats(db)
+        stats = await run_with_sync_session(compatibility_engine.get_compatibility_stats)
         
         # 计算系统健康度
         health_score = 100
@@ -644,6 +891,23 @@ async def get_compatibility_examples(
                     "grade": "unofficial_support",
                     "cached": True
                 }
+            },
+            "compatibility_matrix": {
+                "title": "兼容性矩阵",
+                "description": "批量计算两组零件（或两个类别）之间的兼容性评分矩阵，逐行流式返回",
+                "request": {
+                    "method": "POST",
+                    "url": "/api/public/compatibility/matrix",
+                    "body": {
+                        "row_category": "车架",
+                        "column_category": "前叉"
+                    }
+                },
+                "response_example": [
+                    {"type": "header", "rows": "...", "columns": "..."},
+                    {"type": "row", "part_id": 3, "scores": [88, 0], "compatible": [True, False]},
+                    {"type": "summary", "cells": 2, "compatible_cells": 1, "execution_time": 0.05}
+                ]
             }
         }
         
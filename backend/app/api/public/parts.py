@@ -1,9 +1,9 @@
 # backend/app/api/public/parts.py (修复版本)
 from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
-from sqlalchemy import or_, and_, func, text, distinct
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import or_, and_, func, text, distinct, select
 from typing import List, Optional, Union, Any, Dict
-from app.core.database import get_db
+from app.core.database import get_async_db
 from app.models.part import Part
 from app.schemas.part import PartResponse
 from app.auth.middleware import get_current_user_optional
@@ -19,7 +19,7 @@ async def search_parts_enhanced(
     category: Optional[str] = Query(None, description="类别筛选"),
     skip: int = Query(0, ge=0, description="跳过记录数"),
     limit: int = Query(20, ge=1, le=100, description="返回记录数"),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: Optional[User] = Depends(get_current_user_optional)
 ):
     """
@@ -31,7 +31,7 @@ async def search_parts_enhanced(
     - 多词搜索：所有词都必须匹配（AND逻辑）
     - 示例：搜索"电阻 5V"会找到名称包含"电阻"且属性包含"5V"的零件
     """
-    query = db.query(Part)
+    query = select(Part)
     
     # 如果有搜索关键词
     if q and q.strip():
@@ -69,7 +69,7 @@ async def search_parts_enhanced(
         query = query.filter(Part.category == category)
     
     # 分页
-    parts = query.offset(skip).limit(limit).all()
+    parts = (await db.execute(query.offset(skip).limit(limit))).scalars().all()
     
     return parts
 
@@ -78,23 +78,23 @@ async def get_parts_public(
     skip: int = 0,
     limit: int = 100,
     category: Optional[str] = None,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: Optional[User] = Depends(get_current_user_optional)
 ):
     """获取零件列表（兼容性保持）"""
-    query = db.query(Part)
+    query = select(Part)
     
     if category:
         query = query.filter(Part.category == category)
     
-    parts = query.offset(skip).limit(limit).all()
+    parts = (await db.execute(query.offset(skip).limit(limit))).scalars().all()
     return parts
 
 @router.get("/suggestions", response_model=List[str])
 async def get_search_suggestions(
     q: Optional[str] = Query(None, min_length=1, description="搜索关键词"),
     limit: int = Query(10, ge=1, le=20, description="建议数量"),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: Optional[User] = Depends(get_current_user_optional)
 ):
     """
@@ -108,18 +108,18 @@ async def get_search_suggestions(
     
     try:
         # 获取匹配的类别
-        categories = db.query(Part.category).filter(
+        categories = (await db.execute(select(Part.category).filter(
             Part.category.ilike(search_term)
-        ).distinct().limit(3).all()
+        ).distinct().limit(3))).all()
         
         for cat in categories:
             if cat[0]:
                 suggestions.add(cat[0])
         
         # 获取匹配的零件名称
-        names = db.query(Part.name).filter(
+        names = (await db.execute(select(Part.name).filter(
             Part.name.ilike(search_term)
-        ).limit(5).all()
+        ).limit(5))).all()
         
         for name in names:
             if name[0]:
@@ -127,9 +127,9 @@ async def get_search_suggestions(
         
         # 获取匹配的属性值（从JSON中提取）
         # 这里简化处理，实际生产环境可能需要更复杂的JSON查询
-        parts_with_properties = db.query(Part.properties).filter(
+        parts_with_properties = (await db.execute(select(Part.properties).filter(
             Part.properties.isnot(None)
-        ).limit(50).all()
+        ).limit(50))).all()
         
         for part_props in parts_with_properties:
             if part_props[0]:  # properties不为空
@@ -165,13 +165,13 @@ async def advanced_search(
     properties: Optional[str] = Query(None, description="属性搜索，格式: key:value,key2:value2"),
     skip: int = Query(0, ge=0),
     limit: int = Query(20, ge=1, le=100),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: Optional[User] = Depends(get_current_user_optional)
 ):
     """
     高级搜索API - 支持精确字段搜索
     """
-    query = db.query(Part)
+    query = select(Part)
     
     # 名称搜索
     if name:
@@ -209,33 +209,35 @@ async def advanced_search(
         except Exception as e:
             print(f"属性搜索出错: {e}")
     
-    parts = query.offset(skip).limit(limit).all()
+    parts = (await db.execute(query.offset(skip).limit(limit))).scalars().all()
     return parts
 
 @router.get("/{part_id}", response_model=PartResponse)
 async def get_part_public(
     part_id: int, 
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: Optional[User] = Depends(get_current_user_optional)
 ):
     """获取零件详情（公开API）"""
-    part = db.query(Part).filter(Part.id == part_id).first()
+    part = await db.get(Part, part_id)
     if not part:
         raise HTTPException(status_code=404, detail="零件未找到")
     return part
 
 @router.get("/categories/", response_model=List[str])
 async def get_categories_public(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: Optional[User] = Depends(get_current_user_optional)
 ):
     """获取所有类别（公开API）"""
-    categories = db.query(Part.category).distinct().filter(Part.category.isnot(None)).all()
+    categories = (await db.execute(
+        select(Part.category).distinct().filter(Part.category.isnot(None))
+    )).all()
     return [cat[0] for cat in categories if cat[0]]
 
 @router.get("/filters/metadata")
 async def get_filters_metadata(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: Optional[User] = Depends(get_current_user_optional)
 ):
     """
@@ -244,9 +246,9 @@ async def get_filters_metadata(
     
     try:
         # 获取所有有properties的零件
-        parts_with_properties = db.query(Part.properties, Part.category).filter(
+        parts_with_properties = (await db.execute(select(Part.properties, Part.category).filter(
             Part.properties.isnot(None)
-        ).all()
+        ))).all()
         
         print(f"找到 {len(parts_with_properties)} 个有属性的零件")
         
@@ -555,7 +557,7 @@ async def advanced_search_with_filters(
     skip: int = Query(0, ge=0, description="跳过记录数"),
     limit: int = Query(20, ge=1, le=100, description="返回记录数"),
     
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: Optional[User] = Depends(get_current_user_optional)
 ):
     """
@@ -571,7 +573,7 @@ async def advanced_search_with_filters(
     print(f"  boolean_filters: {boolean_filters}")
     print(f"  sort_by: {sort_by}, sort_order: {sort_order}")
     
-    query = db.query(Part)
+    query = select(Part)
     applied_filters = []  # 记录应用的筛选条件
     
     # 基础关键词搜索
@@ -754,7 +756,7 @@ async def advanced_search_with_filters(
         print(f"应用的筛选条件: {applied_filters}")
         
         # 分页
-        parts = query.offset(skip).limit(limit).all()
+        parts = (await db.execute(query.offset(skip).limit(limit))).scalars().all()
         
         print(f"  返回结果: {len(parts)} 个零件")
         
@@ -773,7 +775,7 @@ async def advanced_search_with_filters(
 # 同时需要修复筛选元数据API，确保正确分析数值字段
 @router.get("/filters/metadata")
 async def get_filters_metadata(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: Optional[User] = Depends(get_current_user_optional)
 ):
     """
@@ -782,9 +784,9 @@ async def get_filters_metadata(
     
     try:
         # 获取所有有properties的零件
-        parts_with_properties = db.query(Part.properties, Part.category).filter(
+        parts_with_properties = (await db.execute(select(Part.properties, Part.category).filter(
             Part.properties.isnot(None)
-        ).all()
+        ))).all()
         
         print(f"分析 {len(parts_with_properties)} 个零件的属性")
         
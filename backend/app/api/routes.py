@@ -11,6 +11,7 @@ from app.api.public.compare import router as compare_router
 from app.api.public.compatibility import router as public_compatibility_router  # 新增公开兼容性API
 from app.api.admin.image_download import router as image_download_router
 from app.api.admin.file_upload import router as file_upload_router
+from app.api.admin.system import router as admin_system_router
 
 api_router = APIRouter()
 
@@ -35,6 +36,9 @@ api_router.include_router(crawler_plugins_router, prefix="/admin/crawler-plugins
 # 兼容性管理（新增）
 api_router.include_router(admin_compatibility_router, prefix="/admin/compatibility", tags=["管理员-兼容性管理"])
 
+# 系统运行状态
+api_router.include_router(admin_system_router, prefix="/admin/system", tags=["管理员-系统状态"])
+
 # ==================== 公开API ====================
 # 零件查询
 api_router.include_router(public_parts_router, prefix="/public/parts", tags=["公开-零件"])
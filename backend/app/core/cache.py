@@ -0,0 +1,148 @@
+# backend/app/core/cache.py
+"""
+进程内缓存工具
+
+提供带容量上限（可选过期时间）的线程安全LRU缓存，并记录命中/未命中/淘汰/过期计数。
+条目可附带标签，按标签精确失效相关条目。
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Iterable, Optional, Set, Tuple
+
+_MISSING = object()
+
+class LRUCache:
+    """线程安全的LRU缓存"""
+
+    def __init__(self, maxsize: int = 1024, ttl_seconds: Optional[float] = None):
+        if maxsize <= 0:
+            raise ValueError("maxsize 必须大于0")
+        if ttl_seconds is not None and ttl_seconds <= 0:
+            raise ValueError("ttl_seconds 必须大于0")
+
+        self.maxsize = maxsize
+        self.ttl_seconds = ttl_seconds
+        # 键 -> (值, 过期时间)，未设置TTL时过期时间为 None
+        self._data: "OrderedDict[Hashable, Tuple[Any, Optional[float]]]" = OrderedDict()
+        # 标签 -> 键集合，键 -> 标签
+        self._tag_index: Dict[Hashable, Set[Hashable]] = {}
+        self._key_tags: Dict[Hashable, Tuple[Hashable, ...]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """获取缓存值，命中时移动到队尾，已过期的条目视为未命中并移除"""
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                self.misses += 1
+                return default
+
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return default
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, tags: Optional[Iterable[Hashable]] = None):
+        """写入缓存，超出容量时淘汰最久未使用的条目"""
+        expires_at = time.monotonic() + self.ttl_seconds if self.ttl_seconds is not None else None
+
+        with self._lock:
+            if key in self._data:
+                self._untag(key)
+                self._data.move_to_end(key)
+            self._data[key] = (value, expires_at)
+
+            if tags:
+                key_tags = tuple(set(tags))
+                self._key_tags[key] = key_tags
+                for tag in key_tags:
+                    self._tag_index.setdefault(tag, set()).add(key)
+
+            while len(self._data) > self.maxsize:
+                evicted_key, _ = self._data.popitem(last=False)
+                self._untag(evicted_key)
+                self.evictions += 1
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        """移除并返回缓存值"""
+        with self._lock:
+            if key not in self._data:
+                return default
+            return self._remove(key)[0]
+
+    def invalidate(self, *tags: Hashable) -> int:
+        """移除同时带有所有指定标签的条目，返回移除数量"""
+        if not tags:
+            return 0
+
+        with self._lock:
+            keys = set(self._tag_index.get(tags[0], ()))
+            for tag in tags[1:]:
+                keys &= self._tag_index.get(tag, set())
+                if not keys:
+                    break
+
+            for key in keys:
+                self._remove(key)
+            self.invalidations += len(keys)
+            return len(keys)
+
+    def clear(self):
+        """清空缓存（保留统计计数）"""
+        with self._lock:
+            self._data.clear()
+            self._tag_index.clear()
+            self._key_tags.clear()
+
+    def _remove(self, key: Hashable) -> Tuple[Any, Optional[float]]:
+        """移除条目及其标签（调用方需持有锁）"""
+        self._untag(key)
+        return self._data.pop(key)
+
+    def _untag(self, key: Hashable):
+        for tag in self._key_tags.pop(key, ()):
+            keys = self._tag_index.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tag_index[tag]
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                return False
+            expires_at = entry[1]
+            return expires_at is None or expires_at > time.monotonic()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        """获取缓存统计信息"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+                "hit_rate": self.hits / total if total else 0.0
+            }
@@ -1,15 +1,60 @@
 # backend/app/core/database.py
+import asyncio
+from typing import AsyncIterator, Awaitable, Callable, Iterator, TypeVar
+
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+from starlette.concurrency import run_in_threadpool
 from .config import settings
+from .pool_metrics import InstrumentedAsyncQueuePool, InstrumentedQueuePool
+
+T = TypeVar("T")
 
 # 创建数据库引擎
-engine = create_engine(settings.database_url)
+engine = create_engine(
+    settings.database_url,
+    poolclass=InstrumentedQueuePool,
+    pool_size=settings.db_pool_size,
+    max_overflow=settings.db_max_overflow,
+    pool_timeout=settings.db_pool_timeout,
+    pool_recycle=settings.db_pool_recycle,
+    pool_pre_ping=settings.db_pool_pre_ping
+)
 
 # 创建会话
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# 异步数据库引擎（与同步引擎使用同一数据库，驱动替换为 asyncpg；SQLite 用于本地基准测试，使用 aiosqlite）
+_ASYNC_DRIVERS = {"postgresql": "postgresql+asyncpg", "sqlite": "sqlite+aiosqlite"}
+
+def _async_database_url(database_url: str) -> str:
+    url = make_url(database_url)
+    drivername = _ASYNC_DRIVERS.get(url.get_backend_name())
+    if drivername:
+        url = url.set(drivername=drivername)
+    return url.render_as_string(hide_password=False)
+
+async_engine = create_async_engine(
+    _async_database_url(settings.database_url),
+    poolclass=InstrumentedAsyncQueuePool,
+    pool_size=settings.async_db_pool_size,
+    max_overflow=settings.async_db_max_overflow,
+    pool_timeout=settings.db_pool_timeout,
+    pool_recycle=settings.db_pool_recycle,
+    pool_pre_ping=settings.db_pool_pre_ping
+)
+
+# 异步会话（expire_on_commit=False：提交后仍可访问已加载属性，避免隐式IO）
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False
+)
+
 # 创建基础模型类
 Base = declarative_base()
 
@@ -19,4 +64,49 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+# 获取异步数据库会话
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+async def run_with_sync_session(func: Callable[[Session], Awaitable[T]]) -> T:
+    """
+    在线程池中使用独立的同步会话执行协程
+
+    兼容性引擎基于同步会话查询数据库，直接在事件循环中执行会阻塞其他请求。
+    这里在工作线程中新建事件循环和会话运行它，使并发请求的数据库IO可以重叠。
+    """
+
+    def _run() -> T:
+        db = SessionLocal()
+        try:
+            return asyncio.run(func(db))
+        finally:
+            db.close()
+
+    return await run_in_threadpool(_run)
+
+def iterate_with_sync_session(func: Callable[[Session], AsyncIterator[T]]) -> Iterator[T]:
+    """
+    使用独立的同步会话和事件循环逐项驱动异步生成器
+
+    返回同步迭代器，交给 StreamingResponse 时在线程池中迭代，
+    流式响应期间同步会话上的查询不会阻塞主事件循环。
+    """
+
+    db = SessionLocal()
+    loop = asyncio.new_event_loop()
+    iterator = func(db)
+    try:
+        while True:
+            try:
+                item = loop.run_until_complete(iterator.__anext__())
+            except StopAsyncIteration:
+                return
+            yield item
+    finally:
+        loop.run_until_complete(iterator.aclose())
+        loop.close()
+        db.close()
@@ -0,0 +1,127 @@
+# backend/app/core/pool_metrics.py
+"""
+数据库连接池指标
+
+在连接池获取连接处计时，记录获取次数、等待次数、等待耗时和超时次数，
+配合连接池自身的占用/溢出计数，用于在压力下评估工作进程数和连接池大小。
+新建连接（TCP连接和认证）的耗时单独统计，不计入等待。
+"""
+
+import threading
+import time
+from typing import Any, Dict
+
+from sqlalchemy import exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+# 获取连接耗时超过该值视为发生了等待（秒）
+WAIT_THRESHOLD_SECONDS = 0.005
+
+class PoolWaitStats:
+    """连接获取等待统计（线程安全）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.acquisitions = 0
+        self.waits = 0
+        self.timeouts = 0
+        self.total_wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self.connects = 0
+        self.total_connect_seconds = 0.0
+        self.max_connect_seconds = 0.0
+
+    def record_connect(self, elapsed: float):
+        with self._lock:
+            self.connects += 1
+            self.total_connect_seconds += elapsed
+            if elapsed > self.max_connect_seconds:
+                self.max_connect_seconds = elapsed
+
+    def record(self, elapsed: float, timed_out: bool = False):
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.acquisitions += 1
+            if elapsed >= WAIT_THRESHOLD_SECONDS:
+                self.waits += 1
+                self.total_wait_seconds += elapsed
+            if elapsed > self.max_wait_seconds:
+                self.max_wait_seconds = elapsed
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "acquisitions": self.acquisitions,
+                "waits": self.waits,
+                "timeouts": self.timeouts,
+                "total_wait_ms": round(self.total_wait_seconds * 1000, 3),
+                "avg_wait_ms": round(self.total_wait_seconds * 1000 / self.waits, 3) if self.waits else 0.0,
+                "max_wait_ms": round(self.max_wait_seconds * 1000, 3),
+                "connects": self.connects,
+                "avg_connect_ms": (
+                    round(self.total_connect_seconds * 1000 / self.connects, 3) if self.connects else 0.0
+                ),
+                "max_connect_ms": round(self.max_connect_seconds * 1000, 3)
+            }
+
+class _WaitTimingMixin:
+    """
+    在 _do_get 处计时（连接池满时调用方在此阻塞等待归还或超时）
+
+    连接池未建满或允许溢出时 _do_get 会新建连接，新建耗时按连接记录暂存，
+    从本次获取的耗时中扣除，只把阻塞在队列上的时间计为等待。
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.wait_stats = PoolWaitStats()
+        # id(新建的连接记录) -> 新建耗时，_do_get 返回前取出
+        self._connect_seconds: Dict[int, float] = {}
+
+    def _do_get(self):
+        start_time = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            self.wait_stats.record(time.perf_counter() - start_time, timed_out=True)
+            raise
+        connect_seconds = self._connect_seconds.pop(id(connection), 0.0)
+        self.wait_stats.record(max(time.perf_counter() - start_time - connect_seconds, 0.0))
+        return connection
+
+    def _create_connection(self):
+        start_time = time.perf_counter()
+        connection = super()._create_connection()
+        elapsed = time.perf_counter() - start_time
+        self._connect_seconds[id(connection)] = elapsed
+        self.wait_stats.record_connect(elapsed)
+        return connection
+
+class InstrumentedQueuePool(_WaitTimingMixin, QueuePool):
+    """带等待统计的同步连接池"""
+
+class InstrumentedAsyncQueuePool(_WaitTimingMixin, AsyncAdaptedQueuePool):
+    """带等待统计的异步连接池"""
+
+def pool_status(pool) -> Dict[str, Any]:
+    """连接池实时状态"""
+
+    status: Dict[str, Any] = {"pool_class": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        status.update({
+            "size": pool.size(),
+            "checked_in": pool.checkedin(),
+            "checked_out": pool.checkedout(),
+            # overflow() 为负数表示尚未建满 pool_size 个连接
+            "overflow": pool.overflow(),
+            "max_overflow": pool._max_overflow,
+            "timeout_seconds": pool.timeout()
+        })
+
+    wait_stats = getattr(pool, "wait_stats", None)
+    if wait_stats is not None:
+        status["wait"] = wait_stats.stats()
+
+    return status
@@ -1,9 +1,12 @@
 from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles  # 确保导入了这个
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.concurrency import run_in_threadpool
 from app.core.config import settings
 from app.api.routes import api_router
+import asyncio
 import os
+import logging
 
 app = FastAPI(
     title="OpenPart API",
@@ -34,6 +37,99 @@ app.add_middleware(
 # 注册路由
 app.include_router(api_router, prefix="/api")
 
+@app.on_event("startup")
+async def warm_up_compatibility_engine():
+    """启动时预热安全验证缓存，预加载兼容性规则索引和经验索引（失败时在首次使用时再加载）"""
+    from app.core.database import SessionLocal
+    from app.services.compatibility_engine import compatibility_engine
+
+    db = SessionLocal()
+    try:
+        # 先预热安全验证缓存，规则编译时直接复用验证结果
+        compatibility_engine.expression_engine.load_security_cache(db)
+    except Exception as e:
+        logging.getLogger(__name__).warning(f"预热安全验证缓存失败: {str(e)}")
+        db.rollback()
+
+    try:
+        compatibility_engine.rule_index.load(db)
+        compatibility_engine.experience_index.load(db)
+    except Exception as e:
+        logging.getLogger(__name__).warning(f"预加载兼容性索引失败: {str(e)}")
+    finally:
+        db.close()
+
+# 安全验证结果写回数据库缓存表的间隔（秒）
+SECURITY_CACHE_FLUSH_INTERVAL_SECONDS = 60
+
+def _flush_security_cache():
+    """将排队的安全验证结果批量写回数据库缓存表"""
+    from app.core.database import SessionLocal
+    from app.services.compatibility_engine import compatibility_engine
+
+    db = SessionLocal()
+    try:
+        return compatibility_engine.expression_engine.flush_security_cache(db)
+    finally:
+        db.close()
+
+async def _run_security_cache_flush_loop():
+    while True:
+        await asyncio.sleep(SECURITY_CACHE_FLUSH_INTERVAL_SECONDS)
+        try:
+            await run_in_threadpool(_flush_security_cache)
+        except Exception as e:
+            logging.getLogger(__name__).warning(f"写回安全验证缓存失败: {str(e)}")
+
+@app.on_event("startup")
+async def start_security_cache_flush():
+    """启动安全验证结果的后台批量写回任务"""
+    app.state.security_cache_flush_task = asyncio.create_task(_run_security_cache_flush_loop())
+
+@app.on_event("shutdown")
+async def stop_security_cache_flush():
+    """停止后台写回任务，并写回剩余的安全验证结果"""
+    task = getattr(app.state, "security_cache_flush_task", None)
+    if task is not None:
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    try:
+        await run_in_threadpool(_flush_security_cache)
+    except Exception as e:
+        logging.getLogger(__name__).warning(f"写回安全验证缓存失败: {str(e)}")
+
+@app.on_event("startup")
+async def start_compatibility_graph_refresh():
+    """启动兼容性图后台刷新任务"""
+    from app.services.compatibility_graph import compatibility_graph
+
+    compatibility_graph.start()
+
+@app.on_event("shutdown")
+async def stop_compatibility_graph_refresh():
+    """停止兼容性图后台刷新任务"""
+    from app.services.compatibility_graph import compatibility_graph
+
+    await compatibility_graph.stop()
+
+@app.on_event("shutdown")
+async def shutdown_rule_evaluation_pool():
+    """关闭规则并行评估进程池"""
+    from app.services.compatibility_engine import compatibility_engine
+
+    compatibility_engine.parallel_evaluator.shutdown()
+
+@app.on_event("shutdown")
+async def dispose_async_database_engine():
+    """关闭异步数据库引擎的连接池"""
+    from app.core.database import async_engine
+
+    await async_engine.dispose()
+
 @app.get("/")
 async def root():
     return {
@@ -5,12 +5,12 @@
 包含所有兼容性相关的SQLAlchemy模型定义
 """
 
-from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime, JSON, ForeignKey, CheckConstraint, Index
+from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime, Float, JSON, ForeignKey, CheckConstraint, Index, and_, or_
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from sqlalchemy.dialects.postgresql import JSONB, INET
 from app.core.database import Base
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Iterable, Tuple
 import enum
 
 class CompatibilityStatus(enum.Enum):
@@ -125,17 +125,55 @@ class CompatibilityCache(Base):
     id = Column(Integer, primary_key=True, index=True)
     part_ids_hash = Column(String(64), nullable=False, unique=True, index=True, comment="零件ID组合哈希")
     part_ids = Column(JSONB, nullable=False, comment="零件ID列表")
+    categories = Column(JSONB, comment="涉及的零件类别列表")
     compatibility_result = Column(JSONB, nullable=False, comment="兼容性检查结果")
     calculated_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     expires_at = Column(DateTime(timezone=True), index=True, comment="过期时间")
     
     __table_args__ = (
         Index('ix_compatibility_cache_expires_calc', 'expires_at', 'calculated_at'),
+        # 按零件/类别定向失效缓存（JSONB 包含查询 @>）
+        Index('ix_compatibility_cache_part_ids_gin', 'part_ids', postgresql_using='gin'),
+        Index('ix_compatibility_cache_categories_gin', 'categories', postgresql_using='gin'),
     )
     
     def __repr__(self):
         return f"<CompatibilityCache(id={self.id}, hash='{self.part_ids_hash[:8]}...', expires={self.expires_at})>"
 
+class CompatibilityGraphNode(Base):
+    """兼容性图节点模型（记录每个零件的预计算建议状态）"""
+    __tablename__ = "compatibility_graph_nodes"
+    
+    part_id = Column(Integer, ForeignKey("parts.id", ondelete="CASCADE"), primary_key=True, comment="零件ID")
+    is_stale = Column(Boolean, nullable=False, default=True, index=True, comment="建议列表是否需要重新计算")
+    candidate_dirty = Column(Boolean, nullable=False, default=True, index=True, comment="零件作为候选是否需要合并到其他零件的建议列表")
+    marked_at = Column(DateTime(timezone=True), nullable=False, comment="最近一次标记变更的时间")
+    computed_at = Column(DateTime(timezone=True), comment="最近一次计算完成的时间")
+    
+    def __repr__(self):
+        return f"<CompatibilityGraphNode(part_id={self.part_id}, stale={self.is_stale}, dirty={self.candidate_dirty})>"
+
+class CompatibilityGraphEdge(Base):
+    """兼容性图边模型（零件在每个目标类别下的前N个兼容零件）"""
+    __tablename__ = "compatibility_graph_edges"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    part_id = Column(Integer, ForeignKey("parts.id", ondelete="CASCADE"), nullable=False, comment="零件ID")
+    target_category = Column(String(100), nullable=False, comment="建议零件类别（未分类为空字符串）")
+    rank = Column(Integer, nullable=False, comment="类别内排名（从0开始）")
+    # 不设外键：建议零件删除后由读取时与 parts 表的连接过滤，并标记引用它的节点重新计算
+    suggested_part_id = Column(Integer, nullable=False, index=True, comment="建议零件ID")
+    compatibility_score = Column(Integer, nullable=False, comment="兼容性评分")
+    confidence_level = Column(Float, nullable=False, comment="置信度")
+    
+    __table_args__ = (
+        Index('ix_compatibility_graph_edges_part_category_rank', 'part_id', 'target_category', 'rank', unique=True),
+        Index('ix_compatibility_graph_edges_part_score', 'part_id', 'compatibility_score'),
+    )
+    
+    def __repr__(self):
+        return f"<CompatibilityGraphEdge(part={self.part_id}, suggested={self.suggested_part_id}, score={self.compatibility_score})>"
+
 class CompatibilityTemplate(Base):
     """零件组合模板模型"""
     __tablename__ = "compatibility_templates"
@@ -234,12 +272,58 @@ def get_active_rules_for_categories(db, category_a: str, category_b: str) -> Lis
     
     return db.query(CompatibilityRule).filter(
         CompatibilityRule.is_active == True,
-        (
-            (CompatibilityRule.category_a == category_a and CompatibilityRule.category_b == category_b) |
-            (CompatibilityRule.category_a == category_b and CompatibilityRule.category_b == category_a)
+        or_(
+            and_(CompatibilityRule.category_a == category_a, CompatibilityRule.category_b == category_b),
+            and_(CompatibilityRule.category_a == category_b, CompatibilityRule.category_b == category_a)
         )
     ).order_by(CompatibilityRule.weight.desc()).all()
 
+def get_compatibility_experiences_for_pairs(
+    db, 
+    part_id_pairs: Iterable[Tuple[int, int]]
+) -> Dict[Tuple[int, int], CompatibilityExperience]:
+    """
+    批量获取多个零件对的兼容性经验（一次查询，支持双向查找）
+    
+    返回字典的键为经验记录自身的 (part_a_id, part_b_id)，
+    调用方可先按 (a, b) 再按 (b, a) 查找，与 get_compatibility_experience_by_parts 的优先顺序一致
+    """
+    
+    requested = set()
+    left_ids = set()
+    right_ids = set()
+    for part_a_id, part_b_id in part_id_pairs:
+        requested.add((part_a_id, part_b_id))
+        requested.add((part_b_id, part_a_id))
+        left_ids.add(part_a_id)
+        right_ids.add(part_b_id)
+    
+    if not requested:
+        return {}
+    
+    experiences = db.query(CompatibilityExperience).filter(
+        or_(
+            and_(
+                CompatibilityExperience.part_a_id.in_(left_ids),
+                CompatibilityExperience.part_b_id.in_(right_ids)
+            ),
+            and_(
+                CompatibilityExperience.part_a_id.in_(right_ids),
+                CompatibilityExperience.part_b_id.in_(left_ids)
+            )
+        )
+    ).all()
+    
+    return {
+        (exp.part_a_id, exp.part_b_id): exp
+        for exp in experiences
+        if (exp.part_a_id, exp.part_b_id) in requested
+    }
+
+def make_category_pair_key(category_a: str, category_b: str) -> Tuple[str, str]:
+    """生成与顺序无关的类别组合键"""
+    return (category_a, category_b) if category_a <= category_b else (category_b, category_a)
+
 def create_part_ids_hash(part_ids: List[int]) -> str:
     """创建零件ID列表的哈希值"""
     import hashlib
@@ -81,10 +81,26 @@ class RuleResponse(RuleBase):
     class Config:
         from_attributes = True
 
+RULE_TEST_MAX_CASES = 10000  # 单次批量测试的最大用例数
+
 class RuleTestRequest(BaseModel):
-    """规则测试请求Schema"""
+    """规则测试请求Schema（test_data 单条测试，test_cases 批量测试，二选一）"""
     expression: str = Field(..., description="要测试的表达式")
-    test_data: Dict[str, Any] = Field(..., description="测试数据")
+    test_data: Optional[Dict[str, Any]] = Field(None, description="测试数据")
+    test_cases: Optional[List[Dict[str, Any]]] = Field(
+        None, min_items=1, max_items=RULE_TEST_MAX_CASES, description="批量测试数据"
+    )
+    
+    @validator('test_cases', always=True)
+    def validate_test_input(cls, v, values):
+        if (values.get('test_data') is None) == (v is None):
+            raise ValueError('请指定 test_data 或 test_cases（二选一）')
+        return v
+
+class RuleTestCaseError(BaseModel):
+    """批量测试中单个用例的错误"""
+    index: int
+    error_message: str
 
 class RuleTestResponse(BaseModel):
     """规则测试响应Schema"""
@@ -93,6 +109,10 @@ class RuleTestResponse(BaseModel):
     execution_time: float
     error_message: Optional[str] = None
     security_check: Dict[str, Any]
+    # 批量测试：与 test_cases 一一对应（出错的用例为 None）
+    results: Optional[List[Optional[bool]]] = None
+    errors: List[RuleTestCaseError] = []
+    passed_count: Optional[int] = None
 
 class SecurityValidationRequest(BaseModel):
     """安全验证请求Schema"""
@@ -182,6 +202,7 @@ class RuleResult(BaseModel):
     is_blocking: bool
     error_message: Optional[str] = None
     execution_time: Optional[float] = None
+    not_applicable: bool = False  # 零件缺少规则所需属性，规则未执行，不参与评分
 
 class PartCompatibilityResult(BaseModel):
     """零件对兼容性结果Schema"""
@@ -189,6 +210,8 @@ class PartCompatibilityResult(BaseModel):
     part_b_id: int
     part_a_name: str
     part_b_name: str
+    part_a_category: Optional[str] = None
+    part_b_category: Optional[str] = None
     compatibility_grade: CompatibilityGrade
     compatibility_score: int
     is_compatible: bool
@@ -239,6 +262,50 @@ class CompatibilitySearchResponse(BaseModel):
     execution_time: float
     recommendations: List[str] = Field(default_factory=list)
 
+# ==================== 增量配置校验相关Schema ====================
+
+class BuildSessionCreateRequest(BaseModel):
+    """创建装机会话请求Schema"""
+    part_ids: List[int] = Field(default_factory=list, max_items=50, description="初始零件ID列表")
+    detail_level: str = Field("standard", description="详细程度: basic/standard/detailed")
+
+class BuildPartAddRequest(BaseModel):
+    """装机会话添加零件请求Schema"""
+    part_ids: List[int] = Field(..., min_items=1, max_items=50, description="要添加的零件ID列表")
+
+class BuildSessionResponse(BaseModel):
+    """装机会话响应Schema（只包含本次变化的零件对）"""
+    build_id: str
+    part_ids: List[int]
+    changed_pairs: List[PartCompatibilityResult] = Field(default_factory=list, description="新增或结果变化的零件对")
+    removed_pairs: List[List[int]] = Field(default_factory=list, description="移除的零件对 [part_a_id, part_b_id]")
+    overall_score: int
+    overall_compatibility_grade: CompatibilityGrade
+    is_overall_compatible: bool
+    overall_changed: bool
+    pair_count: int
+    execution_time: float
+    expires_in_seconds: int
+
+# ==================== 兼容性矩阵相关Schema ====================
+
+MATRIX_MAX_PARTS = 500  # 矩阵每个维度的最大零件数
+
+class CompatibilityMatrixRequest(BaseModel):
+    """兼容性矩阵请求Schema（行、列分别指定零件ID列表或类别）"""
+    row_part_ids: Optional[List[int]] = Field(None, min_items=1, max_items=MATRIX_MAX_PARTS, description="行零件ID列表")
+    column_part_ids: Optional[List[int]] = Field(None, min_items=1, max_items=MATRIX_MAX_PARTS, description="列零件ID列表")
+    row_category: Optional[str] = Field(None, min_length=1, max_length=100, description="行零件类别")
+    column_category: Optional[str] = Field(None, min_length=1, max_length=100, description="列零件类别")
+    
+    @validator('column_category', always=True)
+    def validate_matrix_axes(cls, v, values):
+        by_ids = values.get('row_part_ids') is not None and values.get('column_part_ids') is not None
+        by_categories = values.get('row_category') is not None and v is not None
+        if by_ids == by_categories:
+            raise ValueError('请同时指定行列零件ID列表，或同时指定行列类别（二选一）')
+        return v
+
 # ==================== 模板相关Schema ====================
 
 class TemplateBase(BaseModel):
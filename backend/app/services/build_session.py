@@ -0,0 +1,275 @@
+# backend/app/services/build_session.py
+"""
+增量配置校验（装机会话）
+
+前端配置器每次添加或移除零件时只评估新增的零件对，会话在内存中保存各零件对结果
+和整体评分的累计量（带过期时间），响应只返回变化部分。
+规则或经验数据版本变化后，下一次添加零件或读取会话时重新评估会话中已有的零件对（复用零件对缓存）；
+零件被编辑（updated_at 变化）后只重新评估涉及该零件的零件对。
+"""
+
+import threading
+import time
+import uuid
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+from sqlalchemy.orm import Session
+
+from app.core.cache import LRUCache
+from app.models.part import Part
+from app.schemas.compatibility import CompatibilityGrade, PartCompatibilityResult
+from app.services.compatibility_engine import CompatibilityEngine, compatibility_engine
+import logging
+
+logger = logging.getLogger(__name__)
+
+PairKey = Tuple[int, int]
+
+# 与 CompatibilityEngine._calculate_overall_compatibility 一致的等级分数上限
+_GRADE_SCORE_CAPS = {
+    CompatibilityGrade.OFFICIAL_SUPPORT: 95,
+    CompatibilityGrade.UNOFFICIAL_SUPPORT: 80,
+    CompatibilityGrade.THEORETICAL: 60,
+    CompatibilityGrade.INCOMPATIBLE: 0
+}
+
+class RunningCompatibility:
+    """
+    整体兼容性的累计量
+
+    结果与 CompatibilityEngine._calculate_overall_compatibility 对全部零件对计算的结果一致，
+    增删零件对为 O(1)，计算整体结果只与不同评分/等级的个数有关。
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.score_sum = 0
+        self.incompatible_scores: Counter = Counter()
+        self.grades: Counter = Counter()
+
+    def add(self, result: PartCompatibilityResult):
+        self.count += 1
+        self.score_sum += result.compatibility_score
+        self.grades[result.compatibility_grade] += 1
+        if not result.is_compatible:
+            self.incompatible_scores[result.compatibility_score] += 1
+
+    def remove(self, result: PartCompatibilityResult):
+        self.count -= 1
+        self.score_sum -= result.compatibility_score
+        _decrement(self.grades, result.compatibility_grade)
+        if not result.is_compatible:
+            _decrement(self.incompatible_scores, result.compatibility_score)
+
+    def overall(self) -> Tuple[int, CompatibilityGrade, bool]:
+        if not self.count:
+            return 100, CompatibilityGrade.OFFICIAL_SUPPORT, True
+
+        if self.incompatible_scores:
+            return min(self.incompatible_scores), CompatibilityGrade.INCOMPATIBLE, False
+
+        min_grade = min(self.grades)
+        return min(int(self.score_sum / self.count), _GRADE_SCORE_CAPS[min_grade]), min_grade, True
+
+def _decrement(counter: Counter, key: Any):
+    counter[key] -= 1
+    if counter[key] <= 0:
+        del counter[key]
+
+class BuildSession:
+    """单个装机会话"""
+
+    def __init__(self, build_id: str, detail_level: str):
+        self.build_id = build_id
+        self.detail_level = detail_level
+        self.part_ids: List[int] = []
+        self.pair_results: Dict[PairKey, PartCompatibilityResult] = {}
+        # 已有零件对结果所基于的零件版本（零件ID -> updated_at）
+        self.part_versions: Dict[int, Any] = {}
+        self.running = RunningCompatibility()
+        # 已有零件对结果对应的规则集和经验数据版本
+        self.rule_version: Optional[int] = None
+        self.experience_version: Optional[int] = None
+        # 同一会话的并发修改串行执行
+        self.lock = threading.Lock()
+
+    def set_pair(self, result: PartCompatibilityResult) -> bool:
+        """写入零件对结果，返回结果是否发生变化"""
+
+        key = (result.part_a_id, result.part_b_id)
+        previous = self.pair_results.get(key)
+        if previous is not None:
+            self.running.remove(previous)
+        self.pair_results[key] = result
+        self.running.add(result)
+
+        return previous is None or (
+            previous.compatibility_score, previous.compatibility_grade, previous.is_compatible, previous.warnings
+        ) != (
+            result.compatibility_score, result.compatibility_grade, result.is_compatible, result.warnings
+        )
+
+    def remove_part(self, part_id: int) -> List[PairKey]:
+        """移除零件及其所有零件对，返回移除的零件对"""
+
+        if part_id not in self.part_ids:
+            return []
+
+        self.part_ids.remove(part_id)
+        self.part_versions.pop(part_id, None)
+        removed = [key for key in self.pair_results if part_id in key]
+        for key in removed:
+            self.running.remove(self.pair_results.pop(key))
+        return removed
+
+class BuildSessionManager:
+    """装机会话管理器"""
+
+    def __init__(
+        self,
+        engine: CompatibilityEngine,
+        max_parts: int = 50,
+        ttl_seconds: int = 3600,
+        max_sessions: int = 10000
+    ):
+        self.engine = engine
+        self.max_parts = max_parts
+        self.ttl_seconds = ttl_seconds  # 每次修改后重新计时
+        self._sessions = LRUCache(maxsize=max_sessions, ttl_seconds=ttl_seconds)
+
+    def create(self, detail_level: str = "standard") -> BuildSession:
+        """创建空会话"""
+
+        session = BuildSession(uuid.uuid4().hex, detail_level)
+        self._sessions.set(session.build_id, session)
+        return session
+
+    def get(self, build_id: str) -> Optional[BuildSession]:
+        return self._sessions.get(build_id)
+
+    def delete(self, build_id: str) -> bool:
+        return self._sessions.pop(build_id) is not None
+
+    async def add_parts(self, session: BuildSession, part_ids: List[int], db: Session) -> Dict[str, Any]:
+        """
+        向会话添加零件，只评估新零件与已有零件（及新零件之间）的零件对
+
+        零件对方向与 check_compatibility 一致：先加入会话的零件为 part_a。
+        """
+
+        start_time = time.time()
+
+        with session.lock:
+            new_ids = [part_id for part_id in dict.fromkeys(part_ids) if part_id not in session.part_ids]
+            if len(session.part_ids) + len(new_ids) > self.max_parts:
+                raise ValueError(f"装机会话最多包含{self.max_parts}个零件")
+
+            before = session.running.overall()
+
+            parts = {
+                part.id: part
+                for part in db.query(Part).filter(Part.id.in_(session.part_ids + new_ids)).all()
+            }
+            missing_ids = [part_id for part_id in new_ids if part_id not in parts]
+            if missing_ids:
+                raise LookupError(f"未找到零件: {missing_ids}")
+
+            # 会话中已被删除的零件一并移出会话
+            removed_pairs = []
+            for part_id in [part_id for part_id in session.part_ids if part_id not in parts]:
+                removed_pairs.extend(session.remove_part(part_id))
+
+            part_pairs = []
+            if session.pair_results:
+                if self._is_outdated(session, db):
+                    outdated_pairs = list(session.pair_results)
+                else:
+                    # 零件在会话上次评估后被编辑过，只重新评估涉及它的零件对
+                    edited_ids = {
+                        part_id for part_id in session.part_ids
+                        if session.part_versions.get(part_id) != parts[part_id].updated_at
+                    }
+                    outdated_pairs = [key for key in session.pair_results if edited_ids.intersection(key)]
+                part_pairs.extend((parts[part_a_id], parts[part_b_id]) for part_a_id, part_b_id in outdated_pairs)
+            for index, part_id in enumerate(new_ids):
+                part_pairs.extend(
+                    (parts[existing_id], parts[part_id])
+                    for existing_id in session.part_ids + new_ids[:index]
+                )
+
+            results = await self.engine.check_part_pairs(part_pairs, db, session.detail_level)
+            session.part_ids.extend(new_ids)
+            session.part_versions = {part_id: parts[part_id].updated_at for part_id in session.part_ids}
+            changed_pairs = [result for result in results if session.set_pair(result)]
+            session.rule_version = self.engine.rule_index.version
+            session.experience_version = self.engine.experience_index.version
+
+            self._sessions.set(session.build_id, session)
+            return self._build_delta(session, before, changed_pairs, removed_pairs, start_time)
+
+    async def refresh(self, session: BuildSession, db: Session) -> Dict[str, Any]:
+        """重新评估过期的零件对（规则/经验版本变化或零件被编辑）后返回会话的完整状态"""
+
+        await self.add_parts(session, [], db)
+        return self.snapshot(session)
+
+    def remove_part(self, session: BuildSession, part_id: int) -> Dict[str, Any]:
+        """从会话移除零件，只需在内存中移除相关零件对"""
+
+        start_time = time.time()
+
+        with session.lock:
+            before = session.running.overall()
+            removed_pairs = session.remove_part(part_id)
+
+            self._sessions.set(session.build_id, session)
+            return self._build_delta(session, before, [], removed_pairs, start_time)
+
+    def snapshot(self, session: BuildSession) -> Dict[str, Any]:
+        """会话当前的完整状态"""
+
+        with session.lock:
+            return self._build_delta(
+                session, None, list(session.pair_results.values()), [], time.time()
+            )
+
+    def _is_outdated(self, session: BuildSession, db: Session) -> bool:
+        """规则集或经验数据在会话上次评估后是否发生变化"""
+
+        self.engine.rule_index.ensure_loaded(db)
+        self.engine.experience_index.ensure_loaded(db)
+        return (
+            session.rule_version != self.engine.rule_index.version or
+            session.experience_version != self.engine.experience_index.version
+        )
+
+    def _build_delta(
+        self,
+        session: BuildSession,
+        before: Optional[Tuple[int, CompatibilityGrade, bool]],
+        changed_pairs: List[PartCompatibilityResult],
+        removed_pairs: List[PairKey],
+        start_time: float
+    ) -> Dict[str, Any]:
+        overall = session.running.overall()
+        score, grade, is_compatible = overall
+
+        return {
+            "build_id": session.build_id,
+            "part_ids": list(session.part_ids),
+            "changed_pairs": changed_pairs,
+            "removed_pairs": [list(key) for key in removed_pairs],
+            "overall_score": score,
+            "overall_compatibility_grade": grade,
+            "is_overall_compatible": is_compatible,
+            "overall_changed": before is None or before != overall,
+            "pair_count": len(session.pair_results),
+            "execution_time": time.time() - start_time,
+            "expires_in_seconds": self.ttl_seconds
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        return self._sessions.stats()
+
+# 全局装机会话管理器实例
+build_session_manager = BuildSessionManager(compatibility_engine)
@@ -6,16 +6,17 @@
 """
 
 import time
+import heapq
 import asyncio
+from itertools import islice
 from datetime import datetime, timedelta
-from typing import List, Dict, Any, Optional, Tuple
+from typing import AsyncIterator, List, Dict, Any, NamedTuple, Optional, Tuple
 from sqlalchemy.orm import Session
 from sqlalchemy import and_, or_
 
 from app.models.compatibility import (
     CompatibilityRule, CompatibilityExperience, CompatibilityCache,
-    get_compatibility_experience_by_parts, get_active_rules_for_categories,
-    create_part_ids_hash
+    get_compatibility_experiences_for_pairs, create_part_ids_hash
 )
 from app.models.part import Part
 from app.schemas.compatibility import (
@@ -25,18 +26,54 @@ from app.schemas.compatibility import (
     CompatibilityGrade, CompatibilityStatus
 )
 from app.services.safe_expression_parser import SafeExpressionEngine
+from app.services.rule_index import RuleIndex, IndexedRule
+from app.services.experience_index import ExperienceIndex
+from app.services.vectorized_screening import VectorizedScreener
+from app.services.parallel_evaluation import ParallelRuleEvaluator
+from app.services.part_context import PartContext, PartContextCache
+from app.services.rule_profiler import RuleProfiler
 from app.core.config import settings
+from app.core.cache import LRUCache
 import logging
 
 logger = logging.getLogger(__name__)
 
+class RuleOutcome(NamedTuple):
+    """快速失败模式下的规则执行结果（字段与 RuleResult 同名，供评分和警告计算使用）"""
+    rule_id: int
+    rule_name: str
+    passed: bool
+    score: float
+    weight: int
+    is_blocking: bool
+    not_applicable: bool = False
+
 class CompatibilityEngine:
     """兼容性检查引擎"""
     
     def __init__(self):
         self.expression_engine = SafeExpressionEngine()
+        self.rule_index = RuleIndex(self.expression_engine)
+        self.experience_index = ExperienceIndex()
+        self.vector_screener = VectorizedScreener()
+        self.parallel_evaluator = ParallelRuleEvaluator(max_workers=settings.compatibility_eval_workers)
+        self.search_batch_size = 500  # 兼容性搜索每批读取的候选零件数
+        self.matrix_batch_pairs = 5000  # 兼容性矩阵每批评估的零件对数
+        self.context_cache = PartContextCache()  # 零件规则执行上下文，按 (零件ID, 更新时间) 缓存
+        self.rule_profiler = RuleProfiler(enabled=settings.compatibility_rule_profiling)  # 按规则聚合执行耗时
         self.cache_ttl_hours = 24  # 缓存24小时
         
+        # 进程内结果缓存（位于数据库缓存之前），保存已构建的响应对象；
+        # 键包含规则集和经验数据版本，其他进程的变更随索引重新加载（版本递增）失效，
+        # 过期时间不超过索引的最长复用时间，零件变更造成的过期结果同样有上限
+        self.result_cache = LRUCache(
+            maxsize=2048,
+            ttl_seconds=min(self.rule_index.max_age_seconds, self.experience_index.max_age_seconds)
+        )
+        
+        # 零件对结果缓存，键包含规则集和经验数据版本，规则或经验变化后旧条目自然失效
+        self.pair_cache = LRUCache(maxsize=8192, ttl_seconds=600)
+        
     async def check_compatibility(
         self, 
         request: CompatibilityCheckRequest, 
@@ -74,16 +111,19 @@ class CompatibilityEngine:
             warnings = []
             recommendations = []
             
-            # 检查每对零件的兼容性
-            for i, part_a in enumerate(parts):
-                for j, part_b in enumerate(parts[i+1:], i+1):
-                    combination_result = await self._check_part_pair_compatibility(
-                        part_a, part_b, db, request.detail_level
-                    )
-                    part_combinations.append(combination_result)
-                    
-                    # 收集警告和建议
-                    warnings.extend(combination_result.warnings)
+            # 批量检查每对零件的兼容性
+            part_pairs = [
+                (part_a, part_b)
+                for i, part_a in enumerate(parts)
+                for part_b in parts[i+1:]
+            ]
+            part_combinations = await self._check_part_pairs_memoized(
+                part_pairs, db, request.detail_level
+            )
+            
+            # 收集警告和建议
+            for combination_result in part_combinations:
+                warnings.extend(combination_result.warnings)
             
             # 计算整体兼容性
             overall_score, overall_grade, overall_compatible = self._calculate_overall_compatibility(
@@ -108,7 +148,10 @@ class CompatibilityEngine:
             
             # 缓存结果
             if request.include_cache:
-                await self._cache_result(request.part_ids, response, db)
+                await self._cache_result(
+                    request.part_ids, response, db,
+                    sorted({part.category or "" for part in parts})
+                )
             
             logger.info(f"兼容性检查完成，零件: {request.part_ids}, 整体评分: {overall_score}")
             return response
@@ -141,34 +184,30 @@ class CompatibilityEngine:
                 missing_ids = set(request.selected_parts) - {p.id for p in selected_parts}
                 raise ValueError(f"未找到零件: {list(missing_ids)}")
             
-            # 构建候选零件查询
-            candidates_query = db.query(Part).filter(
-                ~Part.id.in_(request.selected_parts)  # 排除已选择的零件
-            )
-            
-            # 按目标类别筛选
-            if request.target_categories:
-                candidates_query = candidates_query.filter(
-                    Part.category.in_(request.target_categories)
-                )
+            # 有界最小堆保存当前最好的 limit 个匹配，键为 (评分, 置信度, -序号)，同分时先出现的候选优先
+            top_matches: List[Tuple[Tuple[int, float, int], CompatibilityMatch]] = []
+            sequence = 0
             
-            candidate_parts = candidates_query.limit(1000).all()  # 限制候选数量避免性能问题
-            
-            # 检查每个候选零件与已选零件的兼容性
-            matches = []
-            for candidate in candidate_parts:
-                match_result = await self._evaluate_candidate_compatibility(
-                    candidate, selected_parts, request, db
-                )
+            candidate_matches = self._iter_candidate_matches(selected_parts, request.target_categories, db)
+            async for _, match_result in candidate_matches:
+                if match_result.compatibility_score < request.min_compatibility_score:
+                    continue
+                
+                sequence += 1
+                key = (match_result.compatibility_score, match_result.confidence_level, -sequence)
+                if len(top_matches) < request.limit:
+                    heapq.heappush(top_matches, (key, match_result))
+                elif key > top_matches[0][0]:
+                    heapq.heapreplace(top_matches, (key, match_result))
                 
-                if match_result and match_result.compatibility_score >= request.min_compatibility_score:
-                    matches.append(match_result)
+                # 已有 limit 个满分且满置信度的匹配时，后续候选不可能进入结果
+                if len(top_matches) >= request.limit and top_matches[0][0][:2] >= (100, 1.0):
+                    logger.info(f"兼容性搜索提前结束，已检查 {sequence} 个匹配候选")
+                    break
+            await candidate_matches.aclose()
             
             # 按兼容性评分排序
-            matches.sort(key=lambda x: (x.compatibility_score, x.confidence_level), reverse=True)
-            
-            # 限制返回结果数量
-            matches = matches[:request.limit]
+            matches = [match for _, match in sorted(top_matches, key=lambda item: item[0], reverse=True)]
             
             response = CompatibilitySearchResponse(
                 success=True,
@@ -190,6 +229,180 @@ class CompatibilityEngine:
             logger.error(f"兼容性搜索失败: {str(e)}")
             raise
 
+    async def find_top_matches_by_category(
+        self, 
+        part: Part, 
+        db: Session,
+        per_category_limit: int
+    ) -> Dict[str, List[CompatibilityMatch]]:
+        """
+        按候选零件类别分别获取与指定零件最兼容的前 per_category_limit 个零件
+        
+        排序与 search_compatible_parts 一致（评分、置信度降序，同分时零件ID小的优先），
+        类别为空的候选零件归入空字符串类别。供兼容性图预计算使用。
+        """
+        
+        heaps: Dict[str, List[Tuple[Tuple[int, float, int], CompatibilityMatch]]] = {}
+        
+        async for candidate, match_result in self._iter_candidate_matches([part], None, db):
+            # 候选按ID升序产生，-part_id 与搜索中的 -序号 排序等价
+            key = (match_result.compatibility_score, match_result.confidence_level, -candidate.id)
+            top_matches = heaps.setdefault(candidate.category or "", [])
+            if len(top_matches) < per_category_limit:
+                heapq.heappush(top_matches, (key, match_result))
+            elif key > top_matches[0][0]:
+                heapq.heapreplace(top_matches, (key, match_result))
+        
+        return {
+            category: [match for _, match in sorted(top_matches, key=lambda item: item[0], reverse=True)]
+            for category, top_matches in heaps.items()
+        }
+
+    async def match_candidate_against_parts(
+        self,
+        candidate: Part,
+        parts: List[Part],
+        db: Session
+    ) -> List[Optional[CompatibilityMatch]]:
+        """
+        分别评估候选零件作为每个零件的单独搜索结果时的匹配（不兼容时为 None）
+
+        结果与 search_compatible_parts(selected_parts=[part]) 中该候选的匹配一致，
+        返回列表与 parts 顺序一致。
+        """
+
+        pair_results = await self._check_part_pairs_compatibility(
+            [(candidate, part) for part in parts], db, "basic"
+        )
+
+        return [
+            self._evaluate_candidate_compatibility(candidate, [part], [pair_result])
+            for part, pair_result in zip(parts, pair_results)
+        ]
+
+    async def check_part_pairs(
+        self, 
+        part_pairs: List[Tuple[Part, Part]], 
+        db: Session,
+        detail_level: str = "standard"
+    ) -> List[PartCompatibilityResult]:
+        """批量检查给定的零件对（复用零件对缓存），返回结果与输入顺序一致；供增量配置校验使用"""
+        
+        return await self._check_part_pairs_memoized(part_pairs, db, detail_level)
+
+    async def check_part_pairs_with_rules(
+        self,
+        part_pairs: List[Tuple[Part, Part]],
+        rules_by_pair: List[List[IndexedRule]],
+        db: Session,
+        detail_level: str = "basic"
+    ) -> List[PartCompatibilityResult]:
+        """
+        使用指定的规则（而非规则索引中的活跃规则）检查零件对，不读写任何缓存
+        
+        供规则影响分析对比加入候选规则前后的结果，rules_by_pair 与 part_pairs 一一对应。
+        """
+        
+        if not part_pairs:
+            return []
+        
+        self.experience_index.ensure_loaded(db)
+        experience_pairs = self.experience_index.filter_pairs(
+            (part_a.id, part_b.id) for part_a, part_b in part_pairs
+        )
+        experiences = get_compatibility_experiences_for_pairs(db, experience_pairs)
+        
+        results = []
+        for (part_a, part_b), rules in zip(part_pairs, rules_by_pair):
+            experience = (
+                experiences.get((part_a.id, part_b.id)) or
+                experiences.get((part_b.id, part_a.id))
+            )
+            results.append(await self._evaluate_part_pair(part_a, part_b, experience, rules, detail_level))
+        
+        return results
+
+    async def iter_compatibility_matrix(
+        self, 
+        row_parts: List[Part], 
+        column_parts: List[Part], 
+        db: Session
+    ) -> AsyncIterator[Tuple[Part, List[Optional[PartCompatibilityResult]]]]:
+        """
+        逐行计算兼容性矩阵，产生 (行零件, 与各列零件的零件对结果)
+        
+        单元格与 quick-check 一致（basic 模式，零件对方向为 行→列），行零件与列零件相同时为 None。
+        行零件分批处理：每批先与所有列零件向量化预筛，经验数据每批一次查询加载，
+        规则和零件上下文来自内存索引和缓存，已检查过的零件对直接复用零件对缓存。
+        """
+        
+        self.rule_index.ensure_loaded(db)
+        rows_per_batch = max(1, self.matrix_batch_pairs // max(1, len(column_parts)))
+        
+        for start in range(0, len(row_parts), rows_per_batch):
+            batch = row_parts[start:start + rows_per_batch]
+            screened_results = self._screen_candidates(batch, column_parts)
+            
+            pair_results = iter(await self._check_part_pairs_memoized(
+                [(row_part, column_part) for row_part in batch for column_part in column_parts
+                 if row_part.id != column_part.id],
+                db, "basic", screened_results
+            ))
+            
+            for row_part in batch:
+                yield row_part, [
+                    None if row_part.id == column_part.id else next(pair_results)
+                    for column_part in column_parts
+                ]
+
+    async def _iter_candidate_matches(
+        self, 
+        selected_parts: List[Part], 
+        target_categories: Optional[List[str]], 
+        db: Session
+    ):
+        """
+        按零件ID顺序逐个产生与所有已选零件兼容的 (候选零件, 匹配结果)
+        
+        候选零件分批流式读取，每批先向量化预筛，再批量检查与已选零件的兼容性；
+        与任一已选零件不兼容的候选不会产生结果。
+        """
+        
+        # 构建候选零件查询
+        candidates_query = db.query(Part).filter(
+            ~Part.id.in_([part.id for part in selected_parts])  # 排除已选择的零件
+        )
+        
+        # 按目标类别筛选
+        if target_categories:
+            candidates_query = candidates_query.filter(
+                Part.category.in_(target_categories)
+            )
+        
+        # 按ID顺序分批流式读取候选零件（服务端游标），内存占用与候选总数无关
+        candidates_query = candidates_query.order_by(Part.id).yield_per(self.search_batch_size)
+        
+        self.rule_index.ensure_loaded(db)
+        selected_count = len(selected_parts)
+        
+        for candidate_parts in self._iter_candidate_batches(candidates_query):
+            # 按类别向量化预筛规则结果，无法向量化的规则和行在批量检查中逐行执行
+            screened_results = self._screen_candidates(candidate_parts, selected_parts)
+            
+            # 批量检查本批候选零件与已选零件的兼容性
+            pair_results = await self._check_part_pairs_compatibility(
+                [(candidate, selected_part) for candidate in candidate_parts for selected_part in selected_parts],
+                db, "basic", screened_results
+            )
+            
+            for index, candidate in enumerate(candidate_parts):
+                match_result = self._evaluate_candidate_compatibility(
+                    candidate, selected_parts,
+                    pair_results[index * selected_count:(index + 1) * selected_count]
+                )
+                if match_result:
+                    yield candidate, match_result
+
     async def _check_part_pair_compatibility(
         self, 
         part_a: Part, 
@@ -199,17 +412,307 @@ class CompatibilityEngine:
     ) -> PartCompatibilityResult:
         """检查两个零件之间的兼容性"""
         
-        # 检查是否有经验数据
-        experience = get_compatibility_experience_by_parts(db, part_a.id, part_b.id)
+        results = await self._check_part_pairs_compatibility([(part_a, part_b)], db, detail_level)
+        return results[0]
+
+    async def _check_part_pairs_compatibility(
+        self, 
+        part_pairs: List[Tuple[Part, Part]], 
+        db: Session,
+        detail_level: str = "standard",
+        screened_results: Optional[Dict[Tuple[int, int, int], Tuple[bool, float]]] = None
+    ) -> List[PartCompatibilityResult]:
+        """
+        批量检查多个零件对的兼容性
+        
+        经验数据经内存索引预筛后用一次查询批量加载，适用规则从内存规则索引中查找，随后在内存中逐对评估。
+        screened_results 为向量化预筛的规则结果，(part_a_id, part_b_id, rule_id) -> (是否通过, 执行耗时)。
+        返回结果与输入零件对顺序一致。
+        """
+        
+        if not part_pairs:
+            return []
+        
+        # 批量加载经验数据（先用内存索引排除确定没有经验的零件对，全部排除时不访问数据库）
+        self.experience_index.ensure_loaded(db)
+        experience_pairs = self.experience_index.filter_pairs(
+            (part_a.id, part_b.id) for part_a, part_b in part_pairs
+        )
+        experiences = get_compatibility_experiences_for_pairs(db, experience_pairs)
+        
+        # 规则从内存索引中查找
+        self.rule_index.ensure_loaded(db)
+        
+        rules_by_pair = [
+            self.rule_index.get_rules(part_a.category or "", part_b.category or "")
+            for part_a, part_b in part_pairs
+        ]
+        
+        # 规则执行量较大时在进程池中并行评估（向量化预筛已覆盖的规则除外）
+        evaluated_results = await self._evaluate_rules_in_pool(part_pairs, rules_by_pair, screened_results)
+        
+        results = []
+        for (part_a, part_b), rules in zip(part_pairs, rules_by_pair):
+            experience = (
+                experiences.get((part_a.id, part_b.id)) or 
+                experiences.get((part_b.id, part_a.id))
+            )
+            results.append(await self._evaluate_part_pair(
+                part_a, part_b, experience, rules, detail_level, screened_results, evaluated_results
+            ))
         
-        # 获取适用的规则
-        rules = get_active_rules_for_categories(db, part_a.category or "", part_b.category or "")
+        return results
+
+    async def _evaluate_rules_in_pool(
+        self, 
+        part_pairs: List[Tuple[Part, Part]], 
+        rules_by_pair: List[List[IndexedRule]],
+        screened_results: Optional[Dict[Tuple[int, int, int], Tuple[bool, float]]] = None
+    ) -> Optional[Dict[Tuple[int, int, int], Tuple[bool, float, Optional[str]]]]:
+        """
+        在进程池中批量执行规则
+        
+        返回 (part_a_id, part_b_id, rule_id) -> (是否通过, 执行耗时, 错误信息)；执行量低于阈值或进程池不可用时返回 None，
+        由 _evaluate_part_pair 逐条执行。等待进程池期间事件循环可以处理其他请求。
+        """
+        
+        tasks = []
+        rules_by_id: Dict[int, IndexedRule] = {}
+        rule_executions = 0
+        for (part_a, part_b), rules in zip(part_pairs, rules_by_pair):
+            context_a = self._part_to_context(part_a)
+            context_b = self._part_to_context(part_b)
+            # 零件缺少必需属性的规则不适用，无需执行
+            rule_ids = tuple(
+                rule.id for rule in rules
+                if (not screened_results or (part_a.id, part_b.id, rule.id) not in screened_results)
+                and rule.missing_property(context_a, context_b) is None
+            )
+            if rule_ids:
+                tasks.append((part_a.id, part_b.id, rule_ids))
+                rule_executions += len(rule_ids)
+                for rule in rules:
+                    rules_by_id[rule.id] = rule
+        
+        if not self.parallel_evaluator.should_parallelize(rule_executions):
+            return None
+        
+        contexts: Dict[int, Dict[str, Any]] = {}
+        for part_a, part_b in part_pairs:
+            for part in (part_a, part_b):
+                if part.id not in contexts:
+                    contexts[part.id] = self._part_to_context(part)
+        
+        results = await self.parallel_evaluator.evaluate(
+            {rule_id: rule.rule_expression for rule_id, rule in rules_by_id.items()},
+            contexts, tasks
+        )
+        if results is None:
+            return None
         
-        # 执行规则检查
+        evaluated: Dict[Tuple[int, int, int], Tuple[bool, float, Optional[str]]] = {}
+        for part_a_id, part_b_id, rule_id, passed, execution_time, error_message in results:
+            if error_message is not None:
+                logger.error(f"规则执行失败 [规则ID: {rule_id}]: {error_message}")
+            evaluated[(part_a_id, part_b_id, rule_id)] = (passed, execution_time, error_message)
+        
+        return evaluated
+
+    async def _check_part_pairs_memoized(
+        self, 
+        part_pairs: List[Tuple[Part, Part]], 
+        db: Session,
+        detail_level: str = "standard",
+        screened_results: Optional[Dict[Tuple[int, int, int], Tuple[bool, float]]] = None
+    ) -> List[PartCompatibilityResult]:
+        """
+        带零件对缓存的批量兼容性检查
+        
+        逐步添加零件的配置场景下，已检查过的零件对直接复用，只评估新增的零件对。
+        screened_results 为可选的向量化预筛结果，只用于未命中缓存的零件对。
+        返回结果与输入零件对顺序一致。
+        """
+        
+        # 先确保索引已加载，加载本身会改变版本号
+        self.rule_index.ensure_loaded(db)
+        self.experience_index.ensure_loaded(db)
+        rule_version = self.rule_index.version
+        experience_version = self.experience_index.version
+        
+        results: List[Optional[PartCompatibilityResult]] = []
+        missing_indexes = []
+        missing_keys = []
+        for part_a, part_b in part_pairs:
+            key = self._pair_cache_key(part_a, part_b, detail_level, rule_version, experience_version)
+            cached = self.pair_cache.get(key)
+            if cached is None:
+                missing_indexes.append(len(results))
+                missing_keys.append(key)
+            results.append(cached)
+        
+        if missing_indexes:
+            evaluated = await self._check_part_pairs_compatibility(
+                [part_pairs[index] for index in missing_indexes], db, detail_level, screened_results
+            )
+            for index, key, result in zip(missing_indexes, missing_keys, evaluated):
+                self.pair_cache.set(key, result, tags=(("part", result.part_a_id), ("part", result.part_b_id)))
+                results[index] = result
+        
+        return results
+
+    def _pair_cache_key(
+        self, 
+        part_a: Part, 
+        part_b: Part, 
+        detail_level: str,
+        rule_version: int,
+        experience_version: int
+    ) -> Tuple:
+        """零件对缓存键（有方向，规则表达式区分 part_a/part_b）"""
+        
+        return (
+            part_a.id, part_b.id,
+            part_a.updated_at, part_b.updated_at,
+            "basic" if detail_level == "basic" else "full",
+            rule_version, experience_version
+        )
+
+    def _iter_candidate_batches(self, candidates_query):
+        """将候选零件查询结果按批次切分"""
+        
+        rows = iter(candidates_query)
+        while True:
+            batch = list(islice(rows, self.search_batch_size))
+            if not batch:
+                return
+            yield batch
+
+    def _screen_candidates(
+        self, 
+        candidate_parts: List[Part], 
+        selected_parts: List[Part]
+    ) -> Dict[Tuple[int, int, int], Tuple[bool, float]]:
+        """
+        向量化预筛候选零件
+        
+        同一类别的候选零件构成一列式批次，对每个已选零件的每条适用规则整体求值一次。
+        只返回能确定与逐行执行一致的结果，其余规则和行由调用方逐行执行。
+        """
+        
+        screened: Dict[Tuple[int, int, int], Tuple[bool, float]] = {}
+        if not self.vector_screener.available:
+            return screened
+        
+        candidates_by_category: Dict[str, List[Part]] = {}
+        for candidate in candidate_parts:
+            candidates_by_category.setdefault(candidate.category or "", []).append(candidate)
+        
+        selected_contexts = [(part, self._part_to_context(part)) for part in selected_parts]
+        
+        for category, candidates in candidates_by_category.items():
+            if len(candidates) < self.vector_screener.min_batch_size:
+                continue
+            
+            frame = self.vector_screener.build_frame(
+                [self._part_to_context(candidate) for candidate in candidates]
+            )
+            
+            for selected_part, selected_context in selected_contexts:
+                for rule in self.rule_index.get_rules(category, selected_part.category or ""):
+                    evaluation = self.vector_screener.evaluate(rule.compiled, frame, selected_context)
+                    if evaluation is None:
+                        continue
+                    
+                    passed, valid, row_time = evaluation
+                    for index in valid.nonzero()[0]:
+                        screened[(candidates[index].id, selected_part.id, rule.id)] = (
+                            bool(passed[index]), row_time
+                        )
+        
+        return screened
+
+    async def _evaluate_part_pair(
+        self, 
+        part_a: Part, 
+        part_b: Part, 
+        experience: Optional[CompatibilityExperience],
+        rules: List[IndexedRule],
+        detail_level: str = "standard",
+        screened_results: Optional[Dict[Tuple[int, int, int], Tuple[bool, float]]] = None,
+        evaluated_results: Optional[Dict[Tuple[int, int, int], Tuple[bool, float, Optional[str]]]] = None
+    ) -> PartCompatibilityResult:
+        """
+        使用已加载的经验数据和规则评估单个零件对
+        
+        detail_level 为 basic 时使用快速失败模式：结果中不包含规则明细，因此只记录轻量的 RuleOutcome；
+        没有经验数据时阻断性规则优先执行，任一失败即可确定结果（0分不兼容），其余规则不再执行。
+        零件缺少规则必然读取的属性时，规则标记为不适用，不执行也不参与评分。
+        """
+        
+        fast_fail = detail_level == "basic"
+        stop_on_blocking_failure = fast_fail and experience is None
+        if stop_on_blocking_failure:
+            rules = [rule for rule in rules if rule.is_blocking] + [rule for rule in rules if not rule.is_blocking]
+        
+        # 执行规则检查（已向量化预筛或已在进程池中执行的规则直接使用已有结果）
         rule_results = []
+        context_a = self._part_to_context(part_a)
+        context_b = self._part_to_context(part_b)
+        pair_context = None
         for rule in rules:
-            rule_result = await self._execute_rule(rule, part_a, part_b)
-            rule_results.append(rule_result)
+            missing_property = rule.missing_property(context_a, context_b)
+            if missing_property is not None:
+                self.rule_profiler.record_not_applicable(rule.id)
+                if fast_fail:
+                    rule_results.append(RuleOutcome(
+                        rule.id, rule.name, False, 0.0, rule.weight, rule.is_blocking, True
+                    ))
+                else:
+                    rule_results.append(RuleResult(
+                        rule_id=rule.id,
+                        rule_name=rule.name,
+                        passed=False,
+                        score=0.0,
+                        weight=rule.weight,
+                        is_blocking=rule.is_blocking,
+                        error_message=f"缺少属性 {missing_property}，规则不适用",
+                        execution_time=0.0,
+                        not_applicable=True
+                    ))
+                continue
+            
+            key = (part_a.id, part_b.id, rule.id)
+            outcome = evaluated_results.get(key) if evaluated_results else None
+            if outcome is None and screened_results:
+                screened = screened_results.get(key)
+                if screened is not None:
+                    outcome = (screened[0], screened[1], None)
+            if outcome is None:
+                if pair_context is None:
+                    # 零件对的执行上下文只构建一次，供所有需要逐条执行的规则共享
+                    pair_context = {'part_a': context_a, 'part_b': context_b}
+                outcome = await self._execute_rule(rule, pair_context)
+            
+            passed, execution_time, error_message = outcome
+            self.rule_profiler.record(rule.id, execution_time, passed, error_message is not None)
+            if fast_fail:
+                rule_results.append(RuleOutcome(
+                    rule.id, rule.name, passed, float(rule.weight if passed else 0), rule.weight, rule.is_blocking
+                ))
+            else:
+                rule_results.append(RuleResult(
+                    rule_id=rule.id,
+                    rule_name=rule.name,
+                    passed=passed,
+                    score=float(rule.weight if passed else 0),
+                    weight=rule.weight,
+                    is_blocking=rule.is_blocking,
+                    error_message=error_message,
+                    execution_time=execution_time
+                ))
+            
+            if stop_on_blocking_failure and rule.is_blocking and not passed:
+                break
         
         # 计算兼容性评分
         score, grade, is_compatible = self._calculate_pair_compatibility_score(
@@ -224,6 +727,8 @@ class CompatibilityEngine:
             part_b_id=part_b.id,
             part_a_name=part_a.name,
             part_b_name=part_b.name,
+            part_a_category=part_a.category,
+            part_b_category=part_b.category,
             compatibility_grade=grade,
             compatibility_score=score,
             is_compatible=is_compatible,
@@ -234,85 +739,28 @@ class CompatibilityEngine:
 
     async def _execute_rule(
         self, 
-        rule: CompatibilityRule, 
-        part_a: Part, 
-        part_b: Part
-    ) -> RuleResult:
-        """执行单个兼容性规则"""
+        rule: IndexedRule, 
+        context: Dict[str, PartContext]
+    ) -> Tuple[bool, float, Optional[str]]:
+        """执行单个兼容性规则（context 包含 part_a 和 part_b 的上下文），返回 (是否通过, 执行耗时, 错误信息)"""
         
         start_time = time.time()
         
         try:
-            # 准备执行上下文
-            context = {
-                'part_a': self._part_to_context(part_a),
-                'part_b': self._part_to_context(part_b)
-            }
-            
             # 执行表达式
-            result = await self.expression_engine.execute_safe_expression(
-                rule.rule_expression, context
+            result = await self.expression_engine.execute_compiled_expression(
+                rule.compiled, context
             )
             
-            execution_time = time.time() - start_time
-            
-            return RuleResult(
-                rule_id=rule.id,
-                rule_name=rule.name,
-                passed=bool(result),
-                score=float(rule.weight if result else 0),
-                weight=rule.weight,
-                is_blocking=rule.is_blocking,
-                execution_time=execution_time
-            )
+            return bool(result), time.time() - start_time, None
             
         except Exception as e:
             logger.error(f"规则执行失败 [规则ID: {rule.id}]: {str(e)}")
-            return RuleResult(
-                rule_id=rule.id,
-                rule_name=rule.name,
-                passed=False,
-                score=0.0,
-                weight=rule.weight,
-                is_blocking=rule.is_blocking,
-                error_message=str(e),
-                execution_time=time.time() - start_time
-            )
+            return False, time.time() - start_time, str(e)
 
-    def _part_to_context(self, part: Part) -> Dict[str, Any]:
-        """将零件对象转换为规则执行上下文"""
-        
-        context = {
-            'id': part.id,
-            'name': part.name,
-            'category': part.category or "",
-            'description': part.description or ""
-        }
-        
-        # 添加属性字段
-        if part.properties:
-            for key, value in part.properties.items():
-                # 清理属性名，确保可以作为变量名使用
-                clean_key = self._clean_property_name(key)
-                context[clean_key] = value
-                
-                # 同时保留原始键名，支持中文属性名
-                context[key] = value
-        
-        return context
-
-    def _clean_property_name(self, name: str) -> str:
-        """清理属性名，使其可以作为变量名使用"""
-        import re
-        
-        # 移除特殊字符，只保留字母、数字和下划线
-        clean_name = re.sub(r'[^a-zA-Z0-9_\u4e00-\u9fff]', '_', name)
-        
-        # 确保以字母或下划线开头
-        if clean_name and clean_name[0].isdigit():
-            clean_name = f"prop_{clean_name}"
-        
-        return clean_name or "unknown_prop"
+    def _part_to_context(self, part: Part) -> PartContext:
+        """获取零件的规则执行上下文（按零件版本缓存，不可修改）"""
+        return self.context_cache.get(part)
 
     def _calculate_pair_compatibility_score(
         self, 
@@ -339,7 +787,8 @@ class CompatibilityEngine:
             is_compatible = experience.compatibility_status != CompatibilityStatus.INCOMPATIBLE
             return score, grade, is_compatible
         
-        # 基于规则计算评分
+        # 基于规则计算评分（不适用的规则不参与）
+        rule_results = [r for r in rule_results if not r.not_applicable]
         if not rule_results:
             # 没有规则，默认理论兼容
             return 60, CompatibilityGrade.THEORETICAL, True
@@ -415,7 +864,9 @@ class CompatibilityEngine:
         # 规则相关警告
         failed_rules = [r for r in rule_results if not r.passed]
         for rule in failed_rules:
-            if rule.is_blocking:
+            if rule.not_applicable:
+                warnings.append(f"零件缺少所需属性，规则未执行: {rule.rule_name}")
+            elif rule.is_blocking:
                 warnings.append(f"阻断性规则失败: {rule.rule_name}")
             else:
                 warnings.append(f"建议性规则失败: {rule.rule_name}")
@@ -452,26 +903,21 @@ class CompatibilityEngine:
         
         return recommendations
 
-    async def _evaluate_candidate_compatibility(
+    def _evaluate_candidate_compatibility(
         self, 
         candidate: Part, 
         selected_parts: List[Part], 
-        request: CompatibilitySearchRequest,
-        db: Session
+        pair_results: List[PartCompatibilityResult]
     ) -> Optional[CompatibilityMatch]:
-        """评估候选零件与已选零件的兼容性"""
+        """根据候选零件与各已选零件的零件对结果评估兼容性（pair_results 与 selected_parts 一一对应）"""
         
         compatibility_scores = []
         matching_rules_count = 0
         experience_based = False
         reasons = []
         
-        # 与每个已选零件检查兼容性
-        for selected_part in selected_parts:
-            pair_result = await self._check_part_pair_compatibility(
-                candidate, selected_part, db, "basic"
-            )
-            
+        # 汇总与每个已选零件的兼容性
+        for selected_part, pair_result in zip(selected_parts, pair_results):
             compatibility_scores.append(pair_result.compatibility_score)
             matching_rules_count += len([r for r in pair_result.rule_results if r.passed])
             
@@ -578,12 +1024,100 @@ class CompatibilityEngine:
         """获取零件信息"""
         return db.query(Part).filter(Part.id.in_(part_ids)).all()
 
+    def get_memory_cached_result(self, part_ids: List[int]) -> Optional[CompatibilityCheckResponse]:
+        """仅从进程内缓存获取检查结果（不访问数据库，使用当前已加载的索引版本）"""
+        
+        # 索引已过期时版本号可能落后于其他进程的变更，交给调用方走数据库路径重新加载
+        if not (self.rule_index.is_fresh and self.experience_index.is_fresh):
+            return None
+        
+        cached = self.result_cache.get(self._result_cache_key(part_ids))
+        if cached is None:
+            return None
+        
+        # 返回浅拷贝，缓存中的对象保持不变
+        return cached.model_copy(update={"cached": True})
+
+    def clear_result_cache(self):
+        """清空进程内结果缓存（包括零件对缓存）"""
+        self.result_cache.clear()
+        self.pair_cache.clear()
+
+    def invalidate_categories(self, db: Session, categories: List[str]) -> int:
+        """
+        失效同时涉及所有指定类别的缓存结果（规则变更时使用）
+        
+        数据库缓存通过 categories 列的 GIN 索引定位，返回删除的数据库缓存条数
+        """
+        
+        categories = sorted(set(categories))
+        if not categories:
+            return 0
+        
+        self.result_cache.invalidate(*(("category", category) for category in categories))
+        
+        return self._delete_cache_entries(db, CompatibilityCache.categories.contains(categories))
+
+    def invalidate_parts(self, db: Session, part_ids: List[int], match_all: bool = False) -> int:
+        """
+        失效涉及指定零件的缓存结果
+        
+        match_all 为 True 时只失效同时包含所有零件的条目（经验变更时使用），
+        否则失效包含任一零件的条目（零件变更时使用）。
+        数据库缓存通过 part_ids 列的 GIN 索引定位，返回删除的数据库缓存条数
+        """
+        
+        part_ids = sorted(set(part_ids))
+        if not part_ids:
+            return 0
+        
+        if match_all:
+            self.result_cache.invalidate(*(("part", part_id) for part_id in part_ids))
+            self.pair_cache.invalidate(*(("part", part_id) for part_id in part_ids))
+            condition = CompatibilityCache.part_ids.contains(part_ids)
+        else:
+            for part_id in part_ids:
+                self.result_cache.invalidate(("part", part_id))
+                self.pair_cache.invalidate(("part", part_id))
+            condition = or_(*(CompatibilityCache.part_ids.contains([part_id]) for part_id in part_ids))
+        
+        return self._delete_cache_entries(db, condition)
+
+    def _delete_cache_entries(self, db: Session, condition) -> int:
+        """删除满足条件的数据库缓存条目"""
+        
+        try:
+            deleted_count = db.query(CompatibilityCache).filter(condition).delete(synchronize_session=False)
+            db.commit()
+            return deleted_count
+            
+        except Exception as e:
+            logger.warning(f"清理数据库缓存失败: {str(e)}")
+            db.rollback()
+            return 0
+
+    def _result_cache_key(self, part_ids: List[int]) -> Tuple[str, int, int]:
+        """进程内结果缓存键：零件组合哈希加规则集和经验数据版本"""
+        return (create_part_ids_hash(part_ids), self.rule_index.version, self.experience_index.version)
+
+    def _result_cache_tags(self, part_ids: List[int], categories: List[str]) -> List[Tuple[str, Any]]:
+        """进程内结果缓存条目的失效标签"""
+        return [("part", part_id) for part_id in part_ids] + [("category", category) for category in categories]
+
     async def _get_cached_result(
         self, 
         part_ids: List[int], 
         db: Session
     ) -> Optional[CompatibilityCheckResponse]:
-        """获取缓存的检查结果"""
+        """获取缓存的检查结果（先查进程内缓存，未命中再查数据库缓存）"""
+        
+        # 索引过期时先重新加载，进程内缓存键使用最新版本
+        self.rule_index.ensure_loaded(db)
+        self.experience_index.ensure_loaded(db)
+        
+        cached_result = self.get_memory_cached_result(part_ids)
+        if cached_result is not None:
+            return cached_result
         
         try:
             part_ids_hash = create_part_ids_hash(part_ids)
@@ -595,9 +1129,16 @@ class CompatibilityEngine:
             
             if cached:
                 # 转换缓存数据为响应对象
-                result_data = cached.compatibility_result
+                result_data = dict(cached.compatibility_result)
                 result_data['cached'] = True
-                return CompatibilityCheckResponse(**result_data)
+                response = CompatibilityCheckResponse(**result_data)
+                
+                # 回填进程内缓存
+                self.result_cache.set(
+                    self._result_cache_key(part_ids), response,
+                    tags=self._result_cache_tags(cached.part_ids, cached.categories or [])
+                )
+                return response.model_copy()
             
             return None
             
@@ -609,12 +1150,17 @@ class CompatibilityEngine:
         self, 
         part_ids: List[int], 
         response: CompatibilityCheckResponse, 
-        db: Session
+        db: Session,
+        categories: List[str]
     ):
-        """缓存检查结果"""
+        """缓存检查结果（同时写入进程内缓存和数据库缓存），记录依赖的零件和类别用于定向失效"""
+        
+        part_ids_hash = create_part_ids_hash(part_ids)
+        self.result_cache.set(
+            self._result_cache_key(part_ids), response, tags=self._result_cache_tags(part_ids, categories)
+        )
         
         try:
-            part_ids_hash = create_part_ids_hash(part_ids)
             expires_at = datetime.utcnow() + timedelta(hours=self.cache_ttl_hours)
             
             # 删除旧缓存
@@ -626,7 +1172,9 @@ class CompatibilityEngine:
             cache_entry = CompatibilityCache(
                 part_ids_hash=part_ids_hash,
                 part_ids=part_ids,
-                compatibility_result=response.dict(exclude={'cached'}),
+                categories=categories,
+                # JSON模式序列化，经验数据中的日期时间字段转换为字符串
+                compatibility_result=response.model_dump(mode='json', exclude={'cached'}),
                 expires_at=expires_at
             )
             
@@ -702,7 +1250,19 @@ class CompatibilityEngine:
                 "total_experiences": total_experiences,
                 "verified_experiences": verified_experiences,
                 "active_cache_entries": cache_entries,
-                "cache_ttl_hours": self.cache_ttl_hours
+                "cache_ttl_hours": self.cache_ttl_hours,
+                "result_cache": self.result_cache.stats(),
+                "pair_cache": self.pair_cache.stats(),
+                "expression_cache": self.expression_engine.get_compiled_cache_stats(),
+                "security_validation_cache": self.expression_engine.get_validation_cache_stats(),
+                "context_cache": self.context_cache.stats(),
+                "parallel_evaluation": self.parallel_evaluator.stats(),
+                "rule_profiling": {
+                    "enabled": self.rule_profiler.enabled,
+                    "flush_interval_seconds": self.rule_profiler.flush_interval_seconds
+                },
+                "rule_index": self.rule_index.stats(),
+                "experience_index": self.experience_index.stats()
             }
             
         except Exception as e:
@@ -0,0 +1,464 @@
+# backend/app/services/compatibility_graph.py
+"""
+预计算兼容性图
+
+后台任务为每个零件按目标类别物化前N个兼容零件（邻接表 compatibility_graph_edges），
+兼容性建议请求只需一次索引读取。规则、经验或零件变更时只标记受影响的节点，
+后台任务增量刷新：
+- 节点 is_stale：该零件自身的建议列表需要重新计算
+- 节点 candidate_dirty：该零件作为候选发生了变化，需要合并到其他零件的建议列表
+"""
+
+import asyncio
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+from sqlalchemy import Select, select, text
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.core.database import engine as db_engine, run_with_sync_session
+from app.models.compatibility import CompatibilityGraphEdge, CompatibilityGraphNode
+from app.models.part import Part
+from app.schemas.compatibility import CompatibilityMatch
+from app.services.compatibility_engine import CompatibilityEngine, compatibility_engine
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 多进程部署时只允许一个进程执行刷新（PostgreSQL 会话级咨询锁）
+GRAPH_REFRESH_LOCK_KEY = 0x0BE7C0DE
+
+# 建议列表条目：(评分, 置信度, 建议零件ID)
+EdgeEntry = Tuple[int, float, int]
+
+def _sort_entries(entries: List[EdgeEntry]) -> List[EdgeEntry]:
+    """与兼容性搜索排序一致：评分、置信度降序，同分时零件ID小的优先"""
+    return sorted(entries, key=lambda entry: (-entry[0], -entry[1], entry[2]))
+
+class CompatibilityGraph:
+    """预计算兼容性图"""
+
+    def __init__(
+        self,
+        engine: CompatibilityEngine,
+        top_n: int = 50,
+        refresh_interval_seconds: int = 30,
+        backlog_interval_seconds: float = 2.0,
+        refresh_batch_size: int = 50,
+        max_age_hours: int = 24
+    ):
+        self.engine = engine
+        self.top_n = top_n  # 每个目标类别保存的建议数量，需不小于建议接口的最大 limit
+        self.refresh_interval_seconds = refresh_interval_seconds
+        # 还有待处理节点（如首次启动全量构建）时两轮之间的间隔，限制后台构建占用的CPU和数据库
+        self.backlog_interval_seconds = backlog_interval_seconds
+        self.refresh_batch_size = refresh_batch_size  # 每轮刷新处理的节点数
+        self.max_age_hours = max_age_hours  # 兜底：超过该时长的节点重新计算
+
+        self.last_refresh: Optional[Dict[str, Any]] = None
+        self._task: Optional[asyncio.Task] = None
+
+    # ==================== 读取 ====================
+
+    def get_suggestions(
+        self,
+        db: Session,
+        part_id: int,
+        limit: int,
+        min_score: int,
+        categories: Optional[List[str]] = None
+    ) -> Optional[List[Part]]:
+        """
+        从兼容性图读取建议零件
+
+        节点不存在、待重新计算或 limit 超过预计算数量时返回 None，由调用方回退到实时搜索
+        """
+
+        if limit > self.top_n:
+            return None
+
+        node = db.get(CompatibilityGraphNode, part_id)
+        if node is None or node.is_stale:
+            return None
+
+        return db.execute(self._suggestions_query(part_id, limit, min_score, categories)).scalars().all()
+
+    async def get_suggestions_async(
+        self,
+        db: AsyncSession,
+        part_id: int,
+        limit: int,
+        min_score: int,
+        categories: Optional[List[str]] = None
+    ) -> Optional[List[Part]]:
+        """
+        从兼容性图读取建议零件（异步会话版本，语义同 get_suggestions）
+
+        兼容性图表尚未创建等数据库错误时记录警告并返回 None，由调用方回退到实时搜索
+        """
+
+        if limit > self.top_n:
+            return None
+
+        try:
+            node = await db.get(CompatibilityGraphNode, part_id)
+            if node is None or node.is_stale:
+                return None
+
+            return (await db.execute(self._suggestions_query(part_id, limit, min_score, categories))).scalars().all()
+        except SQLAlchemyError as e:
+            logger.warning(f"读取兼容性图失败，回退到实时搜索 [零件ID: {part_id}]: {str(e)}")
+            await db.rollback()
+            return None
+
+    def _suggestions_query(
+        self,
+        part_id: int,
+        limit: int,
+        min_score: int,
+        categories: Optional[List[str]]
+    ) -> Select:
+        query = select(Part).join(
+            CompatibilityGraphEdge, CompatibilityGraphEdge.suggested_part_id == Part.id
+        ).filter(
+            CompatibilityGraphEdge.part_id == part_id,
+            CompatibilityGraphEdge.compatibility_score >= min_score
+        )
+
+        if categories:
+            query = query.filter(CompatibilityGraphEdge.target_category.in_(categories))
+
+        return query.order_by(
+            CompatibilityGraphEdge.compatibility_score.desc(),
+            CompatibilityGraphEdge.confidence_level.desc(),
+            CompatibilityGraphEdge.suggested_part_id
+        ).limit(limit)
+
+    # ==================== 变更标记 ====================
+
+    def mark_categories_stale(self, db: Session, categories: List[str]) -> int:
+        """规则变更：涉及类别的零件重新计算建议列表"""
+
+        categories = [category for category in set(categories) if category]
+        if not categories:
+            return 0
+
+        return self._mark(db, CompatibilityGraphNode.part_id.in_(
+            select(Part.id).where(Part.category.in_(categories))
+        ))
+
+    def mark_parts_stale(self, db: Session, part_ids: List[int]) -> int:
+        """经验变更：相关零件重新计算建议列表"""
+
+        part_ids = sorted(set(part_ids))
+        if not part_ids:
+            return 0
+
+        return self._mark(db, CompatibilityGraphNode.part_id.in_(part_ids))
+
+    def mark_part_changed(self, db: Session, part_id: int) -> int:
+        """
+        零件变更：零件自身重新计算，并作为候选合并到其他零件的建议列表
+
+        建议列表中已包含该零件的节点直接重新计算（评分或类别可能变化，零件也可能已删除）
+        """
+
+        referencing = self._mark(db, CompatibilityGraphNode.part_id.in_(
+            select(CompatibilityGraphEdge.part_id).where(CompatibilityGraphEdge.suggested_part_id == part_id)
+        ))
+        return referencing + self._mark(db, CompatibilityGraphNode.part_id == part_id, candidate_dirty=True)
+
+    def mark_all_stale(self, db: Session) -> int:
+        """全部节点重新计算"""
+        return self._mark(db, CompatibilityGraphNode.is_stale == False)
+
+    def _mark(self, db: Session, condition, candidate_dirty: bool = False) -> int:
+        """标记满足条件的节点"""
+
+        values = {
+            CompatibilityGraphNode.is_stale: True,
+            CompatibilityGraphNode.marked_at: datetime.utcnow()
+        }
+        if candidate_dirty:
+            values[CompatibilityGraphNode.candidate_dirty] = True
+
+        try:
+            marked_count = db.query(CompatibilityGraphNode).filter(condition).update(
+                values, synchronize_session=False
+            )
+            db.commit()
+            return marked_count
+
+        except Exception as e:
+            logger.warning(f"标记兼容性图节点失败: {str(e)}")
+            db.rollback()
+            return 0
+
+    # ==================== 刷新 ====================
+
+    async def refresh(self, db: Session) -> Optional[Dict[str, Any]]:
+        """
+        执行一轮增量刷新
+
+        依次：为新零件创建节点、标记过旧节点、合并变更的候选零件、重新计算待更新节点，
+        每类最多处理 refresh_batch_size 个节点。其他进程正在刷新时返回 None。
+        查询和规则评估都是同步阻塞的，后台任务通过 run_with_sync_session 在线程池中调用。
+        """
+
+        # 咨询锁只有 PostgreSQL 支持；SQLite 等单机部署不需要跨进程互斥
+        use_advisory_lock = db_engine.dialect.name == "postgresql"
+
+        with db_engine.connect() as lock_conn:
+            if use_advisory_lock:
+                acquired = lock_conn.execute(
+                    text("SELECT pg_try_advisory_lock(:key)"), {"key": GRAPH_REFRESH_LOCK_KEY}
+                ).scalar()
+                if not acquired:
+                    return None
+
+            try:
+                start_time = datetime.utcnow()
+                added = self._add_missing_nodes(db)
+                self._mark(db, CompatibilityGraphNode.computed_at < start_time - timedelta(hours=self.max_age_hours))
+
+                dirty_ids = [row[0] for row in db.query(CompatibilityGraphNode.part_id).filter(
+                    CompatibilityGraphNode.candidate_dirty == True
+                ).order_by(CompatibilityGraphNode.marked_at).limit(self.refresh_batch_size).all()]
+
+                for part_id in dirty_ids:
+                    await self._merge_candidate(db, part_id, datetime.utcnow())
+
+                stale_ids = [row[0] for row in db.query(CompatibilityGraphNode.part_id).filter(
+                    CompatibilityGraphNode.is_stale == True
+                ).order_by(CompatibilityGraphNode.marked_at).limit(self.refresh_batch_size).all()]
+
+                for part_id in stale_ids:
+                    await self._recompute_node(db, part_id, datetime.utcnow())
+
+                return {
+                    "nodes_added": added,
+                    "candidates_merged": len(dirty_ids),
+                    "nodes_recomputed": len(stale_ids),
+                    "has_more": max(len(dirty_ids), len(stale_ids)) >= self.refresh_batch_size,
+                    "execution_time": (datetime.utcnow() - start_time).total_seconds()
+                }
+
+            finally:
+                if use_advisory_lock:
+                    lock_conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": GRAPH_REFRESH_LOCK_KEY})
+
+    def _add_missing_nodes(self, db: Session) -> int:
+        """为尚无节点的零件（新建或批量导入）创建待计算节点"""
+
+        try:
+            missing_ids = [row[0] for row in db.query(Part.id).outerjoin(
+                CompatibilityGraphNode, CompatibilityGraphNode.part_id == Part.id
+            ).filter(CompatibilityGraphNode.part_id.is_(None)).all()]
+
+            if not missing_ids:
+                return 0
+
+            marked_at = datetime.utcnow()
+            db.add_all([
+                CompatibilityGraphNode(part_id=part_id, is_stale=True, candidate_dirty=True, marked_at=marked_at)
+                for part_id in missing_ids
+            ])
+            db.commit()
+            return len(missing_ids)
+
+        except Exception as e:
+            logger.warning(f"创建兼容性图节点失败: {str(e)}")
+            db.rollback()
+            return 0
+
+    async def _recompute_node(self, db: Session, part_id: int, start_time: datetime):
+        """重新计算零件的建议列表（start_time 之后再次被标记的节点保持待计算状态）"""
+
+        try:
+            part = db.query(Part).filter(Part.id == part_id).first()
+            if part is None:
+                return
+
+            matches_by_category = await self.engine.find_top_matches_by_category(part, db, self.top_n)
+
+            db.query(CompatibilityGraphEdge).filter(
+                CompatibilityGraphEdge.part_id == part_id
+            ).delete(synchronize_session=False)
+
+            db.add_all([
+                self._build_edge(part_id, category, rank, match)
+                for category, matches in matches_by_category.items()
+                for rank, match in enumerate(matches)
+            ])
+
+            db.query(CompatibilityGraphNode).filter(
+                CompatibilityGraphNode.part_id == part_id,
+                CompatibilityGraphNode.marked_at <= start_time
+            ).update({
+                CompatibilityGraphNode.is_stale: False,
+                CompatibilityGraphNode.computed_at: datetime.utcnow()
+            }, synchronize_session=False)
+
+            db.commit()
+
+        except Exception as e:
+            logger.warning(f"计算零件 {part_id} 的兼容性建议失败: {str(e)}")
+            db.rollback()
+
+    async def _merge_candidate(self, db: Session, candidate_id: int, start_time: datetime):
+        """
+        将变更的候选零件合并到其他零件已计算的建议列表
+
+        只需评估候选零件与每个零件的一个零件对。候选原本在已满的列表中而新评分跌出前N名时，
+        无法确定补位的零件，该节点改为重新计算。
+        """
+
+        try:
+            candidate = db.query(Part).filter(Part.id == candidate_id).first()
+            if candidate is None:
+                return
+
+            category = candidate.category or ""
+            stale_ids: List[int] = []
+            last_id = 0
+
+            while True:
+                # 按ID分页读取已计算的节点（待计算的节点稍后会完整重算，无需合并）
+                targets = db.query(Part).join(
+                    CompatibilityGraphNode, CompatibilityGraphNode.part_id == Part.id
+                ).filter(
+                    CompatibilityGraphNode.is_stale == False,
+                    Part.id > last_id,
+                    Part.id != candidate_id
+                ).order_by(Part.id).limit(self.engine.search_batch_size).all()
+
+                if not targets:
+                    break
+                last_id = targets[-1].id
+
+                matches = await self.engine.match_candidate_against_parts(candidate, targets, db)
+
+                edges_by_part: Dict[int, List[CompatibilityGraphEdge]] = {}
+                for edge in db.query(CompatibilityGraphEdge).filter(
+                    CompatibilityGraphEdge.part_id.in_([target.id for target in targets]),
+                    CompatibilityGraphEdge.target_category == category
+                ).order_by(CompatibilityGraphEdge.rank).all():
+                    edges_by_part.setdefault(edge.part_id, []).append(edge)
+
+                for target, match in zip(targets, matches):
+                    current = [
+                        (edge.compatibility_score, edge.confidence_level, edge.suggested_part_id)
+                        for edge in edges_by_part.get(target.id, [])
+                    ]
+                    entries = [entry for entry in current if entry[2] != candidate_id]
+                    was_present = len(entries) != len(current)
+
+                    if match is not None:
+                        entries.append((match.compatibility_score, match.confidence_level, candidate_id))
+                    kept = _sort_entries(entries)[:self.top_n]
+
+                    if was_present and len(current) >= self.top_n and candidate_id not in {entry[2] for entry in kept}:
+                        stale_ids.append(target.id)
+                        continue
+
+                    if kept == current:
+                        continue
+
+                    db.query(CompatibilityGraphEdge).filter(
+                        CompatibilityGraphEdge.part_id == target.id,
+                        CompatibilityGraphEdge.target_category == category
+                    ).delete(synchronize_session=False)
+                    db.add_all([
+                        CompatibilityGraphEdge(
+                            part_id=target.id,
+                            target_category=category,
+                            rank=rank,
+                            suggested_part_id=suggested_part_id,
+                            compatibility_score=score,
+                            confidence_level=confidence
+                        )
+                        for rank, (score, confidence, suggested_part_id) in enumerate(kept)
+                    ])
+                    db.flush()
+
+                await asyncio.sleep(0)
+
+            if stale_ids:
+                db.query(CompatibilityGraphNode).filter(
+                    CompatibilityGraphNode.part_id.in_(stale_ids)
+                ).update({
+                    CompatibilityGraphNode.is_stale: True,
+                    CompatibilityGraphNode.marked_at: datetime.utcnow()
+                }, synchronize_session=False)
+
+            db.query(CompatibilityGraphNode).filter(
+                CompatibilityGraphNode.part_id == candidate_id,
+                CompatibilityGraphNode.marked_at <= start_time
+            ).update({CompatibilityGraphNode.candidate_dirty: False}, synchronize_session=False)
+
+            db.commit()
+
+        except Exception as e:
+            logger.warning(f"合并候选零件 {candidate_id} 到兼容性图失败: {str(e)}")
+            db.rollback()
+
+    def _build_edge(self, part_id: int, category: str, rank: int, match: CompatibilityMatch) -> CompatibilityGraphEdge:
+        return CompatibilityGraphEdge(
+            part_id=part_id,
+            target_category=category,
+            rank=rank,
+            suggested_part_id=match.part_id,
+            compatibility_score=match.compatibility_score,
+            confidence_level=match.confidence_level
+        )
+
+    # ==================== 后台任务 ====================
+
+    def start(self):
+        """启动后台刷新任务"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run_refresh_loop())
+
+    async def stop(self):
+        """停止后台刷新任务"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run_refresh_loop(self):
+        while True:
+            result = None
+            try:
+                # 每轮刷新在线程池中使用独立会话和事件循环执行，不阻塞应用事件循环
+                result = await run_with_sync_session(self.refresh)
+                if result is not None:
+                    self.last_refresh = {**result, "finished_at": datetime.utcnow().isoformat()}
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"兼容性图刷新失败: {str(e)}")
+
+            # 还有待处理的节点时缩短间隔，但不连续执行
+            await asyncio.sleep(
+                self.backlog_interval_seconds if result and result["has_more"] else self.refresh_interval_seconds
+            )
+
+    def stats(self, db: Session) -> Dict[str, Any]:
+        """获取兼容性图统计信息"""
+        return {
+            "nodes": db.query(CompatibilityGraphNode).count(),
+            "stale_nodes": db.query(CompatibilityGraphNode).filter(CompatibilityGraphNode.is_stale == True).count(),
+            "dirty_candidates": db.query(CompatibilityGraphNode).filter(CompatibilityGraphNode.candidate_dirty == True).count(),
+            "edges": db.query(CompatibilityGraphEdge).count(),
+            "top_n": self.top_n,
+            "last_refresh": self.last_refresh
+        }
+
+
+# 全局实例
+compatibility_graph = CompatibilityGraph(compatibility_engine)
@@ -0,0 +1,152 @@
+# backend/app/services/experience_index.py
+"""
+兼容性经验零件对的内存成员索引
+
+绝大多数零件对没有经验数据。索引记录所有存在经验的零件对，
+查询经验前先在内存中判断，确定不存在时直接跳过数据库查询。
+其他进程新增、修改或删除的经验通过定期的轻量检查（条数、最大ID、最近更新时间）发现，
+最迟在 check_interval_seconds 后重新加载。
+"""
+
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.models.compatibility import CompatibilityExperience
+import logging
+
+logger = logging.getLogger(__name__)
+
+def _pair_key(part_a_id: int, part_b_id: int) -> int:
+    """将无序零件对打包为单个整数 (较小ID << 32 | 较大ID)"""
+    if part_a_id > part_b_id:
+        part_a_id, part_b_id = part_b_id, part_a_id
+    return (part_a_id << 32) | part_b_id
+
+class ExperienceIndex:
+    """存在兼容性经验的零件对集合"""
+
+    def __init__(self, max_age_seconds: int = 300, check_interval_seconds: float = 5.0):
+        # 多进程部署时其他进程的变更无法直接通知本进程，超过该时长后自动全量重建
+        self.max_age_seconds = max_age_seconds
+        # 两次轻量变更检查的最小间隔，即其他进程变更在本进程中不可见的最长时间
+        self.check_interval_seconds = check_interval_seconds
+
+        # 打包键 -> 经验条数（同一零件对可能存在 A->B 和 B->A 两条记录）
+        self._pair_counts: Dict[int, int] = {}
+        self._loaded_at: Optional[float] = None
+        self._signature: Optional[Tuple[Any, ...]] = None  # 加载时经验表的变更签名
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+        # 每次经验数据变化时递增，供依赖经验数据的缓存使用
+        self.version = 0
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._loaded_at is not None
+
+    @property
+    def is_fresh(self) -> bool:
+        """已加载且未超过最长复用时间"""
+        loaded_at = self._loaded_at
+        return loaded_at is not None and time.monotonic() - loaded_at <= self.max_age_seconds
+
+    def load(self, db: Session):
+        """从数据库全量加载经验零件对"""
+
+        # 先读取签名：加载期间发生的变更会在下次检查时触发重新加载
+        signature = self._read_signature(db)
+        rows = db.query(
+            CompatibilityExperience.part_a_id,
+            CompatibilityExperience.part_b_id
+        ).all()
+
+        pair_counts: Dict[int, int] = {}
+        for part_a_id, part_b_id in rows:
+            key = _pair_key(part_a_id, part_b_id)
+            pair_counts[key] = pair_counts.get(key, 0) + 1
+
+        with self._lock:
+            self._pair_counts = pair_counts
+            self._signature = signature
+            self._loaded_at = self._checked_at = time.monotonic()
+            self.version += 1
+
+        logger.info(f"经验索引已加载: {len(pair_counts)} 个零件对")
+
+    def ensure_loaded(self, db: Session):
+        """索引未加载、已过期或经验表发生变化时重新加载"""
+
+        loaded_at = self._loaded_at
+        now = time.monotonic()
+        if loaded_at is None or now - loaded_at > self.max_age_seconds:
+            self.load(db)
+            return
+
+        if now - self._checked_at >= self.check_interval_seconds:
+            self._checked_at = now
+            if self._read_signature(db) != self._signature:
+                self.load(db)
+
+    def _read_signature(self, db: Session) -> Tuple[Any, ...]:
+        """经验表的变更签名：新增改变条数和最大ID，删除改变条数，修改改变最近更新时间"""
+
+        return tuple(db.query(
+            func.count(CompatibilityExperience.id),
+            func.max(CompatibilityExperience.id),
+            func.max(CompatibilityExperience.updated_at)
+        ).one())
+
+    def invalidate(self):
+        """标记索引失效，下次使用时全量重建"""
+        with self._lock:
+            self._loaded_at = None
+            self.version += 1
+
+    def has_pair(self, part_a_id: int, part_b_id: int) -> bool:
+        """零件对是否可能存在经验数据（不存在时结果确定）"""
+        return _pair_key(part_a_id, part_b_id) in self._pair_counts
+
+    def filter_pairs(self, part_id_pairs: Iterable[Tuple[int, int]]) -> List[Tuple[int, int]]:
+        """筛选出可能存在经验数据的零件对"""
+        pair_counts = self._pair_counts
+        return [
+            (part_a_id, part_b_id) for part_a_id, part_b_id in part_id_pairs
+            if _pair_key(part_a_id, part_b_id) in pair_counts
+        ]
+
+    def add_pair(self, part_a_id: int, part_b_id: int):
+        """记录新增的经验"""
+        with self._lock:
+            key = _pair_key(part_a_id, part_b_id)
+            self._pair_counts[key] = self._pair_counts.get(key, 0) + 1
+            self.version += 1
+
+    def touch_pair(self, part_a_id: int, part_b_id: int):
+        """记录经验内容的修改（成员关系不变）"""
+        with self._lock:
+            self.version += 1
+
+    def remove_pair(self, part_a_id: int, part_b_id: int):
+        """记录删除的经验"""
+        with self._lock:
+            key = _pair_key(part_a_id, part_b_id)
+            count = self._pair_counts.get(key, 0)
+            if count <= 1:
+                self._pair_counts.pop(key, None)
+            else:
+                self._pair_counts[key] = count - 1
+            self.version += 1
+
+    def stats(self) -> Dict[str, object]:
+        """获取索引统计信息"""
+        loaded_at = self._loaded_at
+        return {
+            "loaded": loaded_at is not None,
+            "pair_count": len(self._pair_counts),
+            "version": self.version,
+            "age_seconds": round(time.monotonic() - loaded_at, 1) if loaded_at is not None else None
+        }
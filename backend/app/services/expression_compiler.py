@@ -0,0 +1,221 @@
+# backend/app/services/expression_compiler.py
+"""
+安全表达式闭包编译器
+
+把已通过安全验证的 AST 预先编译为一棵专用的 Python 闭包树：节点类型分派、
+运算符查找、函数白名单判断和属性名检查都在编译时完成，执行时每个节点只是一次闭包调用。
+执行语义（求值顺序、短路、异常类型和信息）与 SafeExpressionEngine._eval_node 保持一致，
+运行时的安全检查（禁止的属性、函数白名单、不支持的节点）同样保留，只是提前到编译时判定。
+"""
+
+import ast
+from typing import Any, Callable, Dict, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from app.services.safe_expression_parser import SafeExpressionEngine
+
+Evaluator = Callable[[Dict[str, Any]], Any]
+
+# Python 3.8 下下标包装在 ast.Index 中，3.9 起直接是表达式节点
+_AST_INDEX = getattr(ast, "Index", ())
+
+class ClosureCompiler:
+    """将安全表达式 AST 编译为闭包"""
+
+    def __init__(self, engine: "SafeExpressionEngine"):
+        self.engine = engine
+
+    def compile(self, tree: ast.Expression) -> Evaluator:
+        """编译整个表达式（调用方需保证表达式已通过安全验证）"""
+        return self._compile(tree.body)
+
+    def _compile(self, node: ast.AST) -> Evaluator:
+        handler = getattr(self, f"_compile_{type(node).__name__}", None)
+        if handler is None:
+            return self._raise_security_error(f"不支持的节点类型: {type(node).__name__}")
+        return handler(node)
+
+    def _raise_security_error(self, message: str, *operands: Evaluator) -> Evaluator:
+        """执行到该节点时抛出 SecurityError（先求值操作数，保持与解释执行相同的异常顺序）"""
+        from app.services.safe_expression_parser import SecurityError
+
+        def evaluate(context):
+            for operand in operands:
+                operand(context)
+            raise SecurityError(message)
+        return evaluate
+
+    # ==================== 叶子节点 ====================
+
+    def _compile_Constant(self, node: ast.Constant) -> Evaluator:
+        value = node.value
+        return lambda context: value
+
+    def _compile_Num(self, node) -> Evaluator:  # 兼容旧版本
+        value = node.n
+        return lambda context: value
+
+    def _compile_Str(self, node) -> Evaluator:  # 兼容旧版本
+        value = node.s
+        return lambda context: value
+
+    def _compile_NameConstant(self, node) -> Evaluator:  # 兼容旧版本
+        value = node.value
+        return lambda context: value
+
+    def _compile_Name(self, node: ast.Name) -> Evaluator:
+        name = node.id
+        safe_builtins = self.engine.safe_builtins
+
+        def evaluate(context):
+            if name in context:
+                return context[name]
+            if name in safe_builtins:
+                return safe_builtins[name]
+            raise NameError(f"未定义的变量: {name}")
+        return evaluate
+
+    # ==================== 属性和下标 ====================
+
+    def _compile_Attribute(self, node: ast.Attribute) -> Evaluator:
+        value = self._compile(node.value)
+        attr_name = node.attr
+
+        if attr_name.startswith('__') or attr_name in self.engine.forbidden_functions:
+            return self._raise_security_error(f"禁止访问属性: {attr_name}", value)
+
+        def evaluate(context):
+            obj = value(context)
+
+            # 处理字典类型的属性访问（零件上下文）
+            if isinstance(obj, dict):
+                result = obj.get(attr_name)
+                if result is None:
+                    raise AttributeError(f"属性 '{attr_name}' 不存在。可用属性: {list(obj.keys())}")
+                return result
+
+            if not hasattr(obj, attr_name):
+                raise AttributeError(f"对象没有属性 '{attr_name}'")
+            return getattr(obj, attr_name)
+        return evaluate
+
+    def _compile_Subscript(self, node: ast.Subscript) -> Evaluator:
+        value = self._compile(node.value)
+        index = self._compile(node.slice.value if isinstance(node.slice, _AST_INDEX) else node.slice)
+        return lambda context: value(context)[index(context)]
+
+    # ==================== 运算 ====================
+
+    def _compile_BinOp(self, node: ast.BinOp) -> Evaluator:
+        left = self._compile(node.left)
+        right = self._compile(node.right)
+        op = self.engine.safe_operators.get(type(node.op))
+        if op is None:
+            return self._raise_security_error(f"不支持的二元操作: {type(node.op).__name__}", left, right)
+        return lambda context: op(left(context), right(context))
+
+    def _compile_UnaryOp(self, node: ast.UnaryOp) -> Evaluator:
+        operand = self._compile(node.operand)
+        op = self.engine.safe_operators.get(type(node.op))
+        if op is None:
+            return self._raise_security_error(f"不支持的一元操作: {type(node.op).__name__}", operand)
+        return lambda context: op(operand(context))
+
+    def _compile_Compare(self, node: ast.Compare) -> Evaluator:
+        from app.services.safe_expression_parser import SecurityError
+
+        left = self._compile(node.left)
+        steps = []
+        for op_node, comparator in zip(node.ops, node.comparators):
+            steps.append((
+                self.engine.safe_operators.get(type(op_node)),
+                type(op_node).__name__,
+                self._compile(comparator)
+            ))
+
+        if len(steps) == 1 and steps[0][0] is not None:
+            op, _, right = steps[0]
+            return lambda context: True if op(left(context), right(context)) else False
+
+        def evaluate(context):
+            left_value = left(context)
+            for op, op_name, right in steps:
+                right_value = right(context)
+                if op is None:
+                    raise SecurityError(f"不支持的比较操作: {op_name}")
+                if not op(left_value, right_value):
+                    return False
+                left_value = right_value  # 链式比较
+            return True
+        return evaluate
+
+    def _compile_BoolOp(self, node: ast.BoolOp) -> Evaluator:
+        values = tuple(self._compile(value) for value in node.values)
+
+        # 短路求值：and 遇到假值、or 遇到真值即返回，剩余操作数不再求值
+        if isinstance(node.op, ast.And):
+            def evaluate(context):
+                for value in values:
+                    if not value(context):
+                        return False
+                return True
+            return evaluate
+        if isinstance(node.op, ast.Or):
+            def evaluate(context):
+                for value in values:
+                    if value(context):
+                        return True
+                return False
+            return evaluate
+        return self._raise_security_error(f"不支持的布尔操作: {type(node.op).__name__}")
+
+    def _compile_IfExp(self, node: ast.IfExp) -> Evaluator:
+        test = self._compile(node.test)
+        body = self._compile(node.body)
+        orelse = self._compile(node.orelse)
+        return lambda context: body(context) if test(context) else orelse(context)
+
+    # ==================== 容器 ====================
+
+    def _compile_List(self, node: ast.List) -> Evaluator:
+        items = tuple(self._compile(item) for item in node.elts)
+        return lambda context: [item(context) for item in items]
+
+    def _compile_Tuple(self, node: ast.Tuple) -> Evaluator:
+        items = tuple(self._compile(item) for item in node.elts)
+        return lambda context: tuple(item(context) for item in items)
+
+    def _compile_Dict(self, node: ast.Dict) -> Evaluator:
+        entries = tuple((self._compile(key), self._compile(value)) for key, value in zip(node.keys, node.values))
+        return lambda context: {key(context): value(context) for key, value in entries}
+
+    # ==================== 函数调用 ====================
+
+    def _compile_Call(self, node: ast.Call) -> Evaluator:
+        from app.services.safe_expression_parser import ExpressionError, SecurityError
+
+        func = self._compile(node.func)
+
+        func_name = None
+        if isinstance(node.func, ast.Name):
+            func_name = node.func.id
+        elif isinstance(node.func, ast.Attribute):
+            func_name = node.func.attr
+        allowed = not func_name or func_name in self.engine.allowed_functions
+
+        args = tuple(self._compile(arg) for arg in node.args)
+        keywords = tuple((keyword.arg, self._compile(keyword.value)) for keyword in node.keywords)
+
+        def evaluate(context):
+            function = func(context)
+            if not allowed:
+                raise SecurityError(f"不允许调用函数: {func_name}")
+
+            arg_values = [arg(context) for arg in args]
+            kwarg_values = {name: value(context) for name, value in keywords}
+
+            try:
+                return function(*arg_values, **kwarg_values)
+            except Exception as e:
+                raise ExpressionError(f"函数调用失败 {func_name}: {str(e)}")
+        return evaluate
@@ -0,0 +1,175 @@
+# backend/app/services/parallel_evaluation.py
+"""
+多进程规则评估
+
+规则表达式求值是纯CPU计算，在事件循环线程中执行时会阻塞其他请求。
+大批量评估时将规则表达式文本和零件上下文分块发送到进程池，
+各工作进程使用自己的 SafeExpressionEngine 编译（带缓存）并执行，结果在主进程合并。
+"""
+
+import asyncio
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 评估任务：(part_a_id, part_b_id, 规则ID元组)
+EvaluationTask = Tuple[int, int, Tuple[int, ...]]
+# 评估结果：(part_a_id, part_b_id, rule_id, 是否通过, 执行耗时, 错误信息)
+EvaluationResult = Tuple[int, int, int, bool, float, Optional[str]]
+
+# ==================== 工作进程 ====================
+
+_worker_engine = None
+
+def _init_worker():
+    """工作进程初始化：创建进程内的表达式引擎"""
+    global _worker_engine
+    from app.services.safe_expression_parser import SafeExpressionEngine
+
+    _worker_engine = SafeExpressionEngine()
+
+def _evaluate_chunk(
+    rule_expressions: Dict[int, str],
+    contexts: Dict[int, Dict[str, Any]],
+    tasks: List[EvaluationTask]
+) -> List[EvaluationResult]:
+    """在工作进程中执行一块评估任务（与 CompatibilityEngine._execute_rule 的结果一致）"""
+
+    compiled_rules = {
+        rule_id: _worker_engine.compile_expression(expression)
+        for rule_id, expression in rule_expressions.items()
+    }
+
+    results = []
+    for part_a_id, part_b_id, rule_ids in tasks:
+        context = {'part_a': contexts[part_a_id], 'part_b': contexts[part_b_id]}
+        for rule_id in rule_ids:
+            start_time = time.time()
+            try:
+                passed = bool(_worker_engine.evaluate_compiled_expression(compiled_rules[rule_id], context))
+                error_message = None
+            except Exception as e:
+                passed = False
+                error_message = str(e)
+            results.append((part_a_id, part_b_id, rule_id, passed, time.time() - start_time, error_message))
+
+    return results
+
+# ==================== 主进程 ====================
+
+class ParallelRuleEvaluator:
+    """基于进程池的规则批量评估器"""
+
+    def __init__(
+        self,
+        max_workers: Optional[int] = None,
+        min_tasks: int = 2000,
+        chunk_size: int = 500
+    ):
+        # 未指定时使用CPU核数；小于2时不启用（单进程没有并行收益）
+        self.max_workers = max_workers if max_workers is not None else (os.cpu_count() or 1)
+        self.min_tasks = min_tasks  # 规则执行次数低于该值时进程间传输开销大于收益，由调用方串行执行
+        self.chunk_size = chunk_size  # 每块包含的零件对数
+
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self.batches = 0
+        self.failures = 0
+
+    @property
+    def available(self) -> bool:
+        return self.max_workers > 1
+
+    def should_parallelize(self, rule_executions: int) -> bool:
+        """评估量是否值得使用进程池"""
+        return self.available and rule_executions >= self.min_tasks
+
+    def executor_for(self, executions: int) -> Optional[ProcessPoolExecutor]:
+        """评估量值得并行时返回进程池（供 SafeExpressionEngine.evaluate_many 分块提交），否则返回 None"""
+        if not self.should_parallelize(executions):
+            return None
+        return self._get_pool()
+
+    async def evaluate(
+        self,
+        rule_expressions: Dict[int, str],
+        contexts: Dict[int, Dict[str, Any]],
+        tasks: Sequence[EvaluationTask]
+    ) -> Optional[List[EvaluationResult]]:
+        """
+        分块并行评估
+
+        每块只携带其任务引用到的零件上下文。进程池不可用时返回 None，由调用方串行执行。
+        """
+
+        pool = self._get_pool()
+        if pool is None:
+            return None
+
+        loop = asyncio.get_running_loop()
+        futures = []
+        for start in range(0, len(tasks), self.chunk_size):
+            chunk = list(tasks[start:start + self.chunk_size])
+            part_ids = {part_id for part_a_id, part_b_id, _ in chunk for part_id in (part_a_id, part_b_id)}
+            rule_ids = {rule_id for _, _, chunk_rule_ids in chunk for rule_id in chunk_rule_ids}
+            futures.append(loop.run_in_executor(
+                pool, _evaluate_chunk,
+                {rule_id: rule_expressions[rule_id] for rule_id in rule_ids},
+                {part_id: contexts[part_id] for part_id in part_ids},
+                chunk
+            ))
+
+        try:
+            chunk_results = await asyncio.gather(*futures)
+        except BrokenProcessPool as e:
+            # 工作进程异常退出：丢弃进程池，下次使用时重建
+            logger.error(f"规则评估进程池已损坏: {str(e)}")
+            self.failures += 1
+            self._pool = None
+            return None
+
+        self.batches += 1
+        return [result for results in chunk_results for result in results]
+
+    def shutdown(self):
+        """关闭进程池"""
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def _get_pool(self) -> Optional[ProcessPoolExecutor]:
+        if not self.available:
+            return None
+
+        if self._pool is None:
+            try:
+                # spawn 启动：避免 fork 复制事件循环、数据库连接和线程锁
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker
+                )
+            except Exception as e:
+                logger.error(f"创建规则评估进程池失败: {str(e)}")
+                self.failures += 1
+                return None
+
+        return self._pool
+
+    def stats(self) -> Dict[str, Any]:
+        """获取统计信息"""
+        return {
+            "available": self.available,
+            "max_workers": self.max_workers,
+            "min_tasks": self.min_tasks,
+            "chunk_size": self.chunk_size,
+            "pool_started": self._pool is not None,
+            "batches": self.batches,
+            "failures": self.failures
+        }
@@ -0,0 +1,100 @@
+# backend/app/services/part_context.py
+"""
+零件规则执行上下文
+
+规则执行上下文只依赖零件内容，按 (零件ID, 更新时间) 缓存，
+同一版本的零件无论参与多少零件对、多少条规则都只构建一次。
+上下文对象不可修改，可在多次规则执行间安全共享。
+"""
+
+import re
+from functools import lru_cache
+from typing import Any, Dict, Hashable, Tuple
+
+from app.core.cache import LRUCache
+from app.models.part import Part
+
+_INVALID_NAME_CHARS = re.compile(r'[^a-zA-Z0-9_\u4e00-\u9fff]')
+
+@lru_cache(maxsize=4096)
+def clean_property_name(name: str) -> str:
+    """清理属性名，使其可以作为变量名使用（属性名集合有限，结果缓存）"""
+
+    # 移除特殊字符，只保留字母、数字和下划线
+    clean_name = _INVALID_NAME_CHARS.sub('_', name)
+
+    # 确保以字母或下划线开头
+    if clean_name and clean_name[0].isdigit():
+        clean_name = f"prop_{clean_name}"
+
+    return clean_name or "unknown_prop"
+
+def _readonly(self, *args, **kwargs):
+    raise TypeError("零件上下文不可修改")
+
+class PartContext(dict):
+    """
+    不可修改的零件上下文
+
+    继承 dict，表达式求值、向量化预筛和 safe_get 中的字典判断保持不变；
+    所有修改方法都会抛出 TypeError。
+    """
+
+    __slots__ = ()
+
+    __setitem__ = __delitem__ = _readonly
+    clear = pop = popitem = setdefault = update = _readonly
+    __ior__ = _readonly
+
+    def __reduce__(self):
+        # 默认的 dict 子类序列化会逐项调用 __setitem__，发送到工作进程时改为整体构造
+        return (PartContext, (dict(self),))
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+def build_part_context(part: Part) -> PartContext:
+    """将零件对象转换为规则执行上下文"""
+
+    context = {
+        'id': part.id,
+        'name': part.name,
+        'category': part.category or "",
+        'description': part.description or ""
+    }
+
+    # 添加属性字段
+    if part.properties:
+        for key, value in part.properties.items():
+            # 清理属性名，确保可以作为变量名使用
+            context[clean_property_name(key)] = value
+
+            # 同时保留原始键名，支持中文属性名
+            context[key] = value
+
+    return PartContext(context)
+
+class PartContextCache:
+    """按零件版本缓存的上下文"""
+
+    def __init__(self, maxsize: int = 8192):
+        self._cache = LRUCache(maxsize=maxsize)
+
+    def get(self, part: Part) -> PartContext:
+        """获取零件当前版本的上下文（零件更新后 updated_at 变化，自动使用新条目）"""
+
+        key: Tuple[Hashable, ...] = (part.id, part.updated_at)
+        context = self._cache.get(key)
+        if context is None:
+            context = build_part_context(part)
+            self._cache.set(key, context)
+        return context
+
+    def clear(self):
+        self._cache.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return self._cache.stats()
@@ -0,0 +1,301 @@
+# backend/app/services/rule_impact.py
+"""
+规则影响分析（试运行）
+
+启用或创建规则前，对 category_a × category_b 的全部零件对执行候选规则
+（part_a 取自 category_a，part_b 取自 category_b），统计通过/失败/出错/不适用的零件对数，
+并计算数据库缓存中的检查结果有多少会因该规则而改变。不修改规则、索引或任何缓存。
+
+零件对按行处理：category_b 的零件构成一个列式批次，每个 category_a 零件对其整体向量化求值一次；
+无法向量化的行和向量化结果无效的单元格收集成批，用 evaluate_many 执行已编译的闭包
+（数量较大时分块提交到规则评估进程池）。
+"""
+
+import time
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Set, Tuple
+from sqlalchemy.orm import Session
+
+from app.models.compatibility import CompatibilityCache, CompatibilityRule, make_category_pair_key
+from app.models.part import Part
+from app.services.compatibility_engine import CompatibilityEngine, compatibility_engine
+from app.services.part_context import PartContext, build_part_context
+from app.services.rule_index import IndexedRule
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 错误信息样例的最大条数
+_MAX_ERROR_SAMPLES = 5
+
+class RuleImpactAnalyzer:
+    """规则影响分析器"""
+
+    def __init__(
+        self,
+        engine: CompatibilityEngine,
+        batch_pairs: int = 50000,
+        progress_interval_seconds: float = 1.0,
+        max_cached_results: int = 5000
+    ):
+        self.engine = engine
+        self.batch_pairs = batch_pairs  # 逐行执行的零件对攒够该数量后批量执行
+        self.progress_interval_seconds = progress_interval_seconds
+        self.max_cached_results = max_cached_results  # 最多检查的数据库缓存条目数（按计算时间取最新）
+
+    async def iter_impact(self, rule: CompatibilityRule, db: Session) -> AsyncIterator[Dict[str, Any]]:
+        """
+        执行影响分析，依次产生 header、若干 progress 和最后的 summary 事件
+
+        Raises:
+            ValueError: 规则表达式未通过安全验证
+        """
+
+        start_time = time.time()
+
+        compiled = self.engine.expression_engine.compile_expression(rule.rule_expression)
+        if not compiled.is_safe:
+            raise ValueError("规则表达式未通过安全验证")
+        candidate = IndexedRule(rule, compiled)
+
+        # 直接构建上下文，避免整类零件挤出上下文缓存中的热点零件
+        parts_a = self._load_parts(db, rule.category_a)
+        same_category = rule.category_a == rule.category_b
+        parts_b = parts_a if same_category else self._load_parts(db, rule.category_b)
+        contexts_a = [build_part_context(part) for part in parts_a]
+        contexts_b = contexts_a if same_category else [build_part_context(part) for part in parts_b]
+
+        pairs_total = len(parts_a) * len(parts_b) - (len(parts_a) if same_category else 0)
+        yield {
+            "type": "header",
+            "rule_id": rule.id,
+            "rule_name": rule.name,
+            "category_a": rule.category_a,
+            "category_b": rule.category_b,
+            "is_active": rule.is_active,
+            "parts_a": len(parts_a),
+            "parts_b": len(parts_b),
+            "pairs_total": pairs_total
+        }
+
+        counts = {"passed": 0, "failed": 0, "errors": 0, "not_applicable": 0}
+        error_samples: List[str] = []
+
+        # part_b 一侧缺少必需属性的零件对规则不适用，只需判断一次
+        applicable_b = [
+            index for index, context in enumerate(contexts_b)
+            if all(context.get(attr) is not None for attr in candidate.required_b)
+        ]
+        not_applicable_b = len(contexts_b) - len(applicable_b)
+        positions_b = {parts_b[index].id: position for position, index in enumerate(applicable_b)}
+
+        screener = self.engine.vector_screener
+        frame = None
+        if screener.available and len(applicable_b) >= screener.min_batch_size:
+            frame = screener.build_frame([contexts_b[index] for index in applicable_b])
+
+        pending: List[Dict[str, PartContext]] = []
+        pairs_done = 0
+        vectorized_rows = 0
+        last_progress = time.monotonic()
+
+        for row, (part_a, context_a) in enumerate(zip(parts_a, contexts_a)):
+            # 同类别时跳过零件与自身的零件对
+            self_position = positions_b.get(part_a.id) if same_category else None
+            row_pairs = len(parts_b) - (1 if same_category else 0)
+            pairs_done += row_pairs
+
+            if any(context_a.get(attr) is None for attr in candidate.required_a):
+                counts["not_applicable"] += row_pairs
+            else:
+                counts["not_applicable"] += not_applicable_b - (
+                    1 if same_category and self_position is None else 0
+                )
+
+                evaluation = None
+                if frame is not None:
+                    evaluation = screener.evaluate(
+                        compiled, frame, context_a, candidate_name="part_b", fixed_name="part_a"
+                    )
+
+                if evaluation is not None:
+                    vectorized_rows += 1
+                    passed, valid, _ = evaluation
+                    invalid = ~valid
+                    if self_position is not None:
+                        valid = valid.copy()
+                        valid[self_position] = False
+                        invalid[self_position] = False
+
+                    passed_count = int((passed & valid).sum())
+                    counts["passed"] += passed_count
+                    counts["failed"] += int(valid.sum()) - passed_count
+                    pending.extend(
+                        {'part_a': context_a, 'part_b': contexts_b[applicable_b[position]]}
+                        for position in invalid.nonzero()[0]
+                    )
+                else:
+                    pending.extend(
+                        {'part_a': context_a, 'part_b': contexts_b[index]}
+                        for position, index in enumerate(applicable_b)
+                        if position != self_position
+                    )
+
+                if len(pending) >= self.batch_pairs:
+                    self._evaluate_pending(rule.rule_expression, pending, counts, error_samples)
+                    pending = []
+
+            if time.monotonic() - last_progress >= self.progress_interval_seconds:
+                last_progress = time.monotonic()
+                yield {
+                    "type": "progress",
+                    "rows_done": row + 1,
+                    "rows_total": len(parts_a),
+                    # 攒批中尚未执行的零件对不计入各项计数
+                    "pairs_done": pairs_done - len(pending),
+                    "pairs_total": pairs_total,
+                    **counts,
+                    "elapsed_seconds": time.time() - start_time
+                }
+
+        if pending:
+            self._evaluate_pending(rule.rule_expression, pending, counts, error_samples)
+
+        cache_impact = await self._cached_result_impact(candidate, db)
+
+        summary = {
+            "type": "summary",
+            "rule_id": rule.id,
+            "pairs_total": pairs_total,
+            **counts,
+            "error_samples": error_samples,
+            "vectorized_rows": vectorized_rows,
+            **cache_impact,
+            "execution_time": time.time() - start_time
+        }
+        logger.info(
+            f"规则影响分析完成 [规则ID: {rule.id}]: {pairs_total}个零件对, "
+            f"通过{counts['passed']}, 失败{counts['failed']}, 出错{counts['errors']}, "
+            f"将改变{cache_impact['cached_results_changed']}个缓存结果, 耗时{summary['execution_time']:.2f}秒"
+        )
+        yield summary
+
+    def _load_parts(self, db: Session, category: str) -> List[Part]:
+        return db.query(Part).filter(Part.category == category).order_by(Part.id).all()
+
+    def _evaluate_pending(
+        self,
+        expression: str,
+        contexts: List[Dict[str, PartContext]],
+        counts: Dict[str, int],
+        error_samples: List[str]
+    ):
+        """逐项执行攒批的零件对（执行出错按规则失败处理，与引擎一致）"""
+
+        executor = self.engine.parallel_evaluator.executor_for(len(contexts))
+        batch = self.engine.expression_engine.evaluate_many(expression, contexts, executor)
+
+        error_indexes = set()
+        for index, error_message in batch.errors:
+            error_indexes.add(index)
+            if len(error_samples) < _MAX_ERROR_SAMPLES and error_message not in error_samples:
+                error_samples.append(error_message)
+
+        passed_count = sum(
+            1 for index, result in enumerate(batch.results) if index not in error_indexes and result
+        )
+        counts["passed"] += passed_count
+        counts["errors"] += len(error_indexes)
+        counts["failed"] += len(batch.results) - passed_count - len(error_indexes)
+
+    async def _cached_result_impact(self, candidate: IndexedRule, db: Session) -> Dict[str, Any]:
+        """
+        统计数据库缓存中会因候选规则而改变的检查结果
+
+        对缓存结果中属于规则类别组合的零件对，分别用当前活跃规则和加入（或替换为）候选规则后的规则集评估，
+        评分、等级或兼容性不同的零件对视为改变；包含改变零件对的缓存条目即会改变的缓存结果。
+        """
+
+        rows = db.query(CompatibilityCache.part_ids_hash, CompatibilityCache.compatibility_result).filter(
+            CompatibilityCache.categories.contains(sorted({candidate.category_a, candidate.category_b})),
+            CompatibilityCache.expires_at > datetime.utcnow()
+        ).order_by(CompatibilityCache.calculated_at.desc()).limit(self.max_cached_results + 1).all()
+
+        truncated = len(rows) > self.max_cached_results
+        rows = rows[:self.max_cached_results]
+
+        category_key = candidate.category_key
+        pairs_by_entry: Dict[str, List[Tuple[int, int]]] = {}
+        for part_ids_hash, result in rows:
+            pairs_by_entry[part_ids_hash] = [
+                (combination["part_a_id"], combination["part_b_id"])
+                for combination in (result or {}).get("part_combinations", [])
+                if make_category_pair_key(
+                    combination.get("part_a_category") or "", combination.get("part_b_category") or ""
+                ) == category_key
+            ]
+
+        cached_pairs = sorted({pair for pairs in pairs_by_entry.values() for pair in pairs})
+        changed_pairs, flipped_pairs = await self._changed_pairs(candidate, cached_pairs, db)
+
+        return {
+            "cached_results_checked": len(rows),
+            "cached_results_truncated": truncated,
+            "cached_results_changed": sum(
+                1 for pairs in pairs_by_entry.values() if any(pair in changed_pairs for pair in pairs)
+            ),
+            "cached_pairs_checked": len(cached_pairs),
+            "cached_pairs_changed": len(changed_pairs),
+            "cached_pairs_flipped": len(flipped_pairs)
+        }
+
+    async def _changed_pairs(
+        self,
+        candidate: IndexedRule,
+        pair_ids: List[Tuple[int, int]],
+        db: Session
+    ) -> Tuple[Set[Tuple[int, int]], Set[Tuple[int, int]]]:
+        """返回加入候选规则后结果改变的零件对，以及其中兼容性翻转的零件对"""
+
+        if not pair_ids:
+            return set(), set()
+
+        part_ids = {part_id for pair in pair_ids for part_id in pair}
+        parts = {part.id: part for part in db.query(Part).filter(Part.id.in_(part_ids)).all()}
+        part_pairs = [
+            (parts[part_a_id], parts[part_b_id])
+            for part_a_id, part_b_id in pair_ids
+            if part_a_id in parts and part_b_id in parts
+        ]
+
+        # 零件对方向与缓存结果一致，规则绑定方式与引擎实际执行时相同
+        self.engine.rule_index.ensure_loaded(db)
+        current_rules = [
+            self.engine.rule_index.get_rules(part_a.category or "", part_b.category or "")
+            for part_a, part_b in part_pairs
+        ]
+        candidate_rules = [
+            sorted(
+                [rule for rule in rules if rule.id != candidate.id] + [candidate],
+                key=lambda rule: (-rule.weight, rule.id)
+            )
+            for rules in current_rules
+        ]
+
+        before = await self.engine.check_part_pairs_with_rules(part_pairs, current_rules, db, "basic")
+        after = await self.engine.check_part_pairs_with_rules(part_pairs, candidate_rules, db, "basic")
+
+        changed = set()
+        flipped = set()
+        for old, new in zip(before, after):
+            if (old.compatibility_score, old.compatibility_grade, old.is_compatible) != (
+                new.compatibility_score, new.compatibility_grade, new.is_compatible
+            ):
+                changed.add((old.part_a_id, old.part_b_id))
+                if old.is_compatible != new.is_compatible:
+                    flipped.add((old.part_a_id, old.part_b_id))
+
+        return changed, flipped
+
+# 全局规则影响分析器实例
+rule_impact_analyzer = RuleImpactAnalyzer(compatibility_engine)
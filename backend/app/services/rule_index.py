@@ -0,0 +1,185 @@
+# backend/app/services/rule_index.py
+"""
+兼容性规则内存索引
+
+按（与顺序无关的）类别组合索引所有活跃规则，规则表达式在加载时预编译，
+热路径上的规则查找只需一次字典访问。管理端规则变更时增量更新索引。
+"""
+
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from sqlalchemy.orm import Session
+
+from app.models.compatibility import CompatibilityRule, make_category_pair_key
+from app.services.safe_expression_parser import SafeExpressionEngine, CompiledExpression
+import logging
+
+logger = logging.getLogger(__name__)
+
+class IndexedRule:
+    """索引中的规则快照（与数据库会话解耦，字段与 CompatibilityRule 同名）"""
+
+    __slots__ = (
+        "id", "name", "rule_expression", "category_a", "category_b",
+        "weight", "is_blocking", "compiled", "required_a", "required_b"
+    )
+
+    def __init__(self, rule: CompatibilityRule, compiled: CompiledExpression):
+        self.id = rule.id
+        self.name = rule.name
+        self.rule_expression = rule.rule_expression
+        self.category_a = rule.category_a
+        self.category_b = rule.category_b
+        self.weight = rule.weight
+        self.is_blocking = rule.is_blocking
+        self.compiled = compiled
+        # 规则执行必然读取的零件属性，零件缺少其中任一属性时规则不适用
+        self.required_a = tuple(sorted(compiled.required_properties.get("part_a", ())))
+        self.required_b = tuple(sorted(compiled.required_properties.get("part_b", ())))
+
+    @property
+    def category_key(self) -> Tuple[str, str]:
+        return make_category_pair_key(self.category_a, self.category_b)
+
+    def missing_property(self, context_a: Dict[str, Any], context_b: Dict[str, Any]) -> Optional[str]:
+        """返回零件上下文缺少的第一个必需属性（如 "part_a.socket"），全部存在时返回 None"""
+
+        for attr in self.required_a:
+            if context_a.get(attr) is None:
+                return f"part_a.{attr}"
+        for attr in self.required_b:
+            if context_b.get(attr) is None:
+                return f"part_b.{attr}"
+        return None
+
+    def __repr__(self):
+        return f"<IndexedRule(id={self.id}, name='{self.name}', categories='{self.category_a}+{self.category_b}')>"
+
+def _sort_rules(rules: List[IndexedRule]) -> List[IndexedRule]:
+    """按权重降序排列（权重相同按ID升序，保证顺序稳定）"""
+    return sorted(rules, key=lambda r: (-r.weight, r.id))
+
+class RuleIndex:
+    """活跃规则的内存索引"""
+
+    def __init__(self, expression_engine: SafeExpressionEngine, max_age_seconds: int = 300):
+        self.expression_engine = expression_engine
+        # 多进程部署时其他进程的变更无法直接通知本进程，超过该时长后自动全量重建
+        self.max_age_seconds = max_age_seconds
+
+        self._rules_by_pair: Dict[Tuple[str, str], List[IndexedRule]] = {}
+        self._rules_by_id: Dict[int, IndexedRule] = {}
+        self._loaded_at: Optional[float] = None
+        self._lock = threading.RLock()
+
+        # 每次索引内容变化时递增，供依赖规则集的缓存使用
+        self.version = 0
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._loaded_at is not None
+
+    @property
+    def is_fresh(self) -> bool:
+        """已加载且未超过最长复用时间"""
+        loaded_at = self._loaded_at
+        return loaded_at is not None and time.monotonic() - loaded_at <= self.max_age_seconds
+
+    def load(self, db: Session):
+        """从数据库全量加载活跃规则"""
+
+        rules = db.query(CompatibilityRule).filter(
+            CompatibilityRule.is_active == True
+        ).all()
+
+        rules_by_id = {rule.id: self._build_entry(rule) for rule in rules}
+        rules_by_pair: Dict[Tuple[str, str], List[IndexedRule]] = {}
+        for entry in rules_by_id.values():
+            rules_by_pair.setdefault(entry.category_key, []).append(entry)
+
+        with self._lock:
+            self._rules_by_id = rules_by_id
+            self._rules_by_pair = {
+                key: _sort_rules(entries) for key, entries in rules_by_pair.items()
+            }
+            self._loaded_at = time.monotonic()
+            self.version += 1
+
+        logger.info(f"规则索引已加载: {len(rules_by_id)} 条活跃规则, {len(rules_by_pair)} 个类别组合")
+
+    def ensure_loaded(self, db: Session):
+        """索引未加载或已过期时重新加载"""
+
+        loaded_at = self._loaded_at
+        if loaded_at is None or time.monotonic() - loaded_at > self.max_age_seconds:
+            self.load(db)
+
+    def invalidate(self):
+        """标记索引失效，下次使用时全量重建"""
+        with self._lock:
+            self._loaded_at = None
+
+    def refresh_rule(self, db: Session, rule_id: int):
+        """
+        增量刷新单条规则
+
+        从数据库重新读取规则：活跃则加入/替换索引条目，停用或已删除则移除
+        """
+
+        if not self.is_loaded:
+            # 尚未加载时无需增量维护，首次使用时会全量加载
+            return
+
+        rule = db.query(CompatibilityRule).filter(CompatibilityRule.id == rule_id).first()
+
+        with self._lock:
+            self._remove_entry(rule_id)
+            if rule is not None and rule.is_active:
+                entry = self._build_entry(rule)
+                self._rules_by_id[entry.id] = entry
+                bucket = self._rules_by_pair.get(entry.category_key, [])
+                self._rules_by_pair[entry.category_key] = _sort_rules(bucket + [entry])
+            self.version += 1
+
+    def refresh_rules(self, db: Session, rule_ids: Iterable[int]):
+        """增量刷新多条规则"""
+        for rule_id in rule_ids:
+            self.refresh_rule(db, rule_id)
+
+    def remove_rule(self, rule_id: int):
+        """从索引中移除规则"""
+        with self._lock:
+            if self._remove_entry(rule_id):
+                self.version += 1
+
+    def get_rules(self, category_a: str, category_b: str) -> List[IndexedRule]:
+        """获取类别组合的活跃规则（按权重降序）"""
+        return self._rules_by_pair.get(make_category_pair_key(category_a, category_b), [])
+
+    def stats(self) -> Dict[str, object]:
+        """获取索引统计信息"""
+        loaded_at = self._loaded_at
+        return {
+            "loaded": loaded_at is not None,
+            "rule_count": len(self._rules_by_id),
+            "category_pairs": len(self._rules_by_pair),
+            "version": self.version,
+            "age_seconds": round(time.monotonic() - loaded_at, 1) if loaded_at is not None else None
+        }
+
+    def _build_entry(self, rule: CompatibilityRule) -> IndexedRule:
+        return IndexedRule(rule, self.expression_engine.compile_expression(rule.rule_expression))
+
+    def _remove_entry(self, rule_id: int) -> bool:
+        entry = self._rules_by_id.pop(rule_id, None)
+        if entry is None:
+            return False
+
+        key = entry.category_key
+        remaining = [r for r in self._rules_by_pair.get(key, []) if r.id != rule_id]
+        if remaining:
+            self._rules_by_pair[key] = remaining
+        else:
+            self._rules_by_pair.pop(key, None)
+        return True
@@ -0,0 +1,223 @@
+# backend/app/services/rule_profiler.py
+"""
+规则执行性能分析
+
+按规则聚合执行次数、耗时分布（对数直方图）、错误率和通过率，用于找出主导搜索延迟的规则。
+记录时只写入当前线程的缓冲区，只加该缓冲区自己的锁（其他线程只在合并时竞争）；
+各线程每隔 flush_interval_seconds 把自己的缓冲区合并到全局统计。所有缓冲区登记在注册表中，
+读取报告和重置时合并/清空全部线程的缓冲区，线程空闲或已退出时的计数也不会遗漏。
+"""
+
+import math
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List
+
+# 直方图桶上界：1微秒起按√2倍递增（约1微秒~8秒），最后一个桶收纳更慢的执行
+_BUCKET_COUNT = 48
+BUCKET_BOUNDS = [1e-6 * (2 ** (i / 2)) for i in range(_BUCKET_COUNT - 1)] + [math.inf]
+
+def _bucket_index(seconds: float) -> int:
+    if seconds <= BUCKET_BOUNDS[0]:
+        return 0
+    return min(_BUCKET_COUNT - 1, math.ceil(2 * math.log2(seconds / BUCKET_BOUNDS[0])))
+
+class RuleStats:
+    """单条规则的聚合统计"""
+
+    __slots__ = ("calls", "errors", "passed", "not_applicable", "total_time", "max_time", "buckets")
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.passed = 0
+        self.not_applicable = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self.buckets = [0] * _BUCKET_COUNT
+
+    def merge(self, other: "RuleStats"):
+        self.calls += other.calls
+        self.errors += other.errors
+        self.passed += other.passed
+        self.not_applicable += other.not_applicable
+        self.total_time += other.total_time
+        self.max_time = max(self.max_time, other.max_time)
+        for index, count in enumerate(other.buckets):
+            self.buckets[index] += count
+
+    def quantile(self, q: float) -> float:
+        """按直方图估算分位数（返回所在桶的上界，最后一个桶返回最大耗时）"""
+        if not self.calls:
+            return 0.0
+
+        target = q * self.calls
+        cumulative = 0
+        for index, count in enumerate(self.buckets):
+            cumulative += count
+            if cumulative >= target:
+                bound = BUCKET_BOUNDS[index]
+                return self.max_time if math.isinf(bound) else min(bound, self.max_time)
+        return self.max_time
+
+class _ThreadBuffer:
+    __slots__ = ("stats", "last_flush", "lock", "thread")
+
+    def __init__(self):
+        self.thread = threading.current_thread()
+        self.stats: Dict[int, RuleStats] = {}
+        self.last_flush = time.monotonic()
+        # 写入线程与执行报告/重置的线程之间互斥
+        self.lock = threading.Lock()
+
+class RuleProfiler:
+    """规则执行性能分析器"""
+
+    def __init__(self, enabled: bool = True, flush_interval_seconds: float = 5.0):
+        self.enabled = enabled
+        self.flush_interval_seconds = flush_interval_seconds
+
+        self._local = threading.local()
+        self._stats: Dict[int, RuleStats] = {}
+        self._lock = threading.Lock()
+        # 所有线程的缓冲区（线程退出后缓冲区仍保留在这里，下次合并时并入）
+        self._buffers: List[_ThreadBuffer] = []
+        self._buffers_lock = threading.Lock()
+        self._started_at = time.time()
+
+    def record(self, rule_id: int, execution_time: float, passed: bool, error: bool = False):
+        """记录一次规则执行（只写当前线程缓冲区）"""
+        if not self.enabled:
+            return
+
+        buffer = self._buffer()
+        with buffer.lock:
+            stats = buffer.stats.get(rule_id)
+            if stats is None:
+                stats = buffer.stats[rule_id] = RuleStats()
+
+            stats.calls += 1
+            stats.total_time += execution_time
+            if execution_time > stats.max_time:
+                stats.max_time = execution_time
+            stats.buckets[_bucket_index(execution_time)] += 1
+            if error:
+                stats.errors += 1
+            elif passed:
+                stats.passed += 1
+
+        self._maybe_flush(buffer)
+
+    def record_not_applicable(self, rule_id: int):
+        """记录一次因缺少属性而跳过的规则"""
+        if not self.enabled:
+            return
+
+        buffer = self._buffer()
+        with buffer.lock:
+            stats = buffer.stats.get(rule_id)
+            if stats is None:
+                stats = buffer.stats[rule_id] = RuleStats()
+            stats.not_applicable += 1
+
+        self._maybe_flush(buffer)
+
+    def flush(self):
+        """立即合并所有线程的缓冲区，已退出线程的缓冲区合并后移出注册表"""
+        with self._buffers_lock:
+            buffers = list(self._buffers)
+        for buffer in buffers:
+            self._flush(buffer)
+
+        finished = [buffer for buffer in buffers if not buffer.thread.is_alive()]
+        if finished:
+            with self._buffers_lock:
+                self._buffers = [buffer for buffer in self._buffers if buffer not in finished]
+
+    def report(self, sort_by: str = "total_time", limit: int = 20) -> Dict[str, Any]:
+        """
+        慢规则报告
+
+        sort_by: total_time（总耗时，默认）/ mean / p95 / calls / error_rate
+        """
+
+        self.flush()
+        with self._lock:
+            rules = [self._rule_report(rule_id, stats) for rule_id, stats in self._stats.items()]
+            started_at = self._started_at
+
+        total_time = sum(rule["total_time_ms"] for rule in rules)
+        for rule in rules:
+            rule["time_share"] = rule["total_time_ms"] / total_time if total_time else 0.0
+
+        sort_keys = {
+            "total_time": "total_time_ms",
+            "mean": "mean_ms",
+            "p95": "p95_ms",
+            "calls": "calls",
+            "error_rate": "error_rate"
+        }
+        rules.sort(key=lambda rule: rule[sort_keys.get(sort_by, "total_time_ms")], reverse=True)
+
+        return {
+            "enabled": self.enabled,
+            "since": datetime.utcfromtimestamp(started_at).isoformat(),
+            "flush_interval_seconds": self.flush_interval_seconds,
+            "profiled_rules": len(rules),
+            "total_time_ms": total_time,
+            "rules": rules[:limit]
+        }
+
+    def reset(self):
+        """清空全局统计和所有线程的缓冲区"""
+        with self._buffers_lock:
+            buffers = list(self._buffers)
+        # 与 _flush 相同先持有全局锁：已取出缓冲区的合并不会在清空之后写回重置前的计数
+        with self._lock:
+            for buffer in buffers:
+                with buffer.lock:
+                    buffer.stats = {}
+                    buffer.last_flush = time.monotonic()
+            self._stats = {}
+            self._started_at = time.time()
+
+    def _rule_report(self, rule_id: int, stats: RuleStats) -> Dict[str, Any]:
+        executed = stats.calls
+        return {
+            "rule_id": rule_id,
+            "calls": executed,
+            "not_applicable": stats.not_applicable,
+            "total_time_ms": stats.total_time * 1000,
+            "mean_ms": stats.total_time / executed * 1000 if executed else 0.0,
+            "p95_ms": stats.quantile(0.95) * 1000,
+            "max_ms": stats.max_time * 1000,
+            "error_rate": stats.errors / executed if executed else 0.0,
+            "pass_rate": stats.passed / executed if executed else 0.0
+        }
+
+    def _buffer(self) -> _ThreadBuffer:
+        buffer = getattr(self._local, "buffer", None)
+        if buffer is None:
+            buffer = self._local.buffer = _ThreadBuffer()
+            with self._buffers_lock:
+                self._buffers.append(buffer)
+        return buffer
+
+    def _maybe_flush(self, buffer: _ThreadBuffer):
+        if time.monotonic() - buffer.last_flush >= self.flush_interval_seconds:
+            self._flush(buffer)
+
+    def _flush(self, buffer: _ThreadBuffer):
+        # 取出和合并在同一把全局锁内完成，避免与 reset 交错（加锁顺序：全局锁 -> 缓冲区锁）
+        with self._lock:
+            with buffer.lock:
+                pending, buffer.stats = buffer.stats, {}
+                buffer.last_flush = time.monotonic()
+
+            for rule_id, stats in pending.items():
+                target = self._stats.get(rule_id)
+                if target is None:
+                    self._stats[rule_id] = stats
+                else:
+                    target.merge(stats)
@@ -10,16 +10,33 @@ import operator
 import hashlib
 import time
 import re
-from typing import Dict, Any, List, Optional, Set, Union
-from datetime import datetime
+import threading
+from types import MappingProxyType
+from concurrent.futures import Executor
+from typing import Dict, Any, FrozenSet, Iterable, List, NamedTuple, Optional, Set, Tuple, Union
+from datetime import datetime, timedelta
 from sqlalchemy.orm import Session
 
+from app.core.cache import LRUCache
 from app.models.compatibility import ExpressionSecurityCache, create_expression_hash
 from app.schemas.compatibility import SecurityValidationResponse, RiskLevel
+from app.services.expression_compiler import ClosureCompiler
 import logging
 
 logger = logging.getLogger(__name__)
 
+# 安全验证结果的有效期（与数据库缓存表的24小时有效期一致）
+SECURITY_CACHE_TTL_SECONDS = 86400
+
+# 进程内安全验证缓存：create_expression_hash -> (表达式文本, SecurityValidationResponse)
+# 所有 SafeExpressionEngine 实例共享（规则执行和管理员验证接口），查询不访问数据库
+security_validation_cache = LRUCache(maxsize=4096, ttl_seconds=SECURITY_CACHE_TTL_SECONDS)
+
+# 待写回数据库缓存表的新验证结果：create_expression_hash -> (表达式文本, SecurityValidationResponse)
+# 数据库表只作为启动预热来源，由后台任务调用 flush_security_cache 批量写入，请求路径上不访问数据库
+_pending_security_results: Dict[str, Tuple[str, SecurityValidationResponse]] = {}
+_pending_security_lock = threading.Lock()
+
 class SecurityError(Exception):
     """安全错误异常"""
     pass
@@ -28,12 +45,103 @@ class ExpressionError(Exception):
     """表达式错误异常"""
     pass
 
+def extract_required_properties(tree: ast.Expression) -> Dict[str, FrozenSet[str]]:
+    """
+    提取表达式必然读取的 变量.属性（如 part_a.socket），返回 变量名 -> 属性名集合
+    
+    只收集每次执行都会求值的属性访问：and/or 只取第一个操作数，三元表达式只取条件，
+    链式比较只取前两个操作数。属性缺失（或值为 None）时 _eval_node 必然抛出 AttributeError，
+    调用方可以据此在执行前判断规则是否适用。
+    """
+    
+    required: Dict[str, Set[str]] = {}
+    
+    def collect(node: ast.AST):
+        if isinstance(node, ast.BoolOp):
+            collect(node.values[0])
+        elif isinstance(node, ast.IfExp):
+            collect(node.test)
+        elif isinstance(node, ast.Compare):
+            collect(node.left)
+            collect(node.comparators[0])
+        elif isinstance(node, ast.Attribute) and isinstance(node.value, ast.Name):
+            required.setdefault(node.value.id, set()).add(node.attr)
+        else:
+            for child in ast.iter_child_nodes(node):
+                collect(child)
+    
+    collect(tree.body)
+    return {name: frozenset(attrs) for name, attrs in required.items()}
+
+class CompiledExpression:
+    """已完成安全验证和语法解析的表达式，可对不同上下文重复执行"""
+    
+    __slots__ = ("expression", "expression_hash", "tree", "validation", "required_properties", "evaluator", "_engine")
+    
+    def __init__(
+        self,
+        engine: "SafeExpressionEngine",
+        expression: str,
+        expression_hash: str,
+        tree: Optional[ast.Expression],
+        validation: SecurityValidationResponse
+    ):
+        self._engine = engine
+        self.expression = expression
+        self.expression_hash = expression_hash
+        self.tree = tree
+        self.validation = validation
+        # 每次执行必然读取的 变量.属性，编译时提取一次
+        self.required_properties = extract_required_properties(tree) if tree is not None else {}
+        # 编译为闭包树，执行时不再逐节点分派（_eval_node 保留为参照解释器）
+        self.evaluator = ClosureCompiler(engine).compile(tree) if tree is not None else None
+    
+    @property
+    def is_safe(self) -> bool:
+        return self.validation.is_safe and self.tree is not None
+    
+    def __call__(self, context: Dict[str, Any]) -> Any:
+        """在已准备好的安全上下文中执行表达式"""
+        if not self.is_safe:
+            high_risk_issues = [
+                issue for issue in self.validation.security_issues 
+                if issue.get("severity") == "high"
+            ]
+            raise SecurityError(f"表达式存在安全风险: {high_risk_issues}")
+        
+        return self.evaluator(context)
+    
+    def interpret(self, context: Dict[str, Any]) -> Any:
+        """用递归解释器执行（与闭包执行结果一致，用于对照测试和基准）"""
+        if not self.is_safe:
+            return self(context)
+        return self._engine._eval_node(self.tree.body, context)
+
+class BatchEvaluationResult(NamedTuple):
+    """批量执行结果：results 与输入上下文一一对应（出错的项为 None），errors 为 (序号, 错误信息)"""
+    results: List[Any]
+    errors: List[Tuple[int, str]]
+    execution_time: float
+
+# 工作进程内的表达式引擎（evaluate_expression_chunk 首次调用时创建）
+_chunk_engine: Optional["SafeExpressionEngine"] = None
+
+def evaluate_expression_chunk(expression: str, contexts: List[Dict[str, Any]]) -> List[Tuple[Any, Optional[str]]]:
+    """在工作进程中对一块上下文执行表达式（模块级函数，可提交到进程池）"""
+    global _chunk_engine
+    if _chunk_engine is None:
+        _chunk_engine = SafeExpressionEngine()
+    return _chunk_engine._evaluate_chunk(_chunk_engine.compile_expression(expression), contexts)
+
 class SafeExpressionEngine:
     """安全表达式引擎"""
     
-    def __init__(self):
+    def __init__(self, compiled_cache_size: int = 1024):
         self.setup_security_rules()
         self.setup_safe_environment()
+        
+        # 编译结果缓存：表达式哈希 -> CompiledExpression
+        self._compiled_cache = LRUCache(maxsize=compiled_cache_size)
     
     def setup_security_rules(self):
         """设置安全规则"""
@@ -136,6 +244,24 @@ class SafeExpressionEngine:
             r'os\.system',  # os.system调用
             r'open\s*\(',  # 文件打开
         ]
+        self._compile_dangerous_patterns()
+    
+    def _compile_dangerous_patterns(self):
+        """
+        将危险模式编译为一个带命名分组的交替正则，一次扫描即可找出所有模式的匹配
+        
+        修改 dangerous_patterns 后需重新调用。分组名 p{序号} 对应模式在列表中的位置。
+        """
+        alternation = '|'.join(
+            f'(?P<p{index}>{pattern})' for index, pattern in enumerate(self.dangerous_patterns)
+        )
+        
+        # 所有模式都以普通字符开头时，先用首字符集合前瞻过滤，多数位置无需逐个尝试分支
+        first_chars = {pattern[0] for pattern in self.dangerous_patterns if pattern}
+        if first_chars and all(char.isalnum() or char == '_' for char in first_chars):
+            alternation = f"(?=[{''.join(sorted(first_chars))}])(?:{alternation})"
+        
+        self._dangerous_pattern_regex = re.compile(alternation, re.IGNORECASE)
     
     def setup_safe_environment(self):
         """设置安全执行环境"""
@@ -170,6 +296,7 @@ class SafeExpressionEngine:
             'safe_contains': self._safe_contains,
             'safe_match': self._safe_match,
         }
+        self._safe_builtins_view = MappingProxyType(self.safe_builtins)
         
         # 安全的操作符映射
         self.safe_operators = {
@@ -216,76 +343,31 @@ class SafeExpressionEngine:
         
         Args:
             expression: 要验证的表达式
-            db: 数据库会话（可选，用于缓存）
+            db: 数据库会话（可选，传入时新的验证结果排队，由后台任务批量写回数据库缓存表）
             
         Returns:
             SecurityValidationResponse: 安全验证结果
         """
         
         try:
-            # 检查缓存
-            if db:
-                cached_result = await self._get_cached_security_result(expression, db)
-                if cached_result:
-                    return cached_result
+            # 检查进程内缓存
+            cached_result = self._get_cached_validation(expression)
+            if cached_result is not None:
+                return cached_result
             
             # 执行安全检查
-            security_issues = []
-            risk_level = RiskLevel.LOW
-            recommendations = []
-            
-            # 1. 字符串模式检查
-            pattern_issues = self._check_dangerous_patterns(expression)
-            security_issues.extend(pattern_issues)
-            
-            # 2. AST语法树检查
-            try:
-                tree = ast.parse(expression, mode='eval')
-                ast_issues = self._check_ast_security(tree)
-                security_issues.extend(ast_issues)
-            except SyntaxError as e:
-                security_issues.append({
-                    "type": "syntax_error",
-                    "message": f"语法错误: {str(e)}",
-                    "severity": "high"
-                })
+            result, _ = self._run_security_checks(expression)
+            self._cache_validation(expression, result)
             
-            # 3. 计算风险等级
-            risk_level = self._calculate_risk_level(security_issues)
-            
-            # 4. 生成建议
-            recommendations = self._generate_security_recommendations(security_issues)
-            
-            is_safe = risk_level != RiskLevel.HIGH and len([
-                issue for issue in security_issues 
-                if issue.get("severity") == "high"
-            ]) == 0
-            
-            result = SecurityValidationResponse(
-                is_safe=is_safe,
-                security_issues=security_issues,
-                risk_level=risk_level,
-                recommendations=recommendations
-            )
-            
-            # 缓存结果
+            # 排队写回数据库，供下次启动时预热
             if db:
-                await self._cache_security_result(expression, result, db)
+                self._queue_security_result(expression, result)
             
             return result
             
         except Exception as e:
             logger.error(f"安全验证失败: {str(e)}")
-            return SecurityValidationResponse(
-                is_safe=False,
-                security_issues=[{
-                    "type": "validation_error",
-                    "message": f"验证过程出错: {str(e)}",
-                    "severity": "high"
-                }],
-                risk_level=RiskLevel.HIGH,
-                recommendations=["表达式验证失败，请检查语法"]
-            )
+            return self._validation_error_response(e)
 
     async def execute_safe_expression(
         self, 
@@ -303,24 +385,51 @@ class SafeExpressionEngine:
             表达式执行结果
         """
         
-        try:
-            # 先进行安全验证
-            validation_result = await self.validate_expression_security(expression)
-            if not validation_result.is_safe:
-                high_risk_issues = [
-                    issue for issue in validation_result.security_issues 
-                    if issue.get("severity") == "high"
-                ]
-                raise SecurityError(f"表达式存在安全风险: {high_risk_issues}")
-            
-            # 解析表达式
-            tree = ast.parse(expression, mode='eval')
+        # 获取编译结果（安全验证和解析只在首次出现时执行）
+        compiled = self.compile_expression(expression)
+        
+        return await self.execute_compiled_expression(compiled, context)
+
+    async def execute_compiled_expression(
+        self, 
+        compiled: CompiledExpression, 
+        context: Dict[str, Any]
+    ) -> Any:
+        """
+        执行已编译的表达式
+        
+        Args:
+            compiled: compile_expression 返回的编译结果
+            context: 执行上下文
             
+        Returns:
+            表达式执行结果
+        """
+        
+        return self.evaluate_compiled_expression(compiled, context)
+
+    def evaluate_compiled_expression(
+        self, 
+        compiled: CompiledExpression, 
+        context: Dict[str, Any]
+    ) -> Any:
+        """
+        同步执行已编译的表达式（不依赖事件循环，可在工作进程中调用）
+        
+        Args:
+            compiled: compile_expression 返回的编译结果
+            context: 执行上下文
+            
+        Returns:
+            表达式执行结果
+        """
+        
+        try:
             # 准备安全执行环境
             safe_context = self._prepare_safe_context(context)
             
             # 执行表达式
-            result = self._eval_node(tree.body, safe_context)
+            result = compiled(safe_context)
             
             return result
             
@@ -330,21 +439,214 @@ class SafeExpressionEngine:
             logger.error(f"表达式执行失败: {str(e)}")
             raise ExpressionError(f"表达式执行失败: {str(e)}")
 
+    def evaluate_many(
+        self,
+        expression: str,
+        contexts: Iterable[Dict[str, Any]],
+        executor: Optional[Executor] = None,
+        chunk_size: int = 1000
+    ) -> BatchEvaluationResult:
+        """
+        对多个上下文批量执行同一表达式（同步）
+        
+        表达式只验证和编译一次；单项执行出错不影响其他项，错误按序号返回。
+        指定 executor（如规则评估进程池）且数量超过 chunk_size 时分块提交并行执行，
+        执行器不可用时回退到当前线程执行。
+        
+        Args:
+            expression: 要执行的表达式
+            contexts: 执行上下文序列
+            executor: 可选的执行器
+            chunk_size: 每块的上下文数
+            
+        Returns:
+            BatchEvaluationResult: 执行结果和单项错误
+            
+        Raises:
+            SecurityError: 表达式未通过安全验证
+        """
+        
+        start_time = time.time()
+        
+        compiled = self.compile_expression(expression)
+        if not compiled.is_safe:
+            high_risk_issues = [
+                issue for issue in compiled.validation.security_issues 
+                if issue.get("severity") == "high"
+            ]
+            raise SecurityError(f"表达式存在安全风险: {high_risk_issues}")
+        
+        contexts = list(contexts)
+        chunks = [contexts[start:start + chunk_size] for start in range(0, len(contexts), chunk_size)]
+        
+        outcomes = []
+        if executor is not None and len(chunks) > 1:
+            futures = [executor.submit(evaluate_expression_chunk, expression, chunk) for chunk in chunks]
+            for chunk, future in zip(chunks, futures):
+                try:
+                    outcomes.extend(future.result())
+                except Exception as e:
+                    logger.warning(f"批量执行分块失败，回退到当前线程执行: {str(e)}")
+                    outcomes.extend(self._evaluate_chunk(compiled, chunk))
+        else:
+            outcomes = self._evaluate_chunk(compiled, contexts)
+        
+        results = []
+        errors = []
+        for index, (result, error_message) in enumerate(outcomes):
+            results.append(result)
+            if error_message is not None:
+                errors.append((index, error_message))
+        
+        return BatchEvaluationResult(results, errors, time.time() - start_time)
+
+    def _evaluate_chunk(
+        self,
+        compiled: CompiledExpression,
+        contexts: List[Dict[str, Any]]
+    ) -> List[Tuple[Any, Optional[str]]]:
+        """逐项执行已编译表达式，返回 (结果, 错误信息)"""
+        
+        outcomes = []
+        for context in contexts:
+            try:
+                outcomes.append((compiled(self._prepare_safe_context(context)), None))
+            except Exception as e:
+                outcomes.append((None, str(e)))
+        return outcomes
+
+    def compile_expression(self, expression: str) -> CompiledExpression:
+        """
+        编译表达式（带缓存）
+        
+        同一表达式文本只做一次安全验证和AST解析，后续调用直接复用编译结果。
+        安全验证不复用验证缓存中的结果。
+        不安全的表达式同样会被缓存，执行时抛出 SecurityError。
+        
+        Args:
+            expression: 要编译的表达式
+            
+        Returns:
+            CompiledExpression: 编译后的表达式
+        """
+        
+        # 使用原始文本的哈希作为键，规则表达式变更即产生新的缓存条目
+        expression_hash = hashlib.sha256(expression.encode('utf-8')).hexdigest()
+        
+        compiled = self._compiled_cache.get(expression_hash)
+        if compiled is not None:
+            return compiled
+        
+        # 编译时总是重新执行完整的安全检查（每个表达式文本只执行一次），
+        # 不信任进程内或数据库预热的验证结果；验证缓存只用于验证接口跳过重复检查
+        try:
+            validation, tree = self._run_security_checks(expression)
+            self._cache_validation(expression, validation)
+        except Exception as e:
+            logger.error(f"安全验证失败: {str(e)}")
+            validation, tree = self._validation_error_response(e), None
+        
+        compiled = CompiledExpression(
+            engine=self,
+            expression=expression,
+            expression_hash=expression_hash,
+            tree=tree if validation.is_safe else None,
+            validation=validation
+        )
+        self._compiled_cache.set(expression_hash, compiled)
+        
+        return compiled
+
+    def get_compiled_cache_stats(self) -> Dict[str, Any]:
+        """获取编译缓存统计信息（命中/未命中/淘汰）"""
+        return self._compiled_cache.stats()
+
+    def clear_compiled_cache(self):
+        """清空编译缓存"""
+        self._compiled_cache.clear()
+
+    def get_validation_cache_stats(self) -> Dict[str, Any]:
+        """获取进程内安全验证缓存统计信息"""
+        return security_validation_cache.stats()
+
+    def _run_security_checks(
+        self, 
+        expression: str
+    ) -> Tuple[SecurityValidationResponse, Optional[ast.Expression]]:
+        """执行安全检查，返回验证结果和解析得到的AST（语法错误时为None）"""
+        
+        security_issues = []
+        tree = None
+        
+        # 1. 字符串模式检查
+        pattern_issues = self._check_dangerous_patterns(expression)
+        security_issues.extend(pattern_issues)
+        
+        # 2. AST语法树检查
+        try:
+            tree = ast.parse(expression, mode='eval')
+            ast_issues = self._check_ast_security(tree)
+            security_issues.extend(ast_issues)
+        except SyntaxError as e:
+            security_issues.append({
+                "type": "syntax_error",
+                "message": f"语法错误: {str(e)}",
+                "severity": "high"
+            })
+        
+        # 3. 计算风险等级
+        risk_level = self._calculate_risk_level(security_issues)
+        
+        # 4. 生成建议
+        recommendations = self._generate_security_recommendations(security_issues)
+        
+        is_safe = risk_level != RiskLevel.HIGH and len([
+            issue for issue in security_issues 
+            if issue.get("severity") == "high"
+        ]) == 0
+        
+        result = SecurityValidationResponse(
+            is_safe=is_safe,
+            security_issues=security_issues,
+            risk_level=risk_level,
+            recommendations=recommendations
+        )
+        
+        return result, tree
+
+    def _validation_error_response(self, error: Exception) -> SecurityValidationResponse:
+        """构建验证过程出错时的结果"""
+        return SecurityValidationResponse(
+            is_safe=False,
+            security_issues=[{
+                "type": "validation_error",
+                "message": f"验证过程出错: {str(error)}",
+                "severity": "high"
+            }],
+            risk_level=RiskLevel.HIGH,
+            recommendations=["表达式验证失败，请检查语法"]
+        )
+
     def _check_dangerous_patterns(self, expression: str) -> List[Dict[str, Any]]:
-        """检查危险字符串模式"""
+        """
+        检查危险字符串模式
+        
+        单次扫描表达式，按出现位置返回匹配；与已报告匹配重叠的其他模式不再重复报告
+        （只要任一模式出现，就至少报告一处，安全判定不受影响）。
+        """
         
         issues = []
         
-        for pattern in self.dangerous_patterns:
-            matches = re.finditer(pattern, expression, re.IGNORECASE)
-            for match in matches:
-                issues.append({
-                    "type": "dangerous_pattern",
-                    "message": f"发现危险模式: {match.group()}",
-                    "pattern": pattern,
-                    "position": match.span(),
-                    "severity": "high"
-                })
+        for match in self._dangerous_pattern_regex.finditer(expression):
+            pattern_id = int(match.lastgroup[1:])
+            issues.append({
+                "type": "dangerous_pattern",
+                "message": f"发现危险模式: {match.group()}",
+                "pattern": self.dangerous_patterns[pattern_id],
+                "pattern_id": pattern_id,
+                "position": match.span(),
+                "severity": "high"
+            })
         
         return issues
 
@@ -482,8 +784,9 @@ class SafeExpressionEngine:
     def _prepare_safe_context(self, context: Dict[str, Any]) -> Dict[str, Any]:
         """准备安全执行上下文"""
         
+        # 内置函数由执行器直接从 safe_builtins 查找，这里共享只读视图，无需每次复制
         safe_context = {
-            '__builtins__': self.safe_builtins.copy()
+            '__builtins__': self._safe_builtins_view
         }
         
         # 添加用户提供的上下文，但进行安全过滤
@@ -561,12 +864,17 @@ class SafeExpressionEngine:
             
             return True
         elif isinstance(node, ast.BoolOp):
-            values = [self._eval_node(value, context) for value in node.values]
-            
+            # 短路求值：and 遇到假值、or 遇到真值即返回，剩余操作数不再求值
             if isinstance(node.op, ast.And):
-                return all(values)
+                for value in node.values:
+                    if not self._eval_node(value, context):
+                        return False
+                return True
             elif isinstance(node.op, ast.Or):
-                return any(values)
+                for value in node.values:
+                    if self._eval_node(value, context):
+                        return True
+                return False
             else:
                 raise SecurityError(f"不支持的布尔操作: {type(node.op).__name__}")
         elif isinstance(node, ast.Call):
@@ -584,7 +892,7 @@ class SafeExpressionEngine:
             obj = self._eval_node(node.value, context)
             
             # 处理索引（兼容Python 3.8-）
-            if hasattr(node.slice, 'value'):  # Python < 3.9
+            if hasattr(ast, 'Index') and isinstance(node.slice, ast.Index):  # Python < 3.9
                 index = self._eval_node(node.slice.value, context)
             else:  # Python >= 3.9
                 index = self._eval_node(node.slice, context)
@@ -663,67 +971,102 @@ class SafeExpressionEngine:
 
     # ==================== 缓存相关方法 ====================
 
-    async def _get_cached_security_result(
-        self, 
-        expression: str, 
-        db: Session
-    ) -> Optional[SecurityValidationResponse]:
-        """获取缓存的安全验证结果"""
+    def _get_cached_validation(self, expression: str) -> Optional[SecurityValidationResponse]:
+        """从进程内缓存获取安全验证结果"""
         
-        try:
-            expression_hash = create_expression_hash(expression)
-            
-            cached = db.query(ExpressionSecurityCache).filter(
-                ExpressionSecurityCache.expression_hash == expression_hash
-            ).first()
-            
-            if cached:
-                # 检查缓存是否过期（24小时）
-                cache_age = datetime.utcnow() - cached.scanned_at
-                if cache_age.total_seconds() < 86400:  # 24小时
-                    return SecurityValidationResponse(
-                        is_safe=cached.is_safe,
-                        security_issues=cached.security_issues or [],
-                        risk_level=RiskLevel.LOW if cached.is_safe else RiskLevel.HIGH,
-                        recommendations=[]
-                    )
-            
-            return None
-            
-        except Exception as e:
-            logger.warning(f"获取安全缓存失败: {str(e)}")
+        entry = security_validation_cache.get(create_expression_hash(expression))
+        # 哈希基于标准化文本（去空格、小写），文本不完全一致时不复用结果
+        if entry is None or entry[0] != expression:
             return None
+        return entry[1]
 
-    async def _cache_security_result(
-        self, 
-        expression: str, 
-        result: SecurityValidationResponse, 
-        db: Session
-    ):
-        """缓存安全验证结果"""
+    def _cache_validation(self, expression: str, result: SecurityValidationResponse):
+        """写入进程内安全验证缓存"""
+        security_validation_cache.set(create_expression_hash(expression), (expression, result))
+
+    def load_security_cache(self, db: Session) -> int:
+        """
+        从数据库缓存表批量预热进程内安全验证缓存（启动时调用）
+        
+        只加载有效期内最近扫描的条目，最多填满缓存容量。
+        
+        Returns:
+            加载的条目数
+        """
+        
+        cutoff_time = datetime.utcnow() - timedelta(seconds=SECURITY_CACHE_TTL_SECONDS)
+        rows = db.query(
+            ExpressionSecurityCache.expression_text,
+            ExpressionSecurityCache.is_safe,
+            ExpressionSecurityCache.security_issues
+        ).filter(
+            ExpressionSecurityCache.scanned_at >= cutoff_time
+        ).order_by(
+            ExpressionSecurityCache.scanned_at.desc()
+        ).limit(security_validation_cache.maxsize).all()
+        
+        # 按扫描时间从旧到新写入，最近扫描的条目在LRU中最新
+        for expression_text, is_safe, security_issues in reversed(rows):
+            security_issues = security_issues or []
+            self._cache_validation(expression_text, SecurityValidationResponse(
+                is_safe=is_safe,
+                security_issues=security_issues,
+                risk_level=self._calculate_risk_level(security_issues),
+                recommendations=self._generate_security_recommendations(security_issues)
+            ))
+        
+        logger.info(f"预热安全验证缓存: {len(rows)} 条")
+        return len(rows)
+
+    def _queue_security_result(self, expression: str, result: SecurityValidationResponse):
+        """新的验证结果加入待写回队列（同一表达式只保留最新结果）"""
+        
+        with _pending_security_lock:
+            _pending_security_results[create_expression_hash(expression)] = (expression, result)
+
+    def flush_security_cache(self, db: Session) -> int:
+        """
+        将排队的验证结果批量写回数据库缓存表（一次删除、一次批量插入、一次提交）
+        
+        写入失败时结果重新入队，等待下次写入。
+        
+        Returns:
+            写入的条目数
+        """
+        
+        with _pending_security_lock:
+            pending = dict(_pending_security_results)
+            _pending_security_results.clear()
+        
+        if not pending:
+            return 0
         
         try:
-            expression_hash = create_expression_hash(expression)
-            
-            # 删除旧缓存
             db.query(ExpressionSecurityCache).filter(
-                ExpressionSecurityCache.expression_hash == expression_hash
-            ).delete()
+                ExpressionSecurityCache.expression_hash.in_(list(pending))
+            ).delete(synchronize_session=False)
             
-            # 创建新缓存
-            cache_entry = ExpressionSecurityCache(
-                expression_hash=expression_hash,
-                expression_text=expression,
-                is_safe=result.is_safe,
-                security_issues=result.security_issues
-            )
-            
-            db.add(cache_entry)
+            db.add_all([
+                ExpressionSecurityCache(
+                    expression_hash=expression_hash,
+                    expression_text=expression,
+                    is_safe=result.is_safe,
+                    security_issues=result.security_issues
+                )
+                for expression_hash, (expression, result) in pending.items()
+            ])
             db.commit()
             
         except Exception as e:
             logger.warning(f"缓存安全结果失败: {str(e)}")
             db.rollback()
+            # 重新入队，期间产生的更新结果优先
+            with _pending_security_lock:
+                for expression_hash, entry in pending.items():
+                    _pending_security_results.setdefault(expression_hash, entry)
+            return 0
+        
+        return len(pending)
 
     # ==================== 工具方法 ====================
 
@@ -768,6 +1111,15 @@ class SafeExpressionEngine:
                 "offset": e.offset
             }
 
+    def get_property_dependencies(self, expression: str) -> Dict[str, List[str]]:
+        """获取表达式每次执行必然读取的属性（如 {"part_a": ["socket"]}）"""
+        
+        compiled = self.compile_expression(expression)
+        return {
+            name: sorted(attrs)
+            for name, attrs in compiled.required_properties.items()
+        }
+
     def get_expression_dependencies(self, expression: str) -> List[str]:
         """获取表达式依赖的变量名"""
         
@@ -0,0 +1,360 @@
+# backend/app/services/vectorized_screening.py
+"""
+向量化候选零件筛选
+
+将规则表达式中简单的比较/算术/布尔结构转换为 NumPy 数组运算，
+对同一类别的所有候选零件一次性求值。
+
+只对能确定与逐行解释执行结果一致的行给出结果：
+引用属性缺失、除数为零或结果非有限值的行标记为无效，由调用方回退到逐行执行；
+无法向量化的表达式整体回退。
+"""
+
+import ast
+import time
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # numpy 随 pandas 安装，缺失时全部回退到逐行执行
+    np = None
+
+from app.services.safe_expression_parser import CompiledExpression
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 超过该值的整数转换为 float64 会丢失精度
+_MAX_EXACT_INT = 2 ** 53
+
+class NotVectorizableError(Exception):
+    """表达式或数据无法向量化"""
+    pass
+
+class _Column:
+    """候选零件某个属性的列数据"""
+
+    __slots__ = ("values", "missing", "is_numeric")
+
+    def __init__(self, values, missing, is_numeric: bool):
+        self.values = values
+        self.missing = missing
+        self.is_numeric = is_numeric
+
+class CandidateFrame:
+    """一组候选零件的列式视图，列按需构建并缓存"""
+
+    def __init__(self, contexts: Sequence[Dict[str, Any]]):
+        self.contexts = contexts
+        self.size = len(contexts)
+        self._columns: Dict[str, _Column] = {}
+
+    def column(self, name: str) -> _Column:
+        column = self._columns.get(name)
+        if column is None:
+            column = self._build_column(name)
+            self._columns[name] = column
+        return column
+
+    def _build_column(self, name: str) -> _Column:
+        raw = [context.get(name) for context in self.contexts]
+        missing = np.fromiter((value is None for value in raw), dtype=bool, count=self.size)
+
+        is_numeric = all(
+            value is None or (
+                isinstance(value, (bool, int, float)) and
+                not (isinstance(value, int) and abs(value) > _MAX_EXACT_INT)
+            )
+            for value in raw
+        )
+
+        if is_numeric:
+            values = np.fromiter(
+                (0.0 if value is None else float(value) for value in raw),
+                dtype=np.float64, count=self.size
+            )
+        else:
+            values = np.empty(self.size, dtype=object)
+            values[:] = raw
+
+        return _Column(values, missing, is_numeric)
+
+class VectorizedScreener:
+    """规则表达式的向量化求值器"""
+
+    # 支持的算术运算
+    _BINARY_OPERATORS = {
+        ast.Add: lambda l, r: l + r,
+        ast.Sub: lambda l, r: l - r,
+        ast.Mult: lambda l, r: l * r,
+        ast.Div: lambda l, r: l / r,
+        ast.Mod: lambda l, r: np.mod(l, r),
+        ast.Pow: lambda l, r: np.power(l, r),
+    }
+
+    # 支持的比较运算（大小比较只支持数值）
+    _ORDER_COMPARATORS = {
+        ast.Lt: lambda l, r: l < r,
+        ast.LtE: lambda l, r: l <= r,
+        ast.Gt: lambda l, r: l > r,
+        ast.GtE: lambda l, r: l >= r,
+    }
+
+    def __init__(self, min_batch_size: int = 16):
+        # 候选数量低于该值时向量化收益不明显，直接逐行执行
+        self.min_batch_size = min_batch_size
+        # 表达式哈希 -> 结构上是否可向量化
+        self._structure_cache: Dict[str, bool] = {}
+
+    @property
+    def available(self) -> bool:
+        return np is not None
+
+    def build_frame(self, contexts: Sequence[Dict[str, Any]]) -> CandidateFrame:
+        """为一组候选零件上下文构建列式视图"""
+        return CandidateFrame(contexts)
+
+    def evaluate(
+        self,
+        compiled: CompiledExpression,
+        frame: CandidateFrame,
+        fixed_context: Dict[str, Any],
+        candidate_name: str = "part_a",
+        fixed_name: str = "part_b"
+    ) -> Optional[Tuple[Any, Any, float]]:
+        """
+        对所有候选零件求值规则
+
+        Args:
+            compiled: 已编译的规则表达式
+            frame: 候选零件列式视图（绑定到 candidate_name）
+            fixed_context: 固定零件的上下文（绑定到 fixed_name）
+
+        Returns:
+            (passed, valid, 每行平均耗时)；无法向量化时返回 None。
+            只有 valid 为 True 的行结果可用。
+        """
+
+        if not self.available or not compiled.is_safe or frame.size < self.min_batch_size:
+            return None
+
+        if not self._is_vectorizable(compiled, compiled._engine):
+            return None
+
+        start_time = time.time()
+        env = _Environment(frame, fixed_context, candidate_name, fixed_name)
+
+        try:
+            with np.errstate(all="ignore"):
+                value, invalid = self._eval(compiled.tree.body, env)
+                passed = self._truth(value, frame.size)
+        except NotVectorizableError:
+            return None
+        except Exception as e:
+            logger.debug(f"向量化求值失败，回退逐行执行: {str(e)}")
+            return None
+
+        valid = ~invalid if invalid is not None else np.ones(frame.size, dtype=bool)
+        elapsed = time.time() - start_time
+
+        return passed, valid, elapsed / frame.size
+
+    # ==================== 结构检查 ====================
+
+    def _is_vectorizable(self, compiled: CompiledExpression, engine: Any) -> bool:
+        cached = self._structure_cache.get(compiled.expression_hash)
+        if cached is None:
+            cached = all(self._node_supported(node, engine) for node in ast.walk(compiled.tree.body))
+            self._structure_cache[compiled.expression_hash] = cached
+        return cached
+
+    def _node_supported(self, node: ast.AST, engine: Any) -> bool:
+        if isinstance(node, ast.Call):
+            # 只支持与内置实现语义一致、且在执行引擎中允许调用的函数
+            return (
+                isinstance(node.func, ast.Name) and
+                node.func.id in ("abs", "min", "max") and
+                node.func.id in engine.allowed_functions and
+                engine.safe_builtins.get(node.func.id) in (abs, min, max) and
+                not node.keywords and
+                (len(node.args) == 1 if node.func.id == "abs" else len(node.args) >= 2)
+            )
+        if isinstance(node, ast.Attribute):
+            # 只支持 part_x.属性 这一层访问，受限属性交给逐行执行报错
+            return (
+                isinstance(node.value, ast.Name) and
+                not node.attr.startswith('__') and
+                node.attr not in engine.forbidden_functions
+            )
+        if isinstance(node, ast.Name):
+            return True
+        if isinstance(node, ast.Constant):
+            return isinstance(node.value, (bool, int, float, str))
+        if isinstance(node, ast.BinOp):
+            return type(node.op) in self._BINARY_OPERATORS
+        if isinstance(node, ast.UnaryOp):
+            return isinstance(node.op, (ast.USub, ast.UAdd, ast.Not))
+        if isinstance(node, ast.Compare):
+            return all(
+                type(op) in self._ORDER_COMPARATORS or isinstance(op, (ast.Eq, ast.NotEq))
+                for op in node.ops
+            )
+        if isinstance(node, ast.BoolOp):
+            return True
+        return isinstance(node, (ast.expr_context, ast.operator, ast.unaryop, ast.cmpop, ast.boolop))
+
+    # ==================== 求值 ====================
+
+    def _eval(self, node: ast.AST, env: "_Environment") -> Tuple[Any, Any]:
+        """返回 (值, 无效行掩码)，值为标量或数组，掩码为 None 表示全部有效"""
+
+        if isinstance(node, ast.Constant):
+            return node.value, None
+
+        if isinstance(node, ast.Attribute):
+            return env.attribute(node.value.id, node.attr)
+
+        if isinstance(node, ast.BinOp):
+            left, left_invalid = self._eval(node.left, env)
+            right, right_invalid = self._eval(node.right, env)
+            self._require_numeric(left)
+            self._require_numeric(right)
+
+            invalid = _merge_invalid(left_invalid, right_invalid)
+            if isinstance(node.op, (ast.Div, ast.Mod)):
+                # 除数为零时逐行执行会抛出异常，交给逐行执行处理
+                invalid = _merge_invalid(invalid, _as_mask(right == 0, env.size))
+
+            value = self._BINARY_OPERATORS[type(node.op)](left, right)
+            # 非有限值或超出 float64 精确整数范围的结果可能与逐行执行不一致
+            inexact = ~np.isfinite(value) | (np.abs(value) > _MAX_EXACT_INT)
+            return value, _merge_invalid(invalid, _as_mask(inexact, env.size))
+
+        if isinstance(node, ast.UnaryOp):
+            operand, invalid = self._eval(node.operand, env)
+            if isinstance(node.op, ast.Not):
+                return np.logical_not(self._truth(operand, env.size)), invalid
+            self._require_numeric(operand)
+            return (-operand if isinstance(node.op, ast.USub) else +operand), invalid
+
+        if isinstance(node, ast.Compare):
+            left, invalid = self._eval(node.left, env)
+            result = np.ones(env.size, dtype=bool)
+            for op, comparator in zip(node.ops, node.comparators):
+                right, right_invalid = self._eval(comparator, env)
+                invalid = _merge_invalid(invalid, right_invalid)
+                result &= self._compare(op, left, right, env.size)
+                left = right
+            return result, invalid
+
+        if isinstance(node, ast.BoolOp):
+            invalid = None
+            truths = []
+            for value_node in node.values:
+                value, value_invalid = self._eval(value_node, env)
+                invalid = _merge_invalid(invalid, value_invalid)
+                truths.append(self._truth(value, env.size))
+            combine = np.logical_and if isinstance(node.op, ast.And) else np.logical_or
+            return combine.reduce(truths), invalid
+
+        if isinstance(node, ast.Call):
+            args = [self._eval(arg, env) for arg in node.args]
+            invalid = None
+            for value, value_invalid in args:
+                self._require_numeric(value)
+                invalid = _merge_invalid(invalid, value_invalid)
+            values = [value for value, _ in args]
+            if node.func.id == "abs":
+                return np.abs(values[0]), invalid
+            reduce = np.minimum if node.func.id == "min" else np.maximum
+            result = values[0]
+            for value in values[1:]:
+                result = reduce(result, value)
+            return result, invalid
+
+        raise NotVectorizableError(f"不支持的节点类型: {type(node).__name__}")
+
+    def _compare(self, op: ast.cmpop, left: Any, right: Any, size: int):
+        if type(op) in self._ORDER_COMPARATORS:
+            self._require_numeric(left)
+            self._require_numeric(right)
+            return _broadcast(self._ORDER_COMPARATORS[type(op)](left, right), size)
+
+        if _is_numeric(left) and _is_numeric(right):
+            equal = _broadcast(left == right, size)
+        else:
+            # 非数值按元素使用 Python 的相等比较
+            left_values = _as_object_array(left, size)
+            right_values = _as_object_array(right, size)
+            equal = np.fromiter(
+                (l == r for l, r in zip(left_values, right_values)),
+                dtype=bool, count=size
+            )
+        return equal if isinstance(op, ast.Eq) else ~equal
+
+    def _truth(self, value: Any, size: int):
+        if isinstance(value, np.ndarray):
+            if value.dtype == bool:
+                return value
+            if value.dtype.kind in "fiu":
+                return value != 0
+            raise NotVectorizableError("非数值数组无法判断真值")
+        return np.full(size, bool(value), dtype=bool)
+
+    def _require_numeric(self, value: Any):
+        if not _is_numeric(value):
+            raise NotVectorizableError("算术和大小比较只支持数值")
+
+class _Environment:
+    """求值环境：候选零件列与固定零件标量"""
+
+    def __init__(self, frame: CandidateFrame, fixed_context: Dict[str, Any], candidate_name: str, fixed_name: str):
+        self.frame = frame
+        self.size = frame.size
+        self.fixed_context = fixed_context
+        self.candidate_name = candidate_name
+        self.fixed_name = fixed_name
+
+    def attribute(self, owner: str, attr: str) -> Tuple[Any, Any]:
+        if owner == self.candidate_name:
+            column = self.frame.column(attr)
+            return column.values, column.missing if column.missing.any() else None
+
+        if owner == self.fixed_name:
+            value = self.fixed_context.get(attr)
+            if isinstance(value, (bool, int, float, str)) and not (
+                isinstance(value, int) and abs(value) > _MAX_EXACT_INT
+            ):
+                return value, None
+
+        # 缺失的固定属性、复杂类型或其他变量交给逐行执行
+        raise NotVectorizableError(f"无法向量化的属性访问: {owner}.{attr}")
+
+def _is_numeric(value: Any) -> bool:
+    if isinstance(value, np.ndarray):
+        return value.dtype.kind in "fbiu"
+    return isinstance(value, (bool, int, float, np.number, np.bool_))
+
+def _as_mask(mask: Any, size: int):
+    if isinstance(mask, np.ndarray):
+        return mask if mask.any() else None
+    return np.ones(size, dtype=bool) if mask else None
+
+def _merge_invalid(left: Any, right: Any):
+    if left is None:
+        return right
+    if right is None:
+        return left
+    return left | right
+
+def _broadcast(value: Any, size: int):
+    if isinstance(value, np.ndarray):
+        return value.astype(bool, copy=False)
+    return np.full(size, bool(value), dtype=bool)
+
+def _as_object_array(value: Any, size: int):
+    if isinstance(value, np.ndarray):
+        return value.astype(object) if value.dtype != object else value
+    values = np.empty(size, dtype=object)
+    values[:] = [value] * size
+    return values
@@ -216,6 +216,114 @@ class CompatibilitySystemTester:
         except Exception as e:
             self.log_test("表达式执行测试", False, str(e))
     
+    def test_evaluator_equivalence(self):
+        """测试解释执行、闭包执行和向量化筛选的结果一致性"""
+        print("\n🔁 测试表达式执行器一致性...")
+        
+        from app.services.vectorized_screening import VectorizedScreener
+        
+        # 固定零件绑定到 part_b，候选零件绑定到 part_a（与兼容性搜索的向量化方向一致）
+        fixed_part = {
+            'voltage': 12,
+            'max_power': 200,
+            'wattage': 650,
+            'socket': 'LGA1700',
+            'ratio': 0.5,
+            'divisor': 3
+        }
+        
+        # 候选零件覆盖整数/浮点混合、零值、负数、布尔值、缺失属性和超出 float64 精确范围的整数
+        candidates = [
+            {'voltage': 12, 'power_consumption': 65, 'socket': 'LGA1700', 'cores': 8, 'frequency': 3500.5, 'offset': -7, 'serial': 1},
+            {'voltage': 5, 'power_consumption': 250, 'socket': 'AM5', 'cores': 0, 'frequency': 0.0, 'offset': 7, 'serial': 2},
+            {'voltage': 12.0, 'power_consumption': 0, 'socket': 'LGA1700', 'cores': -3, 'frequency': 2.5, 'offset': 0, 'serial': 3},
+            {'voltage': 3.3, 'socket': None, 'cores': 2, 'frequency': -1.5, 'offset': -1, 'serial': 2 ** 60},
+            {'voltage': True, 'power_consumption': 65.5, 'cores': 16, 'offset': 5},
+            {'power_consumption': 120, 'cores': 4, 'frequency': 1e308, 'offset': 2}
+        ]
+        
+        expressions = [
+            "part_a.voltage == part_b.voltage",
+            "part_a.power_consumption <= part_b.max_power",
+            "part_a.power_consumption + 100 <= part_b.wattage",
+            "part_a.power_consumption / part_a.cores > 10",       # 除数为零
+            "part_a.power_consumption % part_a.cores == 0",       # 取模除数为零
+            "part_a.offset % part_b.divisor == 1",                 # 负数取模
+            "part_a.cores ** 2 >= 64",
+            "part_a.cores ** (part_a.offset - 10) > 0",            # 0 的负数次幂
+            "part_b.ratio ** part_a.offset > 1",                   # 负指数
+            "part_a.frequency * 10 > 1000",                        # 溢出为 inf
+            "abs(part_a.offset) < max(part_a.cores, 4)",
+            "min(part_a.voltage, part_b.voltage) == 12",
+            "-part_a.offset > 0 and not part_a.cores",
+            "part_a.voltage > 0 or part_a.power_consumption > 100",           # 短路：第二项可能缺失
+            "part_a.power_consumption > 100 and part_a.socket == part_b.socket",
+            "part_a.socket == part_b.socket",
+            "part_a.socket != 'AM5'",
+            "0 < part_a.cores <= 8",
+            "part_a.serial > 0",
+            "part_a.cores"
+        ]
+        
+        def outcome(evaluate, context):
+            """执行结果或异常（类型和信息）"""
+            try:
+                return ("ok", repr(evaluate(context)))
+            except Exception as e:
+                return ("error", type(e).__name__, str(e))
+        
+        screener = VectorizedScreener(min_batch_size=1)
+        frame = screener.build_frame(candidates) if screener.available else None
+        if frame is None:
+            self.log_test("向量化筛选一致性", True, "numpy 未安装，只比较解释执行和闭包执行")
+        
+        try:
+            for expr in expressions:
+                compiled = self.expression_engine.compile_expression(expr)
+                if not compiled.is_safe:
+                    self.log_test(f"执行器一致性: {expr}", False, "表达式应该通过安全验证")
+                    continue
+                
+                contexts = [
+                    self.expression_engine._prepare_safe_context({'part_a': candidate, 'part_b': fixed_part})
+                    for candidate in candidates
+                ]
+                interpreted = [outcome(compiled.interpret, context) for context in contexts]
+                
+                # 闭包执行与解释执行：返回值、异常类型和信息都必须一致
+                mismatches = [
+                    row for row, context in enumerate(contexts)
+                    if outcome(compiled, context) != interpreted[row]
+                ]
+                
+                # 向量化筛选：有效行必须与解释执行同样不出错且通过/失败一致，解释执行出错的行必须标记为无效
+                vectorized_rows = 0
+                if frame is not None:
+                    evaluation = screener.evaluate(
+                        compiled, frame, fixed_part, candidate_name="part_a", fixed_name="part_b"
+                    )
+                    if evaluation is not None:
+                        passed, valid, _ = evaluation
+                        for row, context in enumerate(contexts):
+                            if not valid[row]:
+                                continue
+                            vectorized_rows += 1
+                            try:
+                                expected = bool(compiled.interpret(context))
+                            except Exception:
+                                mismatches.append(row)
+                                continue
+                            if bool(passed[row]) != expected:
+                                mismatches.append(row)
+                
+                if mismatches:
+                    self.log_test(f"执行器一致性: {expr}", False, f"不一致的候选零件行: {sorted(set(mismatches))}")
+                else:
+                    self.log_test(f"执行器一致性: {expr}", True, f"向量化有效行: {vectorized_rows}/{len(candidates)}")
+        
+        except Exception as e:
+            self.log_test("表达式执行器一致性测试", False, str(e))
+    
     def test_database_models(self):
         """测试数据库模型"""
         print("\n💾 测试数据库模型...")
@@ -474,6 +582,7 @@ async def main():
         # 执行各项测试
         await tester.test_expression_engine_security()
         await tester.test_expression_execution()
+        tester.test_evaluator_equivalence()
         tester.test_database_models()
         await tester.test_compatibility_engine()
         await tester.test_compatibility_search()